@@ -3,16 +3,32 @@
 修复完善版本
 """
 
-from flask import Flask, request, jsonify, render_template, send_from_directory
+from flask import Flask, request, jsonify, render_template, send_from_directory, Response, stream_with_context, g
 from flask_sqlalchemy import SQLAlchemy
-from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity
+from sqlalchemy import and_, or_, func, case, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.types import TypeDecorator
+from sqlalchemy.orm import load_only
+from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity, get_jwt, verify_jwt_in_request
 from flask_cors import CORS
 from werkzeug.security import generate_password_hash, check_password_hash
 from werkzeug.utils import secure_filename
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
 import os
 import json
+import base64
+import binascii
+import hashlib
+import hmac
+import uuid
+import csv
+import io
+import zipfile
+import time
 from config import Config
+from services import prediction_codec
 
 # 创建Flask应用
 app = Flask(__name__)
@@ -36,6 +52,56 @@ class User(db.Model):
     
     predictions = db.relationship('Prediction', backref='user', lazy='dynamic', cascade='all, delete-orphan')
 
+# 分析结果使用的存储编码，旧的JSON文本行读取时自动识别
+section_codec = prediction_codec.get_codec(app.config['PREDICTION_CODEC'])
+
+class PackedJSON(TypeDecorator):
+    """分析结果列：以二进制存储，兼容旧的JSON文本"""
+    
+    impl = db.LargeBinary
+    cache_ok = True
+    
+    def process_bind_param(self, value, dialect):
+        if isinstance(value, str):
+            return value.encode('utf-8')
+        return value
+    
+    def result_processor(self, dialect, coltype):
+        # 尚未迁移的 text 列返回 str，psycopg2 的二进制结果处理会对其调用 bytes() 而出错，
+        # str 直接交给 prediction_codec 识别
+        impl_processor = self.impl_instance.result_processor(dialect, coltype)
+        if impl_processor is None:
+            return None
+        
+        def process(value):
+            if isinstance(value, str):
+                return value
+            return impl_processor(value)
+        return process
+
+class SectionProperty:
+    """分析结果访问器：首次读取时解码并缓存，赋值时按当前编码写入"""
+    
+    def __init__(self, column):
+        self.column = column
+    
+    def __set_name__(self, owner, name):
+        self.cache_name = f'_{name}_decoded'
+    
+    def __get__(self, obj, owner=None):
+        if obj is None:
+            return self
+        raw = getattr(obj, self.column)
+        cached = obj.__dict__.get(self.cache_name)
+        if cached is not None and cached[0] is raw:
+            return cached[1]
+        value = prediction_codec.decode(raw)
+        obj.__dict__[self.cache_name] = (raw, value)
+        return value
+    
+    def __set__(self, obj, value):
+        setattr(obj, self.column, prediction_codec.encode(value, section_codec))
+
 # 定义预测模型
 class Prediction(db.Model):
     __tablename__ = 'predictions'
@@ -43,13 +109,75 @@ class Prediction(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
     image_path = db.Column(db.String(500), nullable=False)
-    personality_data = db.Column(db.Text)
-    career_data = db.Column(db.Text)
-    wealth_data = db.Column(db.Text)
-    love_data = db.Column(db.Text)
-    fortune_data = db.Column(db.Text)
-    astrology_data = db.Column(db.Text)
+    personality_data = db.Column(PackedJSON)
+    career_data = db.Column(PackedJSON)
+    wealth_data = db.Column(PackedJSON)
+    love_data = db.Column(PackedJSON)
+    fortune_data = db.Column(PackedJSON)
+    astrology_data = db.Column(PackedJSON)
     created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    
+    # 写入时提取的关键分数，统计查询直接在SQL中聚合
+    daily_today = db.Column(db.Integer, index=True)
+    success_rate = db.Column(db.Integer, index=True)
+    stability_score = db.Column(db.Integer, index=True)
+    current_trend = db.Column(db.Integer, index=True)
+    risk_tolerance = db.Column(db.Integer, index=True)
+    mbti = db.Column(db.String(4), index=True)
+    
+    # 解码后的各部分，按需逐个解码
+    personality = SectionProperty('personality_data')
+    career = SectionProperty('career_data')
+    wealth = SectionProperty('wealth_data')
+    love = SectionProperty('love_data')
+    fortune = SectionProperty('fortune_data')
+    astrology = SectionProperty('astrology_data')
+    
+    # 列表分页按 (user_id, created_at, id) 做键集查询
+    __table_args__ = (
+        db.Index('ix_predictions_user_created_id', 'user_id', 'created_at', 'id'),
+    )
+
+# 定义仪表盘摘要模型：每个用户一行，与预测在同一事务中写入
+class DashboardSummary(db.Model):
+    __tablename__ = 'dashboard_summary'
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    prediction_id = db.Column(db.Integer, db.ForeignKey('predictions.id'), nullable=False)
+    payload = db.Column(db.Text, nullable=False)  # 已序列化的仪表盘JSON，读取时无需解析
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+# 预测详情的各部分及其存储列
+PREDICTION_SECTIONS = {
+    'personality': 'personality_data',
+    'career': 'career_data',
+    'wealth': 'wealth_data',
+    'love': 'love_data',
+    'fortune': 'fortune_data',
+    'astrology': 'astrology_data'
+}
+
+# 仪表盘字段: (来源部分, 键, 缺省值)
+DASHBOARD_FIELDS = {
+    'daily': ('fortune', 'daily', {}),
+    'monthly': ('fortune', 'monthly', {}),
+    'yearly': ('fortune', 'yearly', {}),
+    'wealth_trend': ('wealth', 'accumulationTrend', []),
+    'love_score': ('love', 'stabilityScore', 0),
+    'career_fields': ('career', 'bestFields', [])
+}
+DASHBOARD_SECTIONS = sorted({section for section, _, _ in DASHBOARD_FIELDS.values()})
+
+# 分数列: (来源部分, 键路径)
+SCORE_COLUMNS = {
+    'daily_today': ('fortune', ('daily', 'today')),
+    'success_rate': ('career', ('successRate',)),
+    'stability_score': ('love', ('stabilityScore',)),
+    'current_trend': ('wealth', ('current_trend',)),
+    'risk_tolerance': ('wealth', ('riskTolerance',)),
+    'mbti': ('personality', ('mbti',))
+}
+SCORE_SECTIONS = sorted({section for section, _ in SCORE_COLUMNS.values()})
 
 # 导入服务
 from services.personality_analyzer import PersonalityAnalyzer
@@ -59,6 +187,25 @@ from services.love_analyzer import LoveAnalyzer
 from services.fortune_analyzer import FortuneAnalyzer
 from services.astrology_analyzer import AstrologyAnalyzer
 from services.image_processor import ImageProcessor
+from services.analysis_pipeline import AnalysisPipeline, Stage
+from services.feature_cache import FeatureCache, content_hash, file_hash
+from services.seeding import SCORING_VERSION, analysis_seed, seeded_stage
+from services.result_cache import ResultCache, create_result_backend
+from services.admission import AdmissionGate, AdmissionRejected, RateLimited, TokenBucketLimiter
+from services.metrics import MetricsRegistry
+from services.profiler import RequestProfiler
+
+# 各处理阶段耗时与请求计数，由 /api/metrics 输出
+metrics = MetricsRegistry()
+
+# 按需剖析请求：管理员显式要求，或按比例抽样上传请求
+profiler = None
+if app.config['PROFILING_ENABLED']:
+    profiler = RequestProfiler(
+        app.config['PROFILING_DIR'],
+        top_n=app.config['PROFILING_TOP_N'],
+        sample_rate=app.config['PROFILING_SAMPLE_RATE']
+    )
 
 # 初始化服务
 personality_analyzer = PersonalityAnalyzer()
@@ -67,7 +214,82 @@ wealth_predictor = WealthPredictor()
 love_analyzer = LoveAnalyzer()
 fortune_analyzer = FortuneAnalyzer()
 astrology_analyzer = AstrologyAnalyzer()
-image_processor = ImageProcessor()
+image_processor = ImageProcessor(
+    cache=FeatureCache(
+        max_entries=app.config['FEATURE_CACHE_SIZE'],
+        cache_dir=app.config['FEATURE_CACHE_DIR'] or None,
+        version=ImageProcessor.FEATURE_VERSION
+    ),
+    max_detect_dim=app.config['FACE_DETECT_MAX_DIM'],
+    video_frame_step=app.config['VIDEO_FRAME_STEP'],
+    video_face_frames=app.config['VIDEO_FACE_FRAMES'],
+    video_max_frames=app.config['VIDEO_MAX_FRAMES'],
+    video_time_budget=app.config['VIDEO_TIME_BUDGET'],
+    video_aggregate=app.config['VIDEO_AGGREGATE'],
+    detector_pool_size=app.config['DETECTOR_POOL_SIZE'],
+    detector_timeout=app.config['DETECTOR_POOL_TIMEOUT'],
+    observe=metrics.observe
+)
+
+# 分析流水线：性格为所有分析的前置，职业→财富为唯一的串行依赖
+# 每个阶段先接收 seed 与 today，按阶段名称派生独立的随机数生成器
+analysis_pipeline = AnalysisPipeline([
+    Stage('personality', seeded_stage('personality', personality_analyzer.analyze),
+          ['seed', 'today', 'features'],
+          fallback=personality_analyzer._generate_default_result),
+    Stage('career', seeded_stage('career', career_predictor.predict),
+          ['seed', 'today', 'features', 'personality'],
+          fallback=career_predictor._generate_default_result),
+    Stage('wealth', seeded_stage('wealth', wealth_predictor.predict, dated=True),
+          ['seed', 'today', 'features', 'personality', 'career'],
+          fallback=wealth_predictor._generate_default_result, fallback_inputs=['today']),
+    Stage('love', seeded_stage('love', love_analyzer.analyze),
+          ['seed', 'today', 'features', 'personality'],
+          fallback=love_analyzer._generate_default_result),
+    Stage('fortune', seeded_stage('fortune', fortune_analyzer.analyze, dated=True),
+          ['seed', 'today', 'features', 'personality'],
+          fallback=fortune_analyzer._generate_default_result, fallback_inputs=['today']),
+    Stage('astrology', seeded_stage('astrology', astrology_analyzer.analyze),
+          ['seed', 'today', 'features'],
+          fallback=astrology_analyzer._generate_default_result),
+], max_workers=app.config['ANALYSIS_MAX_WORKERS'], timeout=app.config['ANALYSIS_STAGE_TIMEOUT'],
+    max_abandoned=app.config['ANALYSIS_MAX_ABANDONED'])
+
+# 完整分析结果缓存：同一用户同一天重复提交同一张图片时直接返回，特征或评分逻辑升级后自动失效
+result_cache = None
+if app.config['RESULT_CACHE_BACKEND'] != 'none':
+    result_cache = ResultCache(
+        create_result_backend(
+            app.config['RESULT_CACHE_BACKEND'],
+            url=app.config['RESULT_CACHE_URL'],
+            max_entries=app.config['RESULT_CACHE_SIZE']
+        ),
+        ttl=app.config['RESULT_CACHE_TTL'],
+        version=f'{ImageProcessor.FEATURE_VERSION}.{SCORING_VERSION}'
+    )
+
+# 上传原图落盘不在分析的关键路径上，由后台线程写入
+upload_writer = ThreadPoolExecutor(
+    max_workers=app.config['UPLOAD_WRITER_WORKERS'],
+    thread_name_prefix='upload-writer'
+)
+
+# 上传分析准入控制：并发闸门保护CPU密集的分析阶段，令牌桶按用户限流
+analysis_gate = AdmissionGate(
+    app.config['ANALYSIS_MAX_IN_FLIGHT'],
+    max_queue=app.config['ANALYSIS_MAX_QUEUE'],
+    queue_timeout=app.config['ANALYSIS_QUEUE_TIMEOUT'],
+    retry_after=app.config['ANALYSIS_RETRY_AFTER']
+)
+upload_limiter = None
+if app.config['UPLOAD_RATE_LIMIT'] > 0:
+    upload_limiter = TokenBucketLimiter(app.config['UPLOAD_RATE_LIMIT'], app.config['UPLOAD_RATE_BURST'])
+
+# 批量上传的各项在线程池中并行分析，特征提取与人脸检测期间会释放GIL
+batch_executor = ThreadPoolExecutor(
+    max_workers=app.config['BATCH_UPLOAD_WORKERS'],
+    thread_name_prefix='batch-analysis'
+)
 
 # 文件验证
 def allowed_file(filename):
@@ -75,6 +297,46 @@ def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in app.config['ALLOWED_EXTENSIONS']
 
+# 请求计数与耗时，按需剖析
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    if profiler is not None and wants_profile():
+        g.profile = profiler.start()
+
+@app.after_request
+def record_request(response):
+    profile = g.pop('profile', None)
+    if profile is not None:
+        request_id = secure_filename(request.headers.get('X-Request-ID', '')) or uuid.uuid4().hex
+        response.headers['X-Profile-Id'] = request_id
+        if response.is_streamed:
+            # 流式响应的分析在响应体迭代时才执行，响应关闭后再结束剖析，摘要只写日志
+            path = request.path
+            response.call_on_close(lambda: finish_profile(profile, request_id, path))
+        else:
+            summary = finish_profile(profile, request_id, request.path)
+            response.headers['X-Profile-Top'] = summary.encode('ascii', 'backslashreplace').decode('ascii')
+    
+    start = g.pop('request_start', None)
+    if start is not None:
+        endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+        metrics.count_request(request.method, endpoint, response.status_code, time.perf_counter() - start)
+    return response
+
+def finish_profile(profile, request_id, path):
+    """结束剖析并记录结果，返回热点函数摘要"""
+    filepath, summary = profiler.finish(profile, request_id)
+    app.logger.info(f"请求剖析已保存 {path} -> {filepath}: {summary}")
+    return summary
+
+@app.teardown_request
+def discard_profile(error=None):
+    # 请求异常中断、未经过 after_request 时释放剖析器
+    profile = g.pop('profile', None)
+    if profile is not None:
+        profiler.discard(profile)
+
 # API路由
 @app.route('/')
 def index():
@@ -109,7 +371,7 @@ def register():
         db.session.commit()
         
         # 生成token
-        access_token = create_access_token(identity=user.id)
+        access_token = issue_token(user)
         
         return jsonify({
             'message': '注册成功',
@@ -145,7 +407,7 @@ def login():
         user.last_login = datetime.utcnow()
         db.session.commit()
         
-        access_token = create_access_token(identity=user.id)
+        access_token = issue_token(user)
         
         return jsonify({
             'message': '登录成功',
@@ -167,69 +429,109 @@ def upload_and_analyze():
     try:
         user_id = get_jwt_identity()
         
-        if 'file' not in request.files:
-            return jsonify({'error': '未上传文件'}), 400
-        
-        file = request.files['file']
+        file, error = validate_upload()
+        if error:
+            return jsonify({'error': error}), 400
         
-        if file.filename == '':
-            return jsonify({'error': '文件名为空'}), 400
+        rejection = limit_upload_rate(user_id)
+        if rejection:
+            return rejection
         
-        if not allowed_file(file.filename):
-            return jsonify({'error': '不支持的文件格式'}), 400
+        # 异步模式：Celery worker从共享存储读取文件，需先落盘
+        if wants_async():
+            from celery_app import analyze_upload_task
+            filepath = save_upload(file, user_id)
+            task = analyze_upload_task.apply_async((user_id, filepath), task_id=new_job_id(user_id))
+            return jsonify({
+                'job_id': task.id,
+                'status': task.state
+            }), 202
         
-        # 保存文件
-        filename = secure_filename(file.filename)
-        timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
-        filename = f"{user_id}_{timestamp}_{filename}"
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
+        # 同步模式：图片直接在内存中解码，原图在后台写入
+        rejection = enter_analysis(user_id)
+        if rejection:
+            return rejection
+        try:
+            filepath, data = read_upload(file, user_id)
+            result = run_analysis(user_id, filepath, data)
+            with metrics.timer('json_encode'):
+                return jsonify(result), 200
+        finally:
+            analysis_gate.release()
         
-        # 提取特征
-        features = image_processor.extract_features(filepath)
-        
-        # 多维度分析
-        personality = personality_analyzer.analyze(features)
-        career = career_predictor.predict(features, personality)
-        wealth = wealth_predictor.predict(features, personality, career)
-        love = love_analyzer.analyze(features, personality)
-        fortune = fortune_analyzer.analyze(features, personality)
-        astrology = astrology_analyzer.analyze(features)
-        
-        # 生成建议
-        daily_advice = generate_daily_advice(fortune, personality)
-        monthly_advice = generate_monthly_advice(fortune, wealth, love)
-        yearly_advice = generate_yearly_advice(career, wealth, love)
-        
-        # 保存预测结果
-        prediction = Prediction(
-            user_id=user_id,
-            image_path=filepath,
-            personality_data=json.dumps(personality, ensure_ascii=False),
-            career_data=json.dumps(career, ensure_ascii=False),
-            wealth_data=json.dumps(wealth, ensure_ascii=False),
-            love_data=json.dumps(love, ensure_ascii=False),
-            fortune_data=json.dumps(fortune, ensure_ascii=False),
-            astrology_data=json.dumps(astrology, ensure_ascii=False)
-        )
-        
-        db.session.add(prediction)
-        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': f'分析失败: {str(e)}'}), 500
+
+@app.route('/api/upload/stream', methods=['POST'])
+@jwt_required()
+def upload_and_stream():
+    """上传文件并以SSE逐段推送分析结果"""
+    user_id = get_jwt_identity()
+    
+    file, error = validate_upload()
+    if error:
+        return jsonify({'error': error}), 400
+    
+    rejection = limit_upload_rate(user_id) or enter_analysis(user_id)
+    if rejection:
+        return rejection
+    
+    try:
+        filepath, image_data = read_upload(file, user_id)
+    except Exception as e:
+        analysis_gate.release()
+        return jsonify({'error': f'分析失败: {str(e)}'}), 500
+    
+    def generate():
+        try:
+            for section, data in iter_analysis(user_id, filepath, image_data):
+                yield format_sse(section, data)
+        except Exception as e:
+            db.session.rollback()
+            yield format_sse('error', {'error': f'分析失败: {str(e)}'})
+    
+    response = Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        }
+    )
+    # 推送结束或客户端断开时归还分析名额
+    response.call_on_close(analysis_gate.release)
+    return response
+
+@app.route('/api/upload/batch', methods=['POST'])
+@jwt_required()
+def upload_batch():
+    """
+    批量上传并分析：files 字段可包含多个图片/视频或zip压缩包
+    压缩包成员逐个读取送入分析，不整体解压到内存；逐项返回结果或错误
+    """
+    # 批量请求体可超过单文件上限，须在读取表单前设置
+    request.max_content_length = app.config['BATCH_UPLOAD_MAX_CONTENT_LENGTH']
+    
+    try:
+        user_id = get_jwt_identity()
+        uploads = [f for f in request.files.getlist('files') if f.filename]
+        if not uploads:
+            return jsonify({'error': '未上传文件'}), 400
         
-        return jsonify({
-            'prediction_id': prediction.id,
-            'personality': personality,
-            'career': career,
-            'wealth': wealth,
-            'love': love,
-            'fortune': fortune,
-            'astrology': astrology,
-            'advice': {
-                'daily': daily_advice,
-                'monthly': monthly_advice,
-                'yearly': yearly_advice
-            }
-        }), 200
+        # 每个分析项在读出时消耗一个令牌并占用一个分析名额，第一项即被拒绝时整批拒绝
+        try:
+            items = run_batch(user_id, iter_batch_items(uploads))
+        except AdmissionRejected as e:
+            return rejection_response(e, 429 if isinstance(e, RateLimited) else 503)
+        succeeded = sum(1 for item in items if 'error' not in item)
+        with metrics.timer('json_encode'):
+            return jsonify({
+                'total': len(items),
+                'succeeded': succeeded,
+                'failed': len(items) - succeeded,
+                'results': items
+            }), 200
         
     except Exception as e:
         db.session.rollback()
@@ -238,32 +540,195 @@ def upload_and_analyze():
 @app.route('/api/predictions', methods=['GET'])
 @jwt_required()
 def get_predictions():
-    """获取用户的所有预测记录"""
+    """
+    分页获取用户的预测记录，按创建时间倒序
+    参数: limit 每页条数, cursor 上一页返回的 next_cursor
+    """
     try:
         user_id = get_jwt_identity()
-        predictions = Prediction.query.filter_by(user_id=user_id).order_by(
-            Prediction.created_at.desc()
-        ).all()
+        limit = request.args.get('limit', app.config['PREDICTIONS_PAGE_SIZE'], type=int)
+        if limit is None or limit < 1:
+            return jsonify({'error': 'limit 必须为正整数'}), 400
+        limit = min(limit, app.config['PREDICTIONS_MAX_PAGE_SIZE'])
+        
+        # 列表只需要摘要，其余JSON大字段延迟加载
+        query = Prediction.query.options(
+            load_only(Prediction.id, Prediction.created_at, Prediction.fortune_data)
+        ).filter_by(user_id=user_id)
+        
+        cursor = request.args.get('cursor')
+        if cursor:
+            position = decode_cursor(cursor)
+            if position is None:
+                return jsonify({'error': '无效的分页游标'}), 400
+            created_at, last_id = position
+            query = query.filter(or_(
+                Prediction.created_at < created_at,
+                and_(Prediction.created_at == created_at, Prediction.id < last_id)
+            ))
+        
+        # 多取一条判断是否还有下一页
+        predictions = query.order_by(
+            Prediction.created_at.desc(), Prediction.id.desc()
+        ).limit(limit + 1).all()
+        has_more = len(predictions) > limit
+        predictions = predictions[:limit]
         
         results = []
         for pred in predictions:
-            fortune_data = json.loads(pred.fortune_data) if pred.fortune_data else {}
             results.append({
                 'id': pred.id,
                 'created_at': pred.created_at.isoformat(),
-                'fortune_summary': fortune_data.get('daily', {})
+                'fortune_summary': pred.fortune.get('daily', {})
             })
         
-        return jsonify({'predictions': results}), 200
+        next_cursor = None
+        if has_more:
+            last = predictions[-1]
+            next_cursor = encode_cursor(last.created_at, last.id)
+        
+        return jsonify({'predictions': results, 'next_cursor': next_cursor}), 200
         
     except Exception as e:
         return jsonify({'error': f'获取记录失败: {str(e)}'}), 500
 
+@app.route('/api/predictions/export', methods=['GET'])
+@jwt_required()
+def export_predictions():
+    """
+    流式导出用户的全部预测记录，按创建时间正序
+    参数: format ndjson(默认) / csv, fields 与预测详情相同的部分筛选
+    """
+    user_id = get_jwt_identity()
+    export_format = request.args.get('format', 'ndjson')
+    if export_format not in ('ndjson', 'csv'):
+        return jsonify({'error': 'format 仅支持 ndjson 或 csv'}), 400
+    try:
+        fields = parse_fields(PREDICTION_SECTIONS)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    sections = fields or {name: [] for name in PREDICTION_SECTIONS}
+    
+    def records():
+        """服务端游标分批读取，只查询所需的列，不进入ORM会话的标识映射"""
+        columns = [getattr(Prediction, PREDICTION_SECTIONS[name]) for name in sections]
+        scores = [getattr(Prediction, name) for name in SCORE_COLUMNS]
+        query = db.session.query(Prediction.id, Prediction.created_at, *scores, *columns).filter(
+            Prediction.user_id == user_id
+        ).order_by(Prediction.created_at, Prediction.id).yield_per(app.config['EXPORT_BATCH_SIZE'])
+        
+        for row in query:
+            record = {'id': row[0], 'created_at': row[1].isoformat()}
+            record.update(zip(SCORE_COLUMNS, row[2:2 + len(scores)]))
+            for (name, paths), raw in zip(sections.items(), row[2 + len(scores):]):
+                record[name] = project(prediction_codec.decode(raw), paths)
+            yield record
+    
+    def export_failed():
+        """
+        导出中途出错（如数据库错误或无法解码的记录）时记录日志
+        响应头已发出，无法再改状态码，由调用方在末尾写入错误标记，客户端据此判断导出不完整
+        """
+        app.logger.exception(f"导出预测记录中断 user={user_id}")
+        db.session.rollback()
+        return '导出中断，记录不完整'
+    
+    def generate_ndjson():
+        try:
+            for record in records():
+                yield json.dumps(record, ensure_ascii=False) + '\n'
+        except Exception:
+            yield json.dumps({'error': export_failed()}, ensure_ascii=False) + '\n'
+    
+    def generate_csv():
+        # 各部分以JSON字符串存放在单元格中
+        header = ['id', 'created_at', *SCORE_COLUMNS, *sections]
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(header)
+        try:
+            for record in records():
+                writer.writerow([
+                    json.dumps(record[key], ensure_ascii=False) if key in sections else record[key]
+                    for key in header
+                ])
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        except Exception:
+            # 末尾追加一行错误标记：首列为 error
+            writer.writerow(['error', export_failed()])
+        yield buffer.getvalue()
+    
+    if export_format == 'csv':
+        body, mimetype = generate_csv(), 'text/csv'
+    else:
+        body, mimetype = generate_ndjson(), 'application/x-ndjson'
+    return Response(
+        stream_with_context(body),
+        mimetype=mimetype,
+        headers={
+            'Content-Disposition': f'attachment; filename=predictions.{export_format}',
+            'X-Accel-Buffering': 'no'
+        }
+    )
+
 @app.route('/api/prediction/<int:prediction_id>', methods=['GET'])
 @jwt_required()
 def get_prediction_detail(prediction_id):
-    """获取预测详情"""
+    """
+    获取预测详情
+    参数: fields 逗号分隔的部分名称，支持嵌套键，如 fields=personality,fortune.daily
+    """
     try:
+        user_id = get_jwt_identity()
+        try:
+            fields = parse_fields(PREDICTION_SECTIONS)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        sections = fields or {name: [] for name in PREDICTION_SECTIONS}
+        
+        # 先只读取 id 与创建时间，ETag 匹配时无需加载和解析JSON
+        prediction = Prediction.query.options(
+            load_only(Prediction.id, Prediction.created_at)
+        ).filter_by(
+            id=prediction_id, 
+            user_id=user_id
+        ).first()
+        
+        if not prediction:
+            return jsonify({'error': '预测记录不存在'}), 404
+        
+        # 预测写入后不再变化，ETag 由记录标识与请求的字段决定
+        etag = f'prediction-{prediction.id}-{int(prediction.created_at.timestamp())}-{fields_digest(fields)}'
+        cache_control = f"private, max-age={app.config['PREDICTION_CACHE_MAX_AGE']}"
+        if request.if_none_match.contains(etag):
+            return with_cache_headers(Response(status=304), etag, cache_control)
+        
+        # 只加载并解析请求的部分
+        columns = [getattr(Prediction, PREDICTION_SECTIONS[name]) for name in sections]
+        values = db.session.query(*columns).filter(Prediction.id == prediction.id).one()
+        
+        result = {
+            'id': prediction.id,
+            'created_at': prediction.created_at.isoformat()
+        }
+        for (name, paths), raw in zip(sections.items(), values):
+            result[name] = project(prediction_codec.decode(raw), paths)
+        
+        return with_cache_headers(jsonify(result), etag, cache_control), 200
+        
+    except Exception as e:
+        return jsonify({'error': f'获取详情失败: {str(e)}'}), 500
+
+@app.route('/api/prediction/<int:prediction_id>/reproduce', methods=['GET'])
+@jwt_required()
+def reproduce_prediction_detail(prediction_id):
+    """按原图与分析日期复现历史预测"""
+    try:
+        if not app.config['DETERMINISTIC_SCORING']:
+            return jsonify({'error': '未启用确定性评分，无法复现'}), 400
+        
         user_id = get_jwt_identity()
         prediction = Prediction.query.filter_by(
             id=prediction_id, 
@@ -272,57 +737,770 @@ def get_prediction_detail(prediction_id):
         
         if not prediction:
             return jsonify({'error': '预测记录不存在'}), 404
+        if not prediction.image_path or not os.path.exists(prediction.image_path):
+            return jsonify({'error': '原始图片不存在'}), 404
         
         return jsonify({
             'id': prediction.id,
             'created_at': prediction.created_at.isoformat(),
-            'personality': json.loads(prediction.personality_data) if prediction.personality_data else {},
-            'career': json.loads(prediction.career_data) if prediction.career_data else {},
-            'wealth': json.loads(prediction.wealth_data) if prediction.wealth_data else {},
-            'love': json.loads(prediction.love_data) if prediction.love_data else {},
-            'fortune': json.loads(prediction.fortune_data) if prediction.fortune_data else {},
-            'astrology': json.loads(prediction.astrology_data) if prediction.astrology_data else {}
+            **reproduce_prediction(prediction)
         }), 200
         
     except Exception as e:
-        return jsonify({'error': f'获取详情失败: {str(e)}'}), 500
+        return jsonify({'error': f'复现预测失败: {str(e)}'}), 500
 
 @app.route('/api/dashboard/stats', methods=['GET'])
 @jwt_required()
 def get_dashboard_stats():
-    """获取仪表盘统计"""
+    """
+    获取仪表盘统计
+    参数: fields 逗号分隔的字段名称，支持嵌套键，如 fields=daily.today,love_score
+    """
     try:
         user_id = get_jwt_identity()
-        latest_prediction = Prediction.query.filter_by(user_id=user_id).order_by(
-            Prediction.created_at.desc()
-        ).first()
+        try:
+            fields = parse_fields(DASHBOARD_FIELDS)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        if not latest_prediction:
-            return jsonify({'error': '暂无预测数据'}), 404
+        # 主键读取摘要；尚未回填的用户按最新预测生成一次
+        summary = db.session.get(DashboardSummary, user_id)
+        if summary is None:
+            summary = refresh_dashboard_summary(user_id)
+            if summary is None:
+                return jsonify({'error': '暂无预测数据'}), 404
+            db.session.commit()
         
-        fortune_data = json.loads(latest_prediction.fortune_data) if latest_prediction.fortune_data else {}
-        wealth_data = json.loads(latest_prediction.wealth_data) if latest_prediction.wealth_data else {}
-        love_data = json.loads(latest_prediction.love_data) if latest_prediction.love_data else {}
-        career_data = json.loads(latest_prediction.career_data) if latest_prediction.career_data else {}
+        # 摘要随新预测更新，客户端每次需重新验证
+        etag = f'dashboard-{user_id}-{summary.prediction_id}-{fields_digest(fields)}'
+        cache_control = 'private, no-cache'
+        if request.if_none_match.contains(etag):
+            return with_cache_headers(Response(status=304), etag, cache_control)
         
-        return jsonify({
-            'daily': fortune_data.get('daily', {}),
-            'monthly': fortune_data.get('monthly', {}),
-            'yearly': fortune_data.get('yearly', {}),
-            'wealth_trend': wealth_data.get('accumulationTrend', []),
-            'love_score': love_data.get('stabilityScore', 0),
-            'career_fields': career_data.get('bestFields', [])
-        }), 200
+        if not fields:
+            response = Response(summary.payload, mimetype='application/json')
+        else:
+            data = json.loads(summary.payload)
+            response = jsonify({name: project(data.get(name), paths) for name, paths in fields.items()})
+        return with_cache_headers(response, etag, cache_control), 200
         
     except Exception as e:
         return jsonify({'error': f'获取统计失败: {str(e)}'}), 500
 
+@app.route('/api/stats/scores', methods=['GET'])
+@jwt_required()
+def get_score_stats():
+    """
+    统计用户近期的分数
+    参数: days 统计最近天数(默认7), threshold 日运势阈值(默认80)
+    """
+    try:
+        user_id = get_jwt_identity()
+        days = request.args.get('days', 7, type=int)
+        threshold = request.args.get('threshold', 80, type=int)
+        if days is None or days < 1 or threshold is None:
+            return jsonify({'error': 'days 与 threshold 必须为整数，days 至少为1'}), 400
+        
+        since = datetime.utcnow() - timedelta(days=days)
+        stats = score_aggregates(
+            Prediction.user_id == user_id,
+            Prediction.created_at >= since,
+            threshold=threshold
+        )
+        return jsonify({'days': days, **stats}), 200
+        
+    except Exception as e:
+        return jsonify({'error': f'获取统计失败: {str(e)}'}), 500
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+@jwt_required()
+def get_job_status(job_id):
+    """查询异步分析任务状态"""
+    try:
+        from celery_app import celery
+        user_id = get_jwt_identity()
+        # 任务ID中记录了提交者，任何状态下都只对提交者可见
+        if job_owner(job_id) != user_id:
+            return jsonify({'error': '任务不存在'}), 404
+        
+        result = celery.AsyncResult(job_id)
+        state = result.state
+        
+        response = {'job_id': job_id, 'status': state}
+        
+        if state == 'SUCCESS':
+            payload = result.result or {}
+            if payload.get('user_id') != user_id:
+                return jsonify({'error': '任务不存在'}), 404
+            response['result'] = payload.get('result')
+        elif state == 'FAILURE':
+            # 异常内容可能包含路径等内部信息，只写日志
+            app.logger.error(f"异步分析任务 {job_id} 失败: {result.result!r}")
+            response['error'] = '分析失败'
+        
+        return jsonify(response), 200
+        
+    except Exception as e:
+        return jsonify({'error': f'获取任务状态失败: {str(e)}'}), 500
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """健康检查"""
-    return jsonify({'status': 'healthy'}), 200
+    return jsonify({
+        'status': 'healthy',
+        'feature_cache': image_processor.cache_stats(),
+        'detector_pool': image_processor.detector_stats(),
+        'result_cache': result_cache.stats() if result_cache is not None else None,
+        'admission': {
+            'gate': analysis_gate.stats(),
+            'rate_limit': upload_limiter.stats() if upload_limiter is not None else None
+        }
+    }), 200
+
+@app.route('/api/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Prometheus文本格式的运行指标"""
+    return Response(metrics.render(collect_metrics()), mimetype='text/plain; version=0.0.4; charset=utf-8')
 
 # 辅助函数
+def collect_metrics():
+    """汇总各组件的统计为指标: [(名称, 类型, 说明, [(标签字典, 数值)])]"""
+    collected = []
+    
+    def add(name, kind, help_text, value, **labels):
+        collected.append((name, kind, help_text, [(labels, value)]))
+    
+    caches = {'feature': image_processor.cache_stats()}
+    if result_cache is not None:
+        caches['result'] = result_cache.stats()
+    for cache, stats in caches.items():
+        add('cache_hits_total', 'counter', '缓存命中数', stats['hits'], cache=cache)
+        add('cache_misses_total', 'counter', '缓存未命中数', stats['misses'], cache=cache)
+        add('cache_hit_rate', 'gauge', '缓存命中率', stats['hit_rate'], cache=cache)
+    
+    detector = image_processor.detector_stats()
+    add('detector_pool_idle', 'gauge', '空闲检测器实例数', detector['idle'])
+    add('detector_pool_wait_seconds_total', 'counter', '等待检测器的累计时间', detector['wait_seconds_total'])
+    
+    gate = analysis_gate.stats()
+    add('analysis_in_flight', 'gauge', '正在执行的分析请求数', gate['in_flight'])
+    add('analysis_queued', 'gauge', '排队等待的分析请求数', gate['queued'])
+    add('analysis_admitted_total', 'counter', '准入的分析请求数', gate['admitted'])
+    add('analysis_rejected_total', 'counter', '被拒绝的分析请求数', gate['rejected_full'], reason='full')
+    add('analysis_rejected_total', 'counter', '被拒绝的分析请求数', gate['rejected_timeout'], reason='timeout')
+    add('analysis_abandoned_stages', 'gauge', '超时后仍在运行的分析阶段数', analysis_pipeline.abandoned())
+    if upload_limiter is not None:
+        add('upload_rate_limited_total', 'counter', '被限流的上传请求数', upload_limiter.stats()['rejected'])
+    if profiler is not None:
+        profiles = profiler.stats()
+        add('profiled_requests_total', 'counter', '已剖析的请求数', profiles['profiled'])
+        add('profile_skipped_total', 'counter', '因已有剖析进行而跳过的请求数', profiles['skipped'])
+    
+    # SQLite等使用的连接池没有容量统计，按实际提供的方法输出
+    pool = db.engine.pool
+    for name, help_text in (('size', '连接池容量'), ('checkedout', '已借出连接数'),
+                            ('checkedin', '空闲连接数'), ('overflow', '溢出连接数')):
+        if hasattr(pool, name):
+            add(f'db_pool_{name}', 'gauge', help_text, getattr(pool, name)())
+    
+    # 同名指标合并为一组样本，HELP/TYPE 只输出一次
+    merged = {}
+    for name, kind, help_text, samples in collected:
+        merged.setdefault(name, (name, kind, help_text, []))[3].extend(samples)
+    return list(merged.values())
+
+def issue_token(user):
+    """签发访问令牌，管理员带 admin 声明"""
+    claims = {'admin': True} if user.username in app.config['ADMIN_USERNAMES'] else None
+    return create_access_token(identity=user.id, additional_claims=claims)
+
+def is_admin_request():
+    """请求携带有效的剖析令牌，或管理员的访问令牌"""
+    token = app.config['PROFILING_TOKEN']
+    # 按字节比较：compare_digest 不接受含非ASCII字符的字符串
+    supplied = request.headers.get('X-Profile-Token', '')
+    if token and hmac.compare_digest(supplied.encode('utf-8'), token.encode('utf-8')):
+        return True
+    try:
+        verify_jwt_in_request(optional=True)
+        return bool(get_jwt().get('admin'))
+    except Exception:
+        # 令牌无效时由接口自身返回错误
+        return False
+
+def wants_profile():
+    """是否剖析本次请求：显式要求时须为管理员，否则按比例抽样上传请求"""
+    if request.headers.get('X-Profile') or request.headers.get('X-Profile-Token'):
+        return is_admin_request()
+    return request.path.startswith('/api/upload') and profiler.sampled()
+
+def validate_upload():
+    """校验上传请求，返回 (文件, 错误信息)"""
+    if 'file' not in request.files:
+        return None, '未上传文件'
+    
+    file = request.files['file']
+    
+    if file.filename == '':
+        return None, '文件名为空'
+    
+    if not allowed_file(file.filename):
+        return None, '不支持的文件格式'
+    
+    return file, None
+
+def rejection_response(error, status):
+    """准入拒绝的快速响应，附带 Retry-After"""
+    response = jsonify({'error': error.reason})
+    response.status_code = status
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response
+
+def limit_upload_rate(user_id):
+    """按用户令牌桶限流，超出时返回429响应，否则返回None"""
+    if upload_limiter is None:
+        return None
+    try:
+        upload_limiter.acquire(user_id)
+    except AdmissionRejected as e:
+        return rejection_response(e, 429)
+    return None
+
+def enter_analysis(user_id):
+    """
+    占用分析名额，闸门已满或排队超时返回503响应，否则返回None
+    占用成功时调用方须在分析结束后调用 analysis_gate.release()
+    被拒绝时退还该用户已消耗的限流令牌，过载期间的重试不会耗尽配额
+    """
+    try:
+        analysis_gate.acquire()
+    except AdmissionRejected as e:
+        refund_upload_rate(user_id)
+        return rejection_response(e, 503)
+    return None
+
+def refund_upload_rate(user_id):
+    """退还一个上传令牌"""
+    if upload_limiter is not None:
+        upload_limiter.refund(user_id)
+
+def build_upload_path(filename, user_id):
+    """
+    生成上传文件的保存路径
+    扩展名单独保留：secure_filename 会去掉非ASCII字符，'视频.avi' 只剩 'avi'，
+    之后按扩展名判断视频时会被当作图片
+    """
+    stem, _, ext = filename.rpartition('.')
+    if not stem:
+        stem, ext = ext, ''
+    filename = secure_filename(stem) or 'upload'
+    ext = secure_filename(ext).lower()
+    if ext:
+        filename = f"{filename}.{ext}"
+    timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
+    filename = f"{user_id}_{timestamp}_{filename}"
+    return os.path.join(app.config['UPLOAD_FOLDER'], filename)
+
+def save_upload(file, user_id):
+    """保存上传文件，返回保存路径"""
+    filepath = build_upload_path(file.filename, user_id)
+    with metrics.timer('file_save'):
+        file.save(filepath)
+    return filepath
+
+def write_upload_later(filepath, data):
+    """在后台线程中写入上传文件"""
+    def write():
+        with metrics.timer('file_save'), open(filepath, 'wb') as f:
+            f.write(data)
+    
+    def log_error(future):
+        if future.exception() is not None:
+            app.logger.error(f"上传文件写入失败 {filepath}: {future.exception()}")
+    
+    future = upload_writer.submit(write)
+    future.add_done_callback(log_error)
+    return future
+
+def read_upload(file, user_id):
+    """
+    读取上传文件，返回 (保存路径, 内存数据)
+    图片在内存中分析、后台落盘；视频需按帧读取，先同步落盘且不返回内存数据
+    """
+    if image_processor.is_video(file.filename):
+        return save_upload(file, user_id), None
+    
+    data = file.read()
+    filepath = build_upload_path(file.filename, user_id)
+    write_upload_later(filepath, data)
+    return filepath, data
+
+def iter_batch_items(uploads):
+    """
+    展开批量上传的文件，逐项产出 (文件名, 数据, 错误信息)
+    zip压缩包按成员逐个读取；达到数量上限后产出一条截断错误并停止，
+    不再遍历剩余的文件与压缩包成员
+    """
+    max_items = app.config['BATCH_UPLOAD_MAX_ITEMS']
+    max_size = app.config['MAX_CONTENT_LENGTH']
+    truncated = f'超过单次批量上限 {max_items} 项，其余文件未处理'
+    count = 0
+    
+    def over_limit():
+        nonlocal count
+        count += 1
+        return count > max_items
+    
+    def check(filename, size=None):
+        if not allowed_file(filename):
+            return '不支持的文件格式'
+        if size is not None and max_size and size > max_size:
+            return '文件过大'
+        return None
+    
+    for upload in uploads:
+        if not upload.filename.lower().endswith('.zip'):
+            if over_limit():
+                yield upload.filename, None, truncated
+                return
+            error = check(upload.filename)
+            yield upload.filename, None if error else upload.read(), error
+            continue
+        
+        try:
+            archive = zipfile.ZipFile(upload.stream)
+        except zipfile.BadZipFile:
+            yield upload.filename, None, '无效的压缩包'
+            continue
+        
+        with archive:
+            for info in archive.infolist():
+                if info.is_dir():
+                    continue
+                if over_limit():
+                    yield info.filename, None, truncated
+                    return
+                error = check(info.filename, info.file_size)
+                if error:
+                    yield info.filename, None, error
+                    continue
+                try:
+                    data = archive.read(info)
+                except (zipfile.BadZipFile, NotImplementedError, RuntimeError) as e:
+                    yield info.filename, None, f'压缩包成员读取失败: {e}'
+                    continue
+                yield info.filename, data, None
+
+def analyze_batch_item(user_id, filepath, data, analysis_time):
+    """在批量工作线程中分析单项，返回各部分结果；不访问数据库"""
+    if image_processor.is_video(filepath):
+        # 视频需按帧读取，先落盘
+        with metrics.timer('file_save'), open(filepath, 'wb') as f:
+            f.write(data)
+        return dict(iter_results(user_id, filepath, None, analysis_time))
+    
+    write_upload_later(filepath, data)
+    return dict(iter_results(user_id, filepath, data, analysis_time))
+
+def admit_batch_item(user_id, pending):
+    """
+    为批量中的一项消耗限流令牌并占用分析名额，被拒绝时抛出 AdmissionRejected
+    名额被本批在途的项占满而无法排队时，等本批最早的一项结束后重试
+    """
+    if upload_limiter is not None:
+        upload_limiter.acquire(user_id)
+    while True:
+        try:
+            analysis_gate.acquire()
+            return
+        except AdmissionRejected:
+            if not pending:
+                refund_upload_rate(user_id)
+                raise
+            pending.popleft().exception()
+
+def run_admitted(func, *args):
+    """执行已占用分析名额的任务，结束后归还名额"""
+    try:
+        return func(*args)
+    finally:
+        analysis_gate.release()
+
+def run_batch(user_id, items):
+    """
+    在线程池中并行分析批量上传的各项，所有预测记录一次性批量插入
+    同时在途的项数有上限，压缩包成员按需读取，内存占用与批量大小无关
+    每项单独限流并占用分析名额；尚未提交任何项时被拒绝则抛出 AdmissionRejected，
+    之后被拒绝的项记为错误
+    返回与输入顺序一致的逐项结果
+    """
+    analysis_time = datetime.utcnow()
+    max_pending = app.config['BATCH_UPLOAD_WORKERS'] * 2
+    entries = []
+    pending = deque()
+    
+    for index, (filename, data, error) in enumerate(items):
+        if error:
+            entries.append((filename, None, None, error))
+            continue
+        
+        while len(pending) >= max_pending:
+            pending.popleft().exception()
+        
+        try:
+            admit_batch_item(user_id, pending)
+        except AdmissionRejected as e:
+            if not any(future for _, _, future, _ in entries):
+                raise
+            entries.append((filename, None, None, e.reason))
+            continue
+        
+        # 压缩包内不同目录可能有同名文件，加序号区分
+        filepath = build_upload_path(f'{index}_{os.path.basename(filename)}', user_id)
+        future = batch_executor.submit(run_admitted, analyze_batch_item, user_id, filepath, data, analysis_time)
+        pending.append(future)
+        entries.append((filename, filepath, future, None))
+    
+    outcomes = []
+    predictions = []
+    for filename, filepath, future, error in entries:
+        item = {'filename': filename}
+        outcomes.append(item)
+        if future is not None:
+            try:
+                results = future.result()
+            except Exception as e:
+                error = f'分析失败: {str(e)}'
+        if error:
+            item['error'] = error
+            continue
+        
+        prediction = build_prediction(user_id, filepath, analysis_time, results)
+        predictions.append((item, prediction, results))
+        item.update(results)
+    
+    if predictions:
+        # 一次flush批量插入所有记录，SQLAlchemy按插入顺序取回各行主键
+        # 最后一条为最新预测
+        with metrics.timer('db_commit'):
+            db.session.add_all([prediction for _, prediction, _ in predictions])
+            db.session.flush()
+            for item, prediction, _ in predictions:
+                item['prediction_id'] = prediction.id
+            _, latest, results = predictions[-1]
+            update_dashboard_summary(latest, results)
+            db.session.commit()
+    
+    return outcomes
+
+def iter_analysis(user_id, filepath, data=None):
+    """
+    逐段执行分析流程，每完成一个部分即产出 (部分名称, 结果)
+    提供 data 时直接从内存解码，否则从 filepath 读取
+    """
+    analysis_time = datetime.utcnow()
+    results = {}
+    for section, section_data in iter_results(user_id, filepath, data, analysis_time):
+        results[section] = section_data
+        yield section, section_data
+    
+    prediction = build_prediction(user_id, filepath, analysis_time, results)
+    with metrics.timer('db_commit'):
+        db.session.add(prediction)
+        db.session.flush()
+        update_dashboard_summary(prediction, results)
+        db.session.commit()
+    
+    yield 'done', {'prediction_id': prediction.id}
+
+def iter_results(user_id, filepath, data, analysis_time):
+    """
+    提取特征并逐段产出分析结果，不访问数据库，可在工作线程中调用
+    同一用户同一天重复提交同一张图片时直接返回缓存结果
+    """
+    digest = content_hash(data) if data is not None else file_hash(filepath)
+    analysis_date = local_time(analysis_time).date()
+    
+    results = None
+    if result_cache is not None:
+        results = result_cache.get(digest, user_id, analysis_date)
+    
+    if results is not None:
+        yield from results.items()
+        return
+    
+    # 提取特征
+    extraction = {}
+    if data is not None:
+        features = image_processor.extract_features_from_bytes(data, digest, extraction)
+    else:
+        features = image_processor.extract_features(
+            filepath, digest, extraction, deterministic=app.config['DETERMINISTIC_SCORING']
+        )
+    
+    results = {}
+    stats = {}
+    for section, section_data in iter_sections(user_id, features, analysis_time, stats):
+        results[section] = section_data
+        yield section, section_data
+    
+    # 特征提取失败（如检测器繁忙超时）或有阶段使用了默认结果时不缓存
+    if extraction.get('fallback'):
+        return
+    if result_cache is not None and all(info['status'] == 'ok' for info in stats.values()):
+        result_cache.set(digest, user_id, analysis_date, results)
+
+def local_time(analysis_time):
+    """
+    UTC分析时间转换为服务器本地时间
+    created_at 以UTC保存；运势日期、随机种子与结果缓存按本地日期计算
+    """
+    return analysis_time.replace(tzinfo=timezone.utc).astimezone().replace(tzinfo=None)
+
+def build_prediction(user_id, filepath, analysis_time, results):
+    """由分析结果构造预测记录，创建时间即分析日期，用于复现"""
+    return Prediction(
+        user_id=user_id,
+        image_path=filepath,
+        created_at=analysis_time,
+        personality=results['personality'],
+        career=results['career'],
+        wealth=results['wealth'],
+        love=results['love'],
+        fortune=results['fortune'],
+        astrology=results['astrology'],
+        **extract_scores(results)
+    )
+
+def build_dashboard(sections):
+    """从分析结果中提取仪表盘字段"""
+    return {
+        name: sections.get(section, {}).get(key, default)
+        for name, (section, key, default) in DASHBOARD_FIELDS.items()
+    }
+
+def extract_scores(sections):
+    """从分析结果中提取分数列的值，缺失或类型不符时为None"""
+    scores = {}
+    for column, (section, path) in SCORE_COLUMNS.items():
+        value = sections.get(section)
+        for key in path:
+            value = value.get(key) if isinstance(value, dict) else None
+        if column == 'mbti':
+            scores[column] = value if isinstance(value, str) else None
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            scores[column] = int(value)
+        else:
+            scores[column] = None
+    return scores
+
+def score_aggregates(*filters, threshold=80):
+    """
+    在SQL中聚合分数列，返回记录数、各分数均值、日运势达到阈值的记录数及MBTI分布
+    filters: 额外的查询条件，如按用户或时间范围筛选
+    """
+    numeric = [name for name in SCORE_COLUMNS if name != 'mbti']
+    row = db.session.query(
+        func.count(Prediction.id),
+        func.sum(case((Prediction.daily_today >= threshold, 1), else_=0)),
+        *[func.avg(getattr(Prediction, name)) for name in numeric]
+    ).filter(*filters).one()
+    
+    mbti = db.session.query(Prediction.mbti, func.count(Prediction.id)).filter(
+        Prediction.mbti.isnot(None), *filters
+    ).group_by(Prediction.mbti).all()
+    
+    return {
+        'count': row[0],
+        'daily_at_least': {'threshold': threshold, 'count': int(row[1] or 0)},
+        'averages': {
+            name: round(float(value), 2) if value is not None else None
+            for name, value in zip(numeric, row[2:])
+        },
+        'mbti': dict(mbti)
+    }
+
+def update_dashboard_summary(prediction, sections):
+    """
+    在当前事务中写入用户的仪表盘摘要，由调用方提交
+    已有更新的预测时保持不变，避免并发写入时旧结果覆盖新结果
+    """
+    values = {
+        'prediction_id': prediction.id,
+        'payload': json.dumps(build_dashboard(sections), ensure_ascii=False)
+    }
+    if not update_summary_if_older(prediction.user_id, values):
+        if db.session.get(DashboardSummary, prediction.user_id, populate_existing=True) is None:
+            try:
+                with db.session.begin_nested():
+                    db.session.add(DashboardSummary(user_id=prediction.user_id, **values))
+            except IntegrityError:
+                # 同一用户的并发请求已先插入摘要，改为条件更新
+                update_summary_if_older(prediction.user_id, values)
+    return db.session.get(DashboardSummary, prediction.user_id, populate_existing=True)
+
+def update_summary_if_older(user_id, values):
+    """
+    摘要来自不更新的预测时才写入，返回是否写入
+    比较放在 UPDATE 的条件中，由数据库在行锁下判断，不依赖事先读到的可能已过期的行
+    """
+    result = db.session.execute(
+        update(DashboardSummary)
+        .where(
+            DashboardSummary.user_id == user_id,
+            DashboardSummary.prediction_id <= values['prediction_id']
+        )
+        .values(**values)
+        .execution_options(synchronize_session='fetch')
+    )
+    return result.rowcount > 0
+
+def refresh_dashboard_summary(user_id):
+    """按用户最新的预测重建仪表盘摘要，由调用方提交；没有预测时返回None"""
+    columns = [getattr(Prediction, PREDICTION_SECTIONS[name]) for name in DASHBOARD_SECTIONS]
+    latest = Prediction.query.options(
+        load_only(Prediction.id, Prediction.user_id, *columns)
+    ).filter_by(user_id=user_id).order_by(
+        Prediction.created_at.desc(), Prediction.id.desc()
+    ).first()
+    if latest is None:
+        return None
+    
+    sections = {name: getattr(latest, name) for name in DASHBOARD_SECTIONS}
+    return update_dashboard_summary(latest, sections)
+
+def iter_sections(user_id, features, analysis_time, stats=None):
+    """
+    执行各分析阶段并生成建议，每完成一个部分即产出 (部分名称, 结果)
+    启用确定性评分时，随机种子由 (特征, 用户ID, 分析日期) 决定
+    analysis_time: UTC分析时间，各分析器使用其本地时间
+    stats: 传入字典时记录各阶段的耗时与状态
+    """
+    today = local_time(analysis_time)
+    seed = None
+    if app.config['DETERMINISTIC_SCORING']:
+        seed = analysis_seed(features, user_id, today.date())
+    
+    # 多维度分析：无依赖关系的阶段并行执行，完成一个推送一个
+    # 剖析中的请求在当前线程内串行执行，cProfile 只记录当前线程
+    context = {'features': features, 'seed': seed, 'today': today}
+    inline = profiler is not None and profiler.is_active()
+    results = {}
+    for section, data, info in analysis_pipeline.iter_run(context, inline=inline):
+        results[section] = data
+        metrics.observe(section, info['elapsed'])
+        if stats is not None:
+            stats[section] = info
+        if info['status'] != 'ok':
+            app.logger.warning(f"分析阶段 {section} {info['status']}，已使用默认结果")
+        yield section, data
+    
+    # 生成建议
+    with metrics.timer('advice'):
+        advice = {
+            'daily': generate_daily_advice(results['fortune'], results['personality']),
+            'monthly': generate_monthly_advice(results['fortune'], results['wealth'], results['love']),
+            'yearly': generate_yearly_advice(results['career'], results['wealth'], results['love'])
+        }
+    yield 'advice', advice
+
+def reproduce_prediction(prediction):
+    """按原图与创建日期重新计算历史预测（需启用确定性评分），不保存结果"""
+    features = image_processor.extract_features(prediction.image_path, deterministic=True)
+    return dict(iter_sections(prediction.user_id, features, prediction.created_at))
+
+def run_analysis(user_id, filepath, data=None):
+    """执行完整分析流程并保存预测结果"""
+    result = dict(iter_analysis(user_id, filepath, data))
+    done = result.pop('done')
+    return {'prediction_id': done['prediction_id'], **result}
+
+def format_sse(event, data):
+    """格式化SSE事件"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+def parse_fields(allowed):
+    """
+    解析 fields 查询参数，返回 {顶层字段: 嵌套路径列表}，路径列表为空表示整个字段
+    未提供参数时返回None，包含未知字段时抛出 ValueError
+    """
+    value = request.args.get('fields', '')
+    selected = {}
+    for item in value.split(','):
+        path = item.strip()
+        if not path:
+            continue
+        top, _, rest = path.partition('.')
+        if top not in allowed:
+            raise ValueError(f'未知字段: {top}')
+        if not rest:
+            selected[top] = []
+        elif selected.get(top) != []:
+            selected.setdefault(top, []).append(rest)
+    return selected or None
+
+def project(data, paths):
+    """按点分路径裁剪嵌套字典，paths 为空时返回原数据"""
+    if not paths:
+        return data
+    
+    result = {}
+    for path in paths:
+        keys = path.split('.')
+        source, target = data, result
+        for key in keys[:-1]:
+            if not isinstance(source, dict) or key not in source:
+                break
+            source = source[key]
+            target = target.setdefault(key, {})
+        else:
+            if isinstance(source, dict) and keys[-1] in source:
+                target[keys[-1]] = source[keys[-1]]
+    return result
+
+def fields_digest(fields):
+    """字段选择的短摘要，用于区分同一资源的不同投影"""
+    if not fields:
+        return 'all'
+    canonical = json.dumps(fields, sort_keys=True)
+    return hashlib.sha1(canonical.encode('utf-8')).hexdigest()[:12]
+
+def with_cache_headers(response, etag, cache_control):
+    """设置强ETag与Cache-Control"""
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = cache_control
+    return response
+
+def encode_cursor(created_at, prediction_id):
+    """将分页位置编码为不透明的游标字符串"""
+    raw = json.dumps([created_at.isoformat(), prediction_id]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor):
+    """解析游标，返回 (created_at, id)，格式错误时返回None"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        created_at, prediction_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), int(prediction_id)
+    except (binascii.Error, ValueError, TypeError):
+        return None
+
+def new_job_id(user_id):
+    """生成异步任务ID，前缀为提交者的用户ID"""
+    return f'{user_id}-{uuid.uuid4().hex}'
+
+def job_owner(job_id):
+    """从任务ID解析提交者的用户ID，格式不符时返回None"""
+    owner, _, token = job_id.partition('-')
+    if not (owner.isascii() and owner.isdigit()) or not token:
+        return None
+    return int(owner)
+
+def wants_async():
+    """判断请求是否要求异步分析"""
+    value = request.args.get('async') or request.form.get('async') or ''
+    return value.lower() in ('1', 'true', 'yes')
+
 def generate_daily_advice(fortune, personality):
     """生成今日建议"""
     score = fortune.get('daily', {}).get('today', 70)
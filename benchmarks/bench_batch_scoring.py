@@ -0,0 +1,66 @@
+"""
+批量评分基准：逐条标量计算 vs 向量化批量计算
+用法: python benchmarks/bench_batch_scoring.py [-n 100000]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from services.personality_analyzer import PersonalityAnalyzer
+from services.career_predictor import CareerPredictor
+from services.wealth_predictor import WealthPredictor
+from services.love_analyzer import LoveAnalyzer
+
+def main(argv=None):
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description='批量评分基准')
+    parser.add_argument('-n', type=int, default=100000, help='样本数')
+    args = parser.parse_args(argv)
+    
+    rng = np.random.default_rng(0)
+    features = np.column_stack([
+        rng.uniform(0.6, 1.2, args.n),
+        rng.uniform(0, 255, args.n),
+        rng.uniform(0, 100, args.n),
+        rng.uniform(0, 400, args.n),
+        rng.uniform(0, 1, args.n)
+    ])
+    feature_list = [dict(zip(PersonalityAnalyzer.FEATURE_COLUMNS, row)) for row in features.tolist()]
+    
+    personality_analyzer = PersonalityAnalyzer()
+    career_predictor = CareerPredictor()
+    wealth_predictor = WealthPredictor()
+    love_analyzer = LoveAnalyzer()
+    
+    # 标量路径：只计算批量模式覆盖的字段
+    start = time.perf_counter()
+    for f in feature_list:
+        big_five = personality_analyzer._calculate_big_five(f)
+        personality_analyzer._infer_mbti(big_five, f)
+        success_rate = career_predictor._calculate_success_rate(big_five)
+        wealth_predictor._calculate_current_trend(big_five, success_rate)
+        wealth_predictor._calculate_risk_tolerance(big_five)
+        love_analyzer._calculate_stability(big_five)
+        love_analyzer._calculate_attractiveness(big_five)
+    scalar_seconds = time.perf_counter() - start
+    
+    start = time.perf_counter()
+    personality = personality_analyzer.analyze_batch(features, rng)
+    career = career_predictor.predict_batch(personality['bigFive'], rng)
+    wealth_predictor.predict_batch(personality['bigFive'], career['successRate'], rng)
+    love_analyzer.analyze_batch(personality['bigFive'], rng)
+    batch_seconds = time.perf_counter() - start
+    
+    print(f"样本数: {args.n}")
+    print(f"标量逐条: {scalar_seconds * 1000:.1f}ms")
+    print(f"向量批量: {batch_seconds * 1000:.1f}ms")
+    print(f"加速: {scalar_seconds / batch_seconds:.1f}x")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""
+人脸检测基准测试：原图检测 vs 缩小后检测
+用法: python benchmarks/bench_face_detection.py <图片或目录...> [--max-dim 640] [--repeat 5]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import cv2
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from extract_features import iter_image_paths
+from services.image_processor import ImageProcessor
+
+def iou(a, b):
+    """两个检测框的交并比"""
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    ix = max(0, min(ax + aw, bx + bw) - max(ax, bx))
+    iy = max(0, min(ay + ah, by + bh) - max(ay, by))
+    inter = ix * iy
+    union = aw * ah + bw * bh - inter
+    return inter / union if union else 0.0
+
+def time_detect(processor, img, repeat):
+    """多次检测取最短耗时(毫秒)"""
+    best = float('inf')
+    face = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        face = processor._detect_face(img)
+        best = min(best, time.perf_counter() - start)
+    return face, best * 1000
+
+def main(argv=None):
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description='人脸检测延迟与一致性对比')
+    parser.add_argument('sources', nargs='+', help='图片文件或目录')
+    parser.add_argument('--max-dim', type=int, default=640, help='缩小检测的长边上限')
+    parser.add_argument('--repeat', type=int, default=5, help='每张图片重复次数')
+    args = parser.parse_args(argv)
+    
+    full = ImageProcessor(max_detect_dim=0)
+    fast = ImageProcessor(max_detect_dim=args.max_dim)
+    
+    full_ms, fast_ms = [], []
+    agree = both_found = total = 0
+    for path in iter_image_paths(args.sources):
+        img = cv2.imread(path)
+        if img is None:
+            continue
+        total += 1
+        full_face, t_full = time_detect(full, img, args.repeat)
+        fast_face, t_fast = time_detect(fast, img, args.repeat)
+        full_ms.append(t_full)
+        fast_ms.append(t_fast)
+        
+        if full_face is None and fast_face is None:
+            agree += 1
+        elif full_face is not None and fast_face is not None:
+            both_found += 1
+            if iou(full_face, fast_face) >= 0.5:
+                agree += 1
+        print(f"{path}: {img.shape[1]}x{img.shape[0]} 原图 {t_full:.1f}ms / 缩小 {t_fast:.1f}ms")
+    
+    if not total:
+        print("未找到可读取的图片")
+        return
+    
+    mean_full = sum(full_ms) / total
+    mean_fast = sum(fast_ms) / total
+    print("=" * 50)
+    print(f"图片数: {total}")
+    print(f"平均检测耗时: 原图 {mean_full:.1f}ms, 缩小({args.max_dim}) {mean_fast:.1f}ms, 加速 {mean_full / mean_fast:.1f}x")
+    print(f"检测一致率(IoU>=0.5或均未检出): {agree / total:.1%}，双方均检出 {both_found} 张")
+
+if __name__ == '__main__':
+    main()
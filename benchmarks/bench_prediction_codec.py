@@ -0,0 +1,97 @@
+"""
+预测结果存储编码基准：旧JSON文本 vs 压缩编码的存储大小与解码耗时
+用法: python benchmarks/bench_prediction_codec.py [-n 2000]
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from services.personality_analyzer import PersonalityAnalyzer
+from services.career_predictor import CareerPredictor
+from services.wealth_predictor import WealthPredictor
+from services.love_analyzer import LoveAnalyzer
+from services.fortune_analyzer import FortuneAnalyzer
+from services.astrology_analyzer import AstrologyAnalyzer
+from services import prediction_codec
+
+def make_predictions(n, seed=0):
+    """用真实分析器生成预测结果"""
+    rng = random.Random(seed)
+    personality_analyzer = PersonalityAnalyzer()
+    career_predictor = CareerPredictor()
+    wealth_predictor = WealthPredictor()
+    love_analyzer = LoveAnalyzer()
+    fortune_analyzer = FortuneAnalyzer()
+    astrology_analyzer = AstrologyAnalyzer()
+    
+    predictions = []
+    for _ in range(n):
+        features = {
+            'face_ratio': rng.uniform(0.6, 1.2),
+            'brightness': rng.uniform(0, 255),
+            'contrast': rng.uniform(0, 100),
+            'texture': rng.uniform(0, 400),
+            'symmetry': rng.uniform(0, 1),
+            'edge_density': rng.uniform(0, 0.5)
+        }
+        personality = personality_analyzer.analyze(features, rng)
+        career = career_predictor.predict(features, personality, rng)
+        predictions.append({
+            'personality': personality,
+            'career': career,
+            'wealth': wealth_predictor.predict(features, personality, career, rng),
+            'love': love_analyzer.analyze(features, personality, rng),
+            'fortune': fortune_analyzer.analyze(features, personality, rng),
+            'astrology': astrology_analyzer.analyze(features, rng)
+        })
+    return predictions
+
+def measure(name, predictions, encode):
+    """统计编码后的总大小、全部解码与只解码 fortune 的耗时"""
+    rows = [{section: encode(value) for section, value in p.items()} for p in predictions]
+    size = sum(len(raw.encode('utf-8')) if isinstance(raw, str) else len(raw)
+               for row in rows for raw in row.values())
+    
+    start = time.perf_counter()
+    for row in rows:
+        for raw in row.values():
+            prediction_codec.decode(raw)
+    full_seconds = time.perf_counter() - start
+    
+    start = time.perf_counter()
+    for row in rows:
+        prediction_codec.decode(row['fortune'])
+    fortune_seconds = time.perf_counter() - start
+    
+    n = len(rows)
+    print(f"{name:<10} {size / n:>10.0f} {full_seconds / n * 1e6:>12.1f} {fortune_seconds / n * 1e6:>14.1f}")
+    return size
+
+def main(argv=None):
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description='预测结果存储编码基准')
+    parser.add_argument('-n', type=int, default=2000, help='预测记录数')
+    args = parser.parse_args(argv)
+    
+    predictions = make_predictions(args.n)
+    
+    print(f"记录数: {args.n}")
+    print(f"{'编码':<10} {'字节/条':>10} {'全部解码(us)':>12} {'fortune解码(us)':>14}")
+    baseline = measure('legacy', predictions, lambda value: json.dumps(value, ensure_ascii=False))
+    for name in prediction_codec.CODECS:
+        try:
+            codec = prediction_codec.get_codec(name)
+        except ImportError:
+            print(f"{name:<10} 未安装依赖，跳过")
+            continue
+        size = measure(name, predictions, lambda value: prediction_codec.encode(value, codec))
+        print(f"{'':<10} 大小为旧格式的 {size / baseline:.0%}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+"""
+服务启动基准：run.py 开发服务器与 gunicorn（预加载/不预加载）的启动耗时与各进程内存
+内存读取 /proc/<pid>/smaps_rollup，仅支持Linux
+用法: python benchmarks/bench_server_startup.py [--workers 4] [--port 5055]
+"""
+
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+def children(pid):
+    """pid 的所有子孙进程"""
+    parents = {}
+    for entry in os.listdir('/proc'):
+        if entry.isdigit():
+            try:
+                with open(f'/proc/{entry}/stat') as f:
+                    parents[int(entry)] = int(f.read().rsplit(')', 1)[1].split()[1])
+            except OSError:
+                continue
+    found = []
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        for child, parent in parents.items():
+            if parent == current:
+                found.append(child)
+                pending.append(child)
+    return found
+
+def memory(pid):
+    """进程内存(MB): rss 常驻, pss 按共享比例分摊, uss 独占"""
+    values = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[1].isdigit():
+                values[parts[0].rstrip(':')] = int(parts[1]) / 1024
+    return {
+        'rss': values.get('Rss', 0),
+        'pss': values.get('Pss', 0),
+        'uss': values.get('Private_Clean', 0) + values.get('Private_Dirty', 0)
+    }
+
+def wait_ready(url, timeout=60):
+    """轮询健康检查直到返回200"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=1) as response:
+                if response.status == 200:
+                    return True
+        except OSError:
+            time.sleep(0.05)
+    return False
+
+def measure(name, command, port, env, workers=0):
+    """启动服务，返回 (启动秒数, 主进程内存, 子进程内存列表)"""
+    start = time.perf_counter()
+    process = subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL,
+                               stderr=subprocess.DEVNULL, start_new_session=True)
+    try:
+        if not wait_ready(f'http://127.0.0.1:{port}/api/health'):
+            raise RuntimeError(f'{name} 启动超时')
+        startup = time.perf_counter() - start
+        # 等待所有 worker 启动完成
+        deadline = time.time() + 30
+        while len(children(process.pid)) < workers and time.time() < deadline:
+            time.sleep(0.1)
+        time.sleep(1)
+        return startup, memory(process.pid), [memory(pid) for pid in children(process.pid)]
+    finally:
+        os.killpg(process.pid, signal.SIGTERM)
+        process.wait(30)
+
+def report(name, startup, master, workers):
+    """输出一行结果"""
+    total_pss = master['pss'] + sum(w['pss'] for w in workers)
+    line = f"{name:<22} 启动 {startup:5.2f}s  主进程 RSS {master['rss']:6.1f}MB"
+    if workers:
+        avg = lambda key: sum(w[key] for w in workers) / len(workers)
+        line += (f"  子进程×{len(workers)} RSS {avg('rss'):6.1f}MB PSS {avg('pss'):6.1f}MB"
+                 f" 独占 {avg('uss'):6.1f}MB")
+    print(line + f"  合计PSS {total_pss:6.1f}MB")
+
+def main(argv=None):
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description='服务启动耗时与内存基准')
+    parser.add_argument('--workers', type=int, default=4, help='gunicorn worker 数')
+    parser.add_argument('--port', type=int, default=5055, help='gunicorn 监听端口')
+    args = parser.parse_args(argv)
+    
+    tmp_dir = tempfile.mkdtemp()
+    env = dict(os.environ, DATABASE_URL=f'sqlite:///{tmp_dir}/bench.db')
+    gunicorn_env = dict(env, GUNICORN_BIND=f'127.0.0.1:{args.port}', GUNICORN_WORKERS=str(args.workers),
+                        GUNICORN_PIDFILE=os.path.join(tmp_dir, 'gunicorn.pid'))
+    gunicorn = [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn_config.py', 'app:app']
+    
+    # run.py 固定监听5000端口，debug模式的重载器会再启动一个子进程
+    report('run.py (debug)', *measure('run.py', [sys.executable, 'run.py'], 5000, env, workers=1))
+    report('gunicorn 预加载', *measure('gunicorn', gunicorn, args.port, gunicorn_env, args.workers))
+    report('gunicorn 不预加载', *measure('gunicorn', gunicorn, args.port,
+                                        dict(gunicorn_env, GUNICORN_PRELOAD='False'), args.workers))
+
+if __name__ == '__main__':
+    main()
@@ -9,7 +9,12 @@ def make_celery(app):
         backend=app.config.get('CELERY_RESULT_BACKEND', 'redis://localhost:6379/0'),
         broker=app.config.get('CELERY_BROKER_URL', 'redis://localhost:6379/0')
     )
-    celery.conf.update(app.config)
+    # 只映射Celery相关配置，避免新旧配置项混用导致Celery报错
+    celery.conf.update(
+        task_always_eager=app.config.get('CELERY_TASK_ALWAYS_EAGER', False),
+        task_store_eager_result=True,
+        result_expires=app.config.get('ANALYSIS_JOB_RESULT_EXPIRES', 24 * 3600),
+    )
     
     class ContextTask(celery.Task):
         def __call__(self, *args, **kwargs):
@@ -38,6 +43,15 @@ celery.conf.beat_schedule = {
 }
 
 # 定义任务
+@celery.task(name='tasks.analyze_upload')
+def analyze_upload_task(user_id, filepath):
+    """异步分析上传文件"""
+    from app import run_analysis
+    return {
+        'user_id': user_id,
+        'result': run_analysis(user_id, filepath)
+    }
+
 @celery.task(name='tasks.backup_database')
 def backup_database_task():
     """数据库备份任务"""
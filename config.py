@@ -15,6 +15,67 @@ class Config:
     UPLOAD_FOLDER = 'static/uploads'
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'mp4', 'avi', 'mov'}
+    UPLOAD_WRITER_WORKERS = int(os.environ.get('UPLOAD_WRITER_WORKERS', 2))  # 后台写入原图的线程数
+    BATCH_UPLOAD_MAX_ITEMS = int(os.environ.get('BATCH_UPLOAD_MAX_ITEMS', 50))  # 单次批量上传最多分析的文件数（含压缩包成员）
+    BATCH_UPLOAD_WORKERS = int(os.environ.get('BATCH_UPLOAD_WORKERS', 4))  # 批量上传并行分析的线程数
+    BATCH_UPLOAD_MAX_CONTENT_LENGTH = int(os.environ.get('BATCH_UPLOAD_MAX_CONTENT_LENGTH', 256 * 1024 * 1024))  # 批量上传请求体上限
+    
+    # 预测列表分页配置
+    PREDICTIONS_PAGE_SIZE = int(os.environ.get('PREDICTIONS_PAGE_SIZE', 20))  # 默认每页条数
+    PREDICTIONS_MAX_PAGE_SIZE = int(os.environ.get('PREDICTIONS_MAX_PAGE_SIZE', 100))  # 每页条数上限
+    PREDICTION_CACHE_MAX_AGE = int(os.environ.get('PREDICTION_CACHE_MAX_AGE', 86400))  # 预测详情客户端缓存时间(秒)
+    EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE', 500))  # 导出时每批从数据库读取的记录数
+    
+    # 请求剖析配置
+    PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', 'False').lower() == 'true'  # 是否允许剖析请求
+    PROFILING_SAMPLE_RATE = float(os.environ.get('PROFILING_SAMPLE_RATE', 0))  # 上传请求的抽样剖析比例，如0.001
+    PROFILING_TOP_N = int(os.environ.get('PROFILING_TOP_N', 10))  # 响应头中输出的热点函数数
+    PROFILING_DIR = os.environ.get('PROFILING_DIR', 'logs/profiles')  # 剖析结果保存目录
+    PROFILING_TOKEN = os.environ.get('PROFILING_TOKEN', '')  # 携带 X-Profile-Token 请求剖析的令牌，为空时只允许管理员
+    ADMIN_USERNAMES = {name.strip() for name in os.environ.get('ADMIN_USERNAMES', '').split(',') if name.strip()}  # 管理员用户名，其令牌带 admin 声明
+    
+    # 分析结果存储编码: json / zjson(zlib压缩JSON) / msgpack(zlib压缩msgpack，需安装msgpack)
+    PREDICTION_CODEC = os.environ.get('PREDICTION_CODEC', 'zjson')
+    
+    # Celery配置
+    CELERY_BROKER_URL = os.environ.get('CELERY_BROKER_URL') or 'redis://localhost:6379/0'
+    CELERY_RESULT_BACKEND = os.environ.get('CELERY_RESULT_BACKEND') or 'redis://localhost:6379/0'
+    CELERY_TASK_ALWAYS_EAGER = os.environ.get('CELERY_TASK_ALWAYS_EAGER', 'False').lower() == 'true'
+    ANALYSIS_JOB_RESULT_EXPIRES = 24 * 3600  # 异步分析结果保留时间(秒)
+    
+    # 分析流水线配置
+    ANALYSIS_MAX_WORKERS = int(os.environ.get('ANALYSIS_MAX_WORKERS', 4))
+    ANALYSIS_STAGE_TIMEOUT = float(os.environ.get('ANALYSIS_STAGE_TIMEOUT', 10))  # 单阶段超时(秒)
+    ANALYSIS_MAX_ABANDONED = int(os.environ.get('ANALYSIS_MAX_ABANDONED', 4))  # 超时后仍在运行的阶段上限，达到后直接使用默认结果
+    DETERMINISTIC_SCORING = os.environ.get('DETERMINISTIC_SCORING', 'False').lower() == 'true'  # 按(特征, 用户, 日期)固定随机种子
+    
+    # 上传分析准入控制
+    ANALYSIS_MAX_IN_FLIGHT = int(os.environ.get('ANALYSIS_MAX_IN_FLIGHT', os.cpu_count() or 4))  # 同时执行的分析请求数
+    ANALYSIS_MAX_QUEUE = int(os.environ.get('ANALYSIS_MAX_QUEUE', 16))  # 排队等待的分析请求数，超出立即返回503
+    ANALYSIS_QUEUE_TIMEOUT = float(os.environ.get('ANALYSIS_QUEUE_TIMEOUT', 5))  # 排队等待上限(秒)
+    ANALYSIS_RETRY_AFTER = int(os.environ.get('ANALYSIS_RETRY_AFTER', 2))  # 503响应的 Retry-After 秒数
+    UPLOAD_RATE_LIMIT = float(os.environ.get('UPLOAD_RATE_LIMIT', 0.5))  # 每个用户每秒补充的上传令牌数，0为不限流
+    UPLOAD_RATE_BURST = int(os.environ.get('UPLOAD_RATE_BURST', 10))  # 每个用户允许的突发上传数
+    
+    # 图像特征缓存配置
+    FEATURE_CACHE_SIZE = int(os.environ.get('FEATURE_CACHE_SIZE', 1024))  # 内存LRU条目数
+    FEATURE_CACHE_DIR = os.environ.get('FEATURE_CACHE_DIR', '')  # 持久化目录，为空则不持久化
+    FACE_DETECT_MAX_DIM = int(os.environ.get('FACE_DETECT_MAX_DIM', 640))  # 人脸检测图像长边上限，0为原图检测
+    DETECTOR_POOL_SIZE = int(os.environ.get('DETECTOR_POOL_SIZE', os.cpu_count() or 4))  # 级联分类器实例数，与工作线程数一致
+    DETECTOR_POOL_TIMEOUT = float(os.environ.get('DETECTOR_POOL_TIMEOUT', 30))  # 等待空闲分类器超时(秒)
+    
+    # 分析结果缓存配置
+    RESULT_CACHE_BACKEND = os.environ.get('RESULT_CACHE_BACKEND', 'memory')  # memory / redis / none
+    RESULT_CACHE_URL = os.environ.get('RESULT_CACHE_URL') or 'redis://localhost:6379/1'
+    RESULT_CACHE_SIZE = int(os.environ.get('RESULT_CACHE_SIZE', 1024))  # 内存后端条目数
+    RESULT_CACHE_TTL = int(os.environ.get('RESULT_CACHE_TTL', 24 * 3600))  # 条目有效期(秒)
+    
+    # 视频分析配置
+    VIDEO_FRAME_STEP = int(os.environ.get('VIDEO_FRAME_STEP', 5))  # 每隔N帧采样一帧
+    VIDEO_FACE_FRAMES = int(os.environ.get('VIDEO_FACE_FRAMES', 5))  # 检测到K帧人脸后停止
+    VIDEO_MAX_FRAMES = int(os.environ.get('VIDEO_MAX_FRAMES', 300))  # 每个视频最多读取帧数
+    VIDEO_TIME_BUDGET = float(os.environ.get('VIDEO_TIME_BUDGET', 5))  # 每个视频处理时间上限(秒)
+    VIDEO_AGGREGATE = os.environ.get('VIDEO_AGGREGATE', 'median')  # 多帧聚合方式: median / mean
     
     # 创建上传目录
     os.makedirs(UPLOAD_FOLDER, exist_ok=True)
\ No newline at end of file
@@ -0,0 +1,52 @@
+"""
+批量特征提取脚本
+用法: python extract_features.py <图片或目录...> -o features.jsonl -w 8
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+from services.image_processor import extract_features_batch
+
+IMAGE_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'bmp', 'webp'}
+
+def iter_image_paths(sources):
+    """展开输入路径，目录递归查找图片"""
+    for source in sources:
+        if os.path.isdir(source):
+            for root, _, files in os.walk(source):
+                for name in sorted(files):
+                    if name.rsplit('.', 1)[-1].lower() in IMAGE_EXTENSIONS:
+                        yield os.path.join(root, name)
+        else:
+            yield source
+
+def main(argv=None):
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description='批量提取图像特征并输出JSONL')
+    parser.add_argument('sources', nargs='+', help='图片文件或目录')
+    parser.add_argument('-o', '--output', default='-', help='输出文件，默认标准输出')
+    parser.add_argument('-w', '--workers', type=int, default=None, help='工作进程数，默认CPU核数')
+    args = parser.parse_args(argv)
+    
+    paths = list(iter_image_paths(args.sources))
+    output = sys.stdout if args.output == '-' else open(args.output, 'w', encoding='utf-8')
+    
+    start = time.time()
+    count = 0
+    try:
+        for path, features in zip(paths, extract_features_batch(paths, workers=args.workers)):
+            output.write(json.dumps({'source': path, 'features': features}, ensure_ascii=False) + '\n')
+            count += 1
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    
+    elapsed = time.time() - start
+    print(f"✓ 已处理 {count} 张图片，耗时 {elapsed:.1f} 秒", file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""
+Gunicorn生产环境配置
+用法: gunicorn -c gunicorn_config.py app:app
+
+主进程预加载应用：级联分类器、各分析器的查表与配置只初始化一次，
+fork 出的 worker 以写时复制共享这部分内存
+"""
+
+import gc
+import multiprocessing
+import os
+import signal
+
+cpu_count = multiprocessing.cpu_count()
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5000')
+
+# 每个CPU一个进程，进程内少量线程处理I/O等待；分析的CPU部分由准入闸门限制并发
+workers = int(os.environ.get('GUNICORN_WORKERS', cpu_count))
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+
+# 各 worker 的分析并发与检测器数按进程内线程数设置，避免 workers × CPU核数 的超额订阅
+os.environ.setdefault('ANALYSIS_MAX_IN_FLIGHT', str(max(1, threads // 2)))
+os.environ.setdefault('ANALYSIS_MAX_QUEUE', str(threads))
+os.environ.setdefault('DETECTOR_POOL_SIZE', str(threads))
+
+preload_app = os.environ.get('GUNICORN_PRELOAD', 'True').lower() == 'true'
+
+# 处理一定请求数后重启 worker，限制内存增长；加抖动避免所有 worker 同时重启
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 100))
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = 5
+
+os.makedirs('logs', exist_ok=True)
+pidfile = os.environ.get('GUNICORN_PIDFILE', 'logs/gunicorn.pid')
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG', '-')
+errorlog = os.environ.get('GUNICORN_ERROR_LOG', '-')
+loglevel = os.environ.get('GUNICORN_LOG_LEVEL', 'info')
+
+def when_ready(server):
+    """
+    主进程就绪、开始 fork worker 之前调用
+    冻结预加载的对象，垃圾回收不再遍历它们，避免触碰共享页面引起复制
+    """
+    gc.freeze()
+    
+    # 由 USR2 平滑重载启动的新主进程，就绪后让旧主进程优雅退出
+    if server.master_pid:
+        server.log.info(f"新主进程就绪，通知旧主进程 {server.master_pid} 退出")
+        os.kill(server.master_pid, signal.SIGTERM)
+
+def post_fork(server, worker):
+    """worker 启动后重置从主进程继承的状态（random 模块在 fork 后会自动重新播种）"""
+    # 主进程若建立过数据库连接，不能在 worker 间共享
+    from app import app, db
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
@@ -0,0 +1,48 @@
+"""
+仪表盘摘要回填脚本：为已有预测记录的用户生成 dashboard_summary
+用法: python scripts/backfill_dashboard.py [--batch-size 500]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import app, db, Prediction, DashboardSummary, refresh_dashboard_summary
+
+def backfill(batch_size=500):
+    """按用户分批重建摘要，每批提交一次，返回处理的用户数"""
+    # 已有数据库中尚无摘要表时创建
+    db.create_all()
+    count = 0
+    last_user_id = 0
+    while True:
+        user_ids = [row[0] for row in db.session.query(Prediction.user_id).filter(
+            Prediction.user_id > last_user_id
+        ).distinct().order_by(Prediction.user_id).limit(batch_size)]
+        if not user_ids:
+            return count
+        
+        for user_id in user_ids:
+            refresh_dashboard_summary(user_id)
+        db.session.commit()
+        db.session.expunge_all()
+        count += len(user_ids)
+        last_user_id = user_ids[-1]
+
+def main(argv=None):
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description='回填用户仪表盘摘要')
+    parser.add_argument('--batch-size', type=int, default=500, help='每批处理的用户数')
+    args = parser.parse_args(argv)
+    
+    start = time.time()
+    with app.app_context():
+        count = backfill(args.batch_size)
+        total = DashboardSummary.query.count()
+    print(f"✓ 已回填 {count} 个用户的仪表盘摘要（共 {total} 条），耗时 {time.time() - start:.1f} 秒")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""
+分数列回填脚本：为已有数据库补充分数列与索引，并从分析结果中提取旧记录的分数
+用法: python scripts/backfill_scores.py [--batch-size 500]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import sqlalchemy as sa
+from sqlalchemy.orm import load_only
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import app, db, Prediction, PREDICTION_SECTIONS, SCORE_COLUMNS, SCORE_SECTIONS, extract_scores
+
+def ensure_score_columns():
+    """添加缺失的分数列并创建索引（create_all 不会修改已有的表）"""
+    table = Prediction.__table__
+    existing = {c['name'] for c in sa.inspect(db.engine).get_columns('predictions')}
+    with db.engine.begin() as conn:
+        for name in SCORE_COLUMNS:
+            if name not in existing:
+                column_type = table.c[name].type.compile(dialect=db.engine.dialect)
+                conn.execute(sa.text(f'ALTER TABLE predictions ADD COLUMN {name} {column_type}'))
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
+
+def backfill(batch_size=500):
+    """按 id 分批提取分数并批量更新，每批提交一次；返回更新的记录数"""
+    columns = [getattr(Prediction, PREDICTION_SECTIONS[name]) for name in SCORE_SECTIONS]
+    not_filled = sa.and_(*[getattr(Prediction, name).is_(None) for name in SCORE_COLUMNS])
+    count = 0
+    last_id = 0
+    while True:
+        predictions = Prediction.query.options(load_only(Prediction.id, *columns)).filter(
+            Prediction.id > last_id, not_filled
+        ).order_by(Prediction.id).limit(batch_size).all()
+        if not predictions:
+            return count
+        
+        rows = []
+        for prediction in predictions:
+            sections = {name: getattr(prediction, name) for name in SCORE_SECTIONS}
+            rows.append({'id': prediction.id, **extract_scores(sections)})
+        last_id = predictions[-1].id
+        
+        db.session.expunge_all()
+        db.session.execute(sa.update(Prediction), rows)
+        db.session.commit()
+        count += len(rows)
+
+def main(argv=None):
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description='回填预测记录的分数列')
+    parser.add_argument('--batch-size', type=int, default=500, help='每批处理的记录数')
+    args = parser.parse_args(argv)
+    
+    start = time.time()
+    with app.app_context():
+        ensure_score_columns()
+        count = backfill(args.batch_size)
+    print(f"✓ 已回填 {count} 条记录的分数列，耗时 {time.time() - start:.1f} 秒")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""
+预测结果存储迁移脚本：将已有记录分批转换为当前的存储编码
+用法: python scripts/migrate_prediction_storage.py [--codec zjson] [--batch-size 500]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import sqlalchemy as sa
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import app, db, Prediction, PREDICTION_SECTIONS
+from services import prediction_codec
+
+SECTION_COLUMNS = list(PREDICTION_SECTIONS.values())
+
+def raw_size(raw):
+    """已存储数据的字节数"""
+    if raw is None:
+        return 0
+    return len(raw.encode('utf-8')) if isinstance(raw, str) else len(raw)
+
+def ensure_binary_columns():
+    """PostgreSQL 中将旧的 text 列转换为 bytea；SQLite 不限制列中存储的类型，无需修改"""
+    if db.engine.dialect.name != 'postgresql':
+        return
+    
+    columns = {c['name']: c['type'] for c in sa.inspect(db.engine).get_columns('predictions')}
+    with db.engine.begin() as conn:
+        for name in SECTION_COLUMNS:
+            if not isinstance(columns[name], sa.LargeBinary):
+                conn.execute(sa.text(
+                    f"ALTER TABLE predictions ALTER COLUMN {name} TYPE bytea USING convert_to({name}, 'UTF8')"
+                ))
+
+def migrate(codec, batch_size=500):
+    """按 id 分批重新编码，每批提交一次，已是目标编码的列跳过；返回统计信息"""
+    table = Prediction.__table__
+    stats = {'rows': 0, 'converted': 0, 'bytes_before': 0, 'bytes_after': 0}
+    last_id = 0
+    while True:
+        rows = db.session.execute(
+            sa.select(table.c.id, *[table.c[name] for name in SECTION_COLUMNS])
+            .where(table.c.id > last_id)
+            .order_by(table.c.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            return stats
+        
+        for row in rows:
+            changes = {}
+            for name in SECTION_COLUMNS:
+                raw = row._mapping[name]
+                stats['bytes_before'] += raw_size(raw)
+                if raw is None or prediction_codec.detect_format(raw) == codec.name:
+                    stats['bytes_after'] += raw_size(raw)
+                    continue
+                encoded = prediction_codec.encode(prediction_codec.decode(raw), codec)
+                changes[name] = encoded
+                stats['bytes_after'] += len(encoded)
+            if changes:
+                db.session.execute(table.update().where(table.c.id == row.id).values(**changes))
+                stats['converted'] += 1
+        
+        db.session.commit()
+        stats['rows'] += len(rows)
+        last_id = rows[-1].id
+
+def main(argv=None):
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description='将预测结果转换为紧凑的存储编码')
+    parser.add_argument('--codec', default=None, choices=sorted(prediction_codec.CODECS),
+                        help='目标编码，默认使用配置 PREDICTION_CODEC')
+    parser.add_argument('--batch-size', type=int, default=500, help='每批处理的记录数')
+    args = parser.parse_args(argv)
+    
+    start = time.time()
+    with app.app_context():
+        codec = prediction_codec.get_codec(args.codec or app.config['PREDICTION_CODEC'])
+        ensure_binary_columns()
+        stats = migrate(codec, args.batch_size)
+    
+    print(f"✓ 已检查 {stats['rows']} 条记录，转换 {stats['converted']} 条，耗时 {time.time() - start:.1f} 秒")
+    print(f"  存储大小: {stats['bytes_before']} → {stats['bytes_after']} 字节")
+    if stats['converted']:
+        print("  SQLite 需执行 VACUUM 才会回收磁盘空间")
+
+if __name__ == '__main__':
+    main()
@@ -8,7 +8,15 @@ from services.wealth_predictor import WealthPredictor
 from services.love_analyzer import LoveAnalyzer
 from services.fortune_analyzer import FortuneAnalyzer
 from services.astrology_analyzer import AstrologyAnalyzer
-from services.image_processor import ImageProcessor
+from services.image_processor import ImageProcessor, extract_features_batch
+from services.analysis_pipeline import AnalysisPipeline, Stage
+from services.feature_cache import FeatureCache
+from services.detector_pool import DetectorPool
+from services.seeding import analysis_seed, stage_rng, seeded_stage
+from services.result_cache import ResultCache, MemoryResultBackend, RedisResultBackend
+from services.admission import AdmissionGate, AdmissionRejected, RateLimited, TokenBucketLimiter
+from services.metrics import MetricsRegistry
+from services.profiler import RequestProfiler
 
 __all__ = [
     'PersonalityAnalyzer',
@@ -17,5 +25,22 @@ __all__ = [
     'LoveAnalyzer',
     'FortuneAnalyzer',
     'AstrologyAnalyzer',
-    'ImageProcessor'
+    'ImageProcessor',
+    'extract_features_batch',
+    'AnalysisPipeline',
+    'Stage',
+    'FeatureCache',
+    'DetectorPool',
+    'analysis_seed',
+    'stage_rng',
+    'seeded_stage',
+    'ResultCache',
+    'MemoryResultBackend',
+    'RedisResultBackend',
+    'AdmissionGate',
+    'AdmissionRejected',
+    'RateLimited',
+    'TokenBucketLimiter',
+    'MetricsRegistry',
+    'RequestProfiler'
 ]
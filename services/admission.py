@@ -0,0 +1,166 @@
+"""
+准入控制服务
+"""
+
+import math
+import threading
+import time
+
+class AdmissionRejected(Exception):
+    """请求被拒绝，retry_after 为建议的重试等待秒数"""
+    
+    def __init__(self, reason, retry_after):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+class RateLimited(AdmissionRejected):
+    """超出限流速率"""
+
+class AdmissionGate:
+    """
+    并发闸门：同时执行的请求数有上限，超出时最多排队 max_queue 个
+    队列已满或排队超时立即拒绝，避免请求无限堆积拖慢所有接口
+    """
+    
+    def __init__(self, max_in_flight, max_queue=0, queue_timeout=5.0, retry_after=1):
+        """
+        max_in_flight: 同时执行的最大请求数
+        max_queue: 等待执行的最大请求数，0为不排队
+        queue_timeout: 排队等待上限(秒)
+        retry_after: 拒绝时建议客户端等待的秒数
+        """
+        self.max_in_flight = max(1, max_in_flight)
+        self.max_queue = max(0, max_queue)
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self._cond = threading.Condition()
+        self.in_flight = 0
+        self.queued = 0
+        self.admitted = 0
+        self.rejected_full = 0
+        self.rejected_timeout = 0
+        self.max_in_flight_seen = 0
+        self.max_queued_seen = 0
+    
+    def acquire(self):
+        """占用一个执行名额，无法获得时抛出 AdmissionRejected"""
+        with self._cond:
+            if self.in_flight >= self.max_in_flight:
+                if self.queued >= self.max_queue:
+                    self.rejected_full += 1
+                    raise AdmissionRejected('服务繁忙，请稍后重试', self.retry_after)
+                
+                self.queued += 1
+                self.max_queued_seen = max(self.max_queued_seen, self.queued)
+                try:
+                    admitted = self._cond.wait_for(
+                        lambda: self.in_flight < self.max_in_flight,
+                        timeout=self.queue_timeout
+                    )
+                finally:
+                    self.queued -= 1
+                if not admitted:
+                    self.rejected_timeout += 1
+                    raise AdmissionRejected('服务繁忙，排队超时', self.retry_after)
+            
+            self.in_flight += 1
+            self.admitted += 1
+            self.max_in_flight_seen = max(self.max_in_flight_seen, self.in_flight)
+    
+    def release(self):
+        """归还执行名额，唤醒一个排队的请求"""
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify()
+    
+    def __enter__(self):
+        self.acquire()
+        return self
+    
+    def __exit__(self, *exc):
+        self.release()
+    
+    def stats(self):
+        """闸门统计，queued 与 in_flight 可作为扩缩容指标"""
+        with self._cond:
+            return {
+                'max_in_flight': self.max_in_flight,
+                'max_queue': self.max_queue,
+                'in_flight': self.in_flight,
+                'queued': self.queued,
+                'admitted': self.admitted,
+                'rejected_full': self.rejected_full,
+                'rejected_timeout': self.rejected_timeout,
+                'max_in_flight_seen': self.max_in_flight_seen,
+                'max_queued_seen': self.max_queued_seen
+            }
+
+class TokenBucketLimiter:
+    """按键（用户）限流的令牌桶：每秒补充 rate 个令牌，最多积累 burst 个"""
+    
+    def __init__(self, rate, burst, max_keys=10000):
+        """
+        rate: 每秒补充的令牌数
+        burst: 桶容量，即允许的突发请求数
+        max_keys: 最多跟踪的键数，超出时清理已回满的桶
+        """
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.max_keys = max_keys
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self.allowed = 0
+        self.rejected = 0
+        self.refunded = 0
+    
+    def acquire(self, key, cost=1):
+        """消耗令牌，不足时抛出 RateLimited；cost 超过 burst 的请求总会被拒绝"""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            if tokens < cost:
+                self._buckets[key] = (tokens, now)
+                self.rejected += 1
+                retry_after = math.ceil((cost - tokens) / self.rate) if self.rate > 0 else 60
+                raise RateLimited('请求过于频繁，请稍后重试', max(1, retry_after))
+            
+            self._buckets[key] = (tokens - cost, now)
+            self.allowed += 1
+            if len(self._buckets) > self.max_keys:
+                self._prune(now)
+    
+    def refund(self, key, cost=1):
+        """退还已消耗的令牌（请求随后在其他环节被拒绝时），不超过桶容量"""
+        now = time.monotonic()
+        with self._lock:
+            if key not in self._buckets:
+                return
+            tokens, updated = self._buckets[key]
+            self._buckets[key] = (min(self.burst, tokens + (now - updated) * self.rate + cost), now)
+            self.refunded += 1
+    
+    def clear(self):
+        """清空所有桶与计数"""
+        with self._lock:
+            self._buckets.clear()
+            self.allowed = self.rejected = self.refunded = 0
+    
+    def _prune(self, now):
+        """清理已回满的桶，等同于新键（调用方需持有锁）"""
+        for key, (tokens, updated) in list(self._buckets.items()):
+            if tokens + (now - updated) * self.rate >= self.burst:
+                del self._buckets[key]
+    
+    def stats(self):
+        """限流统计"""
+        with self._lock:
+            return {
+                'rate': self.rate,
+                'burst': self.burst,
+                'tracked_keys': len(self._buckets),
+                'allowed': self.allowed,
+                'rejected': self.rejected,
+                'refunded': self.refunded
+            }
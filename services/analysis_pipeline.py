@@ -0,0 +1,231 @@
+"""
+分析流水线服务
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+# 有阶段仍在线程池中排队时，检查其是否开始执行的间隔(秒)
+QUEUE_POLL_INTERVAL = 0.05
+
+def _timed_call(func, args, clock):
+    """
+    执行阶段函数并记录耗时，开始执行时把开始时间写入 clock[0]，超时从此时算起
+    进程池中 clock 是子进程内的副本，写入不会传回，由提交方预先填入提交时间
+    """
+    clock[0] = start = time.perf_counter()
+    value = func(*args)
+    return value, time.perf_counter() - start
+
+class Stage:
+    """流水线阶段"""
+    
+    def __init__(self, name, func, inputs=(), fallback=None, timeout=None, fallback_inputs=()):
+        """
+        name: 阶段名称，也是其结果在上下文中的键
+        func: 阶段函数，按 inputs 顺序接收依赖的结果
+        inputs: 依赖的上下文键
+        fallback: 超时或出错时返回默认结果的函数
+        timeout: 单阶段超时(秒)，为空时使用流水线默认值
+        fallback_inputs: 传给 fallback 的上下文键，如分析日期
+        """
+        self.name = name
+        self.func = func
+        self.inputs = tuple(inputs)
+        self.fallback = fallback
+        self.timeout = timeout
+        self.fallback_inputs = tuple(fallback_inputs)
+
+class AnalysisPipeline:
+    """按依赖关系并行执行各分析阶段"""
+    
+    def __init__(self, stages, max_workers=4, timeout=10.0, executor=None, max_abandoned=4):
+        """
+        max_abandoned: 超时后仍在运行的阶段数上限，达到上限后不再替换线程池，
+                       新的执行直接使用各阶段的默认结果，直到有阶段结束
+        """
+        self.stages = list(stages)
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.max_abandoned = max(1, max_abandoned)
+        self._executor = executor
+        self._owns_executor = executor is None
+        self._lock = threading.Lock()
+        self._abandoned = set()
+        self._validate()
+    
+    def _validate(self):
+        """检查阶段名称唯一"""
+        names = [stage.name for stage in self.stages]
+        if len(names) != len(set(names)):
+            raise ValueError(f'阶段名称重复: {names}')
+    
+    def _get_executor(self):
+        """延迟创建线程池"""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix='analysis'
+                )
+            return self._executor
+    
+    def _retire(self, executor):
+        """
+        超时阶段的线程无法中止，会一直占用所在线程池的名额
+        自建的线程池由新线程池替换，旧线程池在已提交的任务结束后自行退出
+        """
+        with self._lock:
+            if not self._owns_executor or self._executor is not executor:
+                return
+            self._executor = None
+        executor.shutdown(wait=False)
+    
+    def _abandon(self, future, executor):
+        """记录超时后仍在运行的阶段，结束时自动移除；未达上限时替换线程池"""
+        with self._lock:
+            self._abandoned.add(future)
+            retire = len(self._abandoned) <= self.max_abandoned
+        future.add_done_callback(self._forget)
+        if retire:
+            self._retire(executor)
+    
+    def _forget(self, future):
+        """超时阶段结束后移除记录"""
+        with self._lock:
+            self._abandoned.discard(future)
+    
+    def abandoned(self):
+        """超时后仍在运行的阶段数"""
+        with self._lock:
+            return len(self._abandoned)
+    
+    def _submit(self, stage, args):
+        """提交阶段，返回 (future, 运行信息)"""
+        executor = self._get_executor()
+        # 只有线程池能观察到阶段实际开始的时间；其他执行器从提交时计时，排队时间计入超时
+        clock = [None] if isinstance(executor, ThreadPoolExecutor) else [time.perf_counter()]
+        future = executor.submit(_timed_call, stage.func, args, clock)
+        return future, (stage, args, clock, executor)
+    
+    def _fallback(self, stage, error, results):
+        """阶段超时或出错时返回默认结果"""
+        if stage.fallback is None:
+            raise error
+        return stage.fallback(*[results[key] for key in stage.fallback_inputs])
+    
+    def _raise_missing(self, pending, results):
+        """报告无法满足的依赖"""
+        missing = sorted({key for stage in pending for key in stage.inputs} - set(results))
+        raise ValueError(f'无法满足的阶段依赖: {missing}')
+    
+    def iter_run(self, initial, inline=False):
+        """
+        执行流水线，每完成一个阶段即产出 (阶段名称, 结果, 统计信息)
+        统计信息包含 elapsed(秒) 与 status(ok / timeout / error / unavailable)
+        超时从阶段开始执行时算起，在线程池中排队的时间不计入
+        inline: 在调用线程内按依赖顺序串行执行（如剖析时），不做超时控制
+        """
+        if inline:
+            yield from self._iter_inline(initial)
+            return
+        
+        # 超时未结束的阶段已达上限，不再占用新的线程，直接使用默认结果
+        if self.abandoned() >= self.max_abandoned:
+            results = dict(initial)
+            for stage in self.stages:
+                value = self._fallback(stage, RuntimeError(f'超时阶段过多，跳过: {stage.name}'), results)
+                results[stage.name] = value
+                yield stage.name, value, {'elapsed': 0.0, 'status': 'unavailable'}
+            return
+        
+        results = dict(initial)
+        pending = list(self.stages)
+        running = {}
+        
+        while pending or running:
+            # 提交依赖已就绪的阶段
+            for stage in list(pending):
+                if all(key in results for key in stage.inputs):
+                    future, info = self._submit(stage, [results[key] for key in stage.inputs])
+                    running[future] = info
+                    pending.remove(stage)
+            
+            if not running:
+                self._raise_missing(pending, results)
+            
+            # 仍排在已被替换的线程池中的阶段，改提交到新线程池
+            for future, (stage, args, clock, executor) in list(running.items()):
+                if executor is not self._executor and clock[0] is None and future.cancel():
+                    running.pop(future)
+                    future, info = self._submit(stage, args)
+                    running[future] = info
+            
+            now = time.perf_counter()
+            deadlines = [
+                clock[0] + (stage.timeout or self.timeout) - now
+                for stage, _, clock, _ in running.values() if clock[0] is not None
+            ]
+            if len(deadlines) < len(running):
+                deadlines.append(QUEUE_POLL_INTERVAL)
+            done, _ = wait(running, timeout=max(min(deadlines), 0), return_when=FIRST_COMPLETED)
+            
+            for future in done:
+                stage, _, clock, _ = running.pop(future)
+                try:
+                    value, elapsed = future.result()
+                    status = 'ok'
+                except Exception as e:
+                    value = self._fallback(stage, e, results)
+                    elapsed = time.perf_counter() - clock[0] if clock[0] is not None else 0.0
+                    status = 'error'
+                results[stage.name] = value
+                yield stage.name, value, {'elapsed': elapsed, 'status': status}
+            
+            # 超时阶段使用默认结果，后台线程结束后结果被丢弃
+            now = time.perf_counter()
+            for future, (stage, _, clock, executor) in list(running.items()):
+                if clock[0] is not None and now - clock[0] >= (stage.timeout or self.timeout):
+                    running.pop(future)
+                    self._abandon(future, executor)
+                    value = self._fallback(stage, TimeoutError(f'阶段超时: {stage.name}'), results)
+                    results[stage.name] = value
+                    yield stage.name, value, {'elapsed': now - clock[0], 'status': 'timeout'}
+    
+    def _iter_inline(self, initial):
+        """在调用线程内串行执行各阶段"""
+        results = dict(initial)
+        pending = list(self.stages)
+        while pending:
+            ready = [stage for stage in pending if all(key in results for key in stage.inputs)]
+            if not ready:
+                self._raise_missing(pending, results)
+            
+            for stage in ready:
+                pending.remove(stage)
+                start = time.perf_counter()
+                try:
+                    value = stage.func(*[results[key] for key in stage.inputs])
+                    status = 'ok'
+                except Exception as e:
+                    value = self._fallback(stage, e, results)
+                    status = 'error'
+                results[stage.name] = value
+                yield stage.name, value, {'elapsed': time.perf_counter() - start, 'status': status}
+    
+    def run(self, initial):
+        """执行流水线，返回 (结果, 各阶段统计)"""
+        results = {}
+        stats = {}
+        for name, value, info in self.iter_run(initial):
+            results[name] = value
+            stats[name] = info
+        return results, stats
+    
+    def shutdown(self, wait=True):
+        """关闭线程池"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
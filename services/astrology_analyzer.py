@@ -12,12 +12,16 @@ class AstrologyAnalyzer:
                             '天秤座', '天蝎座', '射手座', '摩羯座', '水瓶座', '双鱼座']
         self.elements = ['金', '木', '水', '火', '土']
     
-    def analyze(self, features):
-        """玄学分析"""
-        zodiac = self._generate_zodiac_analysis()
-        bazi = self._generate_bazi_analysis()
-        wuxing = self._generate_wuxing_analysis()
-        suggestions = self._generate_mystical_suggestions()
+    def analyze(self, features, rng=None):
+        """
+        玄学分析
+        rng: random.Random 实例，为空时使用全局随机数
+        """
+        rng = rng or random
+        zodiac = self._generate_zodiac_analysis(rng)
+        bazi = self._generate_bazi_analysis(rng)
+        wuxing = self._generate_wuxing_analysis(rng)
+        suggestions = self._generate_mystical_suggestions(rng)
         
         return {
             'zodiac': zodiac,
@@ -26,11 +30,11 @@ class AstrologyAnalyzer:
             'suggestions': suggestions
         }
     
-    def _generate_zodiac_analysis(self):
+    def _generate_zodiac_analysis(self, rng=random):
         """生成星座分析"""
-        sun_sign = random.choice(self.zodiac_signs)
-        moon_sign = random.choice(self.zodiac_signs)
-        rising_sign = random.choice(self.zodiac_signs)
+        sun_sign = rng.choice(self.zodiac_signs)
+        moon_sign = rng.choice(self.zodiac_signs)
+        rising_sign = rng.choice(self.zodiac_signs)
         
         return {
             'sunSign': sun_sign,
@@ -39,22 +43,22 @@ class AstrologyAnalyzer:
             'description': f'太阳{sun_sign}，月亮{moon_sign}，上升{rising_sign}。'
         }
     
-    def _generate_bazi_analysis(self):
+    def _generate_bazi_analysis(self, rng=random):
         """生成八字分析"""
         stems = ['甲', '乙', '丙', '丁', '戊', '己', '庚', '辛', '壬', '癸']
         branches = ['子', '丑', '寅', '卯', '辰', '巳', '午', '未', '申', '酉', '戌', '亥']
         
         return {
-            'yearPillar': random.choice(stems) + random.choice(branches),
-            'monthPillar': random.choice(stems) + random.choice(branches),
-            'dayPillar': random.choice(stems) + random.choice(branches),
-            'hourPillar': random.choice(stems) + random.choice(branches),
+            'yearPillar': rng.choice(stems) + rng.choice(branches),
+            'monthPillar': rng.choice(stems) + rng.choice(branches),
+            'dayPillar': rng.choice(stems) + rng.choice(branches),
+            'hourPillar': rng.choice(stems) + rng.choice(branches),
             'description': '四柱配置平衡，命格稳健。'
         }
     
-    def _generate_wuxing_analysis(self):
+    def _generate_wuxing_analysis(self, rng=random):
         """生成五行分析"""
-        scores = {element: random.randint(50, 95) for element in self.elements}
+        scores = {element: rng.randint(50, 95) for element in self.elements}
         strongest = max(scores, key=scores.get)
         weakest = min(scores, key=scores.get)
         
@@ -66,12 +70,45 @@ class AstrologyAnalyzer:
             'description': f'五行以{strongest}为旺，建议补{weakest}。'
         }
     
-    def _generate_mystical_suggestions(self):
+    def _generate_mystical_suggestions(self, rng=random):
         """生成开运建议"""
         return {
-            'luckyColor': random.choice(['红色', '金色', '绿色', '蓝色']),
-            'luckyStone': random.choice(['水晶', '玛瑙', '翡翠', '琥珀']),
-            'luckyDirection': random.choice(['东方', '南方', '西方', '北方']),
-            'luckyNumber': random.randint(1, 9),
+            'luckyColor': rng.choice(['红色', '金色', '绿色', '蓝色']),
+            'luckyStone': rng.choice(['水晶', '玛瑙', '翡翠', '琥珀']),
+            'luckyDirection': rng.choice(['东方', '南方', '西方', '北方']),
+            'luckyNumber': rng.randint(1, 9),
             'advice': ['多接触自然', '保持积极心态', '定期冥想']
         }
+    
+    def _generate_default_result(self):
+        """生成默认分析结果"""
+        scores = dict(zip(self.elements, [70, 72, 68, 74, 66]))
+        return {
+            'zodiac': {
+                'sunSign': '白羊座',
+                'moonSign': '巨蟹座',
+                'risingSign': '天秤座',
+                'description': '太阳白羊座，月亮巨蟹座，上升天秤座。'
+            },
+            'bazi': {
+                'yearPillar': '甲子',
+                'monthPillar': '丙寅',
+                'dayPillar': '戊辰',
+                'hourPillar': '庚午',
+                'description': '四柱配置平衡，命格稳健。'
+            },
+            'wuxing': {
+                'scores': scores,
+                'strongest': '火',
+                'weakest': '土',
+                'favorableElement': '土',
+                'description': '五行以火为旺，建议补土。'
+            },
+            'suggestions': {
+                'luckyColor': '金色',
+                'luckyStone': '水晶',
+                'luckyDirection': '东方',
+                'luckyNumber': 8,
+                'advice': ['多接触自然', '保持积极心态', '定期冥想']
+            }
+        }
\ No newline at end of file
@@ -3,6 +3,7 @@
 """
 
 import random
+import numpy as np
 
 class CareerPredictor:
     """职业预测器"""
@@ -15,14 +16,18 @@ class CareerPredictor:
             'ENTP': ['创新顾问', '市场策略', '产品经理'],
         }
     
-    def predict(self, features, personality):
-        """预测职业发展"""
+    def predict(self, features, personality, rng=None):
+        """
+        预测职业发展
+        rng: random.Random 实例，为空时使用全局随机数
+        """
+        rng = rng or random
         mbti = personality['mbti']
         big_five = personality['bigFive']
         
         best_fields = self.career_fields.get(mbti, ['综合管理', '专业咨询'])
-        success_rate = self._calculate_success_rate(big_five)
-        career_trend = self._generate_career_trend(big_five)
+        success_rate = self._calculate_success_rate(big_five, rng)
+        career_trend = self._generate_career_trend(big_five, rng)
         promotion_timeline = self._predict_promotion(big_five, success_rate)
         career_advice = ['持续学习提升技能', '建立职场人际关系']
         
@@ -34,21 +39,37 @@ class CareerPredictor:
             'advice': career_advice
         }
     
-    def _calculate_success_rate(self, big_five):
+    def predict_batch(self, big_five, rng=None):
+        """
+        批量计算职业成功率
+        big_five: {维度: 数组}，即 PersonalityAnalyzer.analyze_batch 的 bigFive
+        """
+        rng = rng if rng is not None else np.random.default_rng()
+        return {'successRate': self._calculate_success_rate_batch(big_five, rng)}
+    
+    def _calculate_success_rate_batch(self, big_five, rng):
+        """批量计算职业成功率，与 _calculate_success_rate 规则一致"""
+        conscientiousness = np.asarray(big_five['conscientiousness'], dtype=np.float64)
+        extraversion = np.asarray(big_five['extraversion'], dtype=np.float64)
+        base_rate = 50 + (conscientiousness - 50) * 0.4 + (extraversion - 50) * 0.2
+        base_rate += rng.integers(-5, 11, size=base_rate.shape)
+        return np.trunc(np.clip(base_rate, 40, 95)).astype(np.int64)
+    
+    def _calculate_success_rate(self, big_five, rng=random):
         """计算职业成功率"""
         base_rate = 50
         base_rate += (big_five['conscientiousness'] - 50) * 0.4
         base_rate += (big_five['extraversion'] - 50) * 0.2
-        base_rate += random.randint(-5, 10)
+        base_rate += rng.randint(-5, 10)
         return int(max(40, min(95, base_rate)))
     
-    def _generate_career_trend(self, big_five):
+    def _generate_career_trend(self, big_five, rng=random):
         """生成职业发展趋势"""
         trend = []
         for i in range(5):
             trend.append({
                 'year': 2025 + i,
-                'score': 60 + i * 5 + random.randint(-3, 5)
+                'score': 60 + i * 5 + rng.randint(-3, 5)
             })
         return trend
     
@@ -59,3 +80,13 @@ class CareerPredictor:
             {'position': '主管', 'years': 4, 'probability': 75},
             {'position': '经理', 'years': 6, 'probability': 65}
         ]
+    
+    def _generate_default_result(self):
+        """生成默认预测结果"""
+        return {
+            'bestFields': ['综合管理', '专业咨询'],
+            'successRate': 70,
+            'careerTrend': [{'year': 2025 + i, 'score': 60 + i * 5} for i in range(5)],
+            'promotionTimeline': self._predict_promotion(None, 70),
+            'advice': ['持续学习提升技能', '建立职场人际关系']
+        }
\ No newline at end of file
@@ -0,0 +1,102 @@
+"""
+检测器池服务
+"""
+
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+class DetectorPool:
+    """检测器对象池：每个线程借出独立实例，用完归还，避免多线程共享同一个检测器"""
+    
+    def __init__(self, factory, size):
+        """
+        factory: 创建检测器的函数，返回None或空检测器表示不可用
+        size: 池中最多创建的实例数，通常与工作线程数一致
+        """
+        self._factory = factory
+        self.size = max(1, size)
+        # 后进先出，优先复用刚归还、缓存较热的实例
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self.checkouts = 0
+        self.blocked_checkouts = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        
+        # 预先创建一个实例以确认检测器可用
+        first = self._create()
+        self.available = first is not None
+        if self.available:
+            self._created = 1
+            self._idle.put(first)
+    
+    def _create(self):
+        """创建检测器实例，失败时返回None"""
+        try:
+            detector = self._factory()
+        except Exception as e:
+            print(f"检测器加载错误: {e}")
+            return None
+        if detector is None or (hasattr(detector, 'empty') and detector.empty()):
+            return None
+        return detector
+    
+    def _checkout(self, timeout):
+        """借出实例：优先取空闲实例，未满时新建，否则阻塞等待归还；返回 (实例, 是否等待)"""
+        try:
+            return self._idle.get_nowait(), False
+        except queue.Empty:
+            pass
+        
+        with self._lock:
+            reserved = self._created < self.size
+            if reserved:
+                self._created += 1
+        if reserved:
+            detector = self._create()
+            if detector is not None:
+                return detector, False
+            with self._lock:
+                self._created -= 1
+        
+        try:
+            return self._idle.get(timeout=timeout), True
+        except queue.Empty:
+            raise TimeoutError('等待检测器超时')
+    
+    @contextmanager
+    def acquire(self, timeout=None):
+        """借用检测器，离开上下文时自动归还"""
+        if not self.available:
+            raise RuntimeError('检测器不可用')
+        
+        start = time.perf_counter()
+        detector, blocked = self._checkout(timeout)
+        waited = time.perf_counter() - start
+        with self._lock:
+            self.checkouts += 1
+            self.blocked_checkouts += int(blocked)
+            self.wait_seconds += waited
+            self.max_wait_seconds = max(self.max_wait_seconds, waited)
+        try:
+            yield detector
+        finally:
+            self._idle.put(detector)
+    
+    def stats(self):
+        """池统计"""
+        with self._lock:
+            return {
+                'available': self.available,
+                'size': self.size,
+                'created': self._created,
+                'idle': self._idle.qsize(),
+                'checkouts': self.checkouts,
+                'blocked_checkouts': self.blocked_checkouts,
+                'wait_seconds_total': round(self.wait_seconds, 6),
+                'wait_seconds_max': round(self.max_wait_seconds, 6),
+                'wait_seconds_avg': round(self.wait_seconds / self.checkouts, 6) if self.checkouts else 0.0
+            }
@@ -0,0 +1,137 @@
+"""
+图像特征缓存服务
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import closing
+
+def content_hash(data):
+    """计算内容哈希，作为缓存键"""
+    return hashlib.sha256(data).hexdigest()
+
+def file_hash(path, chunk_size=1024 * 1024):
+    """分块计算文件内容哈希，不把整个文件读入内存"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class FeatureCache:
+    """按内容哈希缓存图像特征：内存LRU + 可选的SQLite持久化存储"""
+    
+    def __init__(self, max_entries=1024, cache_dir=None, version='1'):
+        """
+        max_entries: 内存中最多缓存的条目数
+        cache_dir: 持久化目录，为空时只使用内存缓存
+        version: 特征提取器版本，版本不一致的条目视为失效
+        """
+        self.max_entries = max_entries
+        self.version = str(version)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        
+        self.db_path = None
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+            self.db_path = os.path.join(cache_dir, 'features.sqlite3')
+            with closing(self._connect()) as conn, conn:
+                conn.execute(
+                    'CREATE TABLE IF NOT EXISTS features ('
+                    'key TEXT PRIMARY KEY, version TEXT NOT NULL, '
+                    'data TEXT NOT NULL, created_at REAL NOT NULL)'
+                )
+    
+    def _connect(self):
+        """每次操作使用独立连接，避免跨线程/跨进程共享"""
+        return sqlite3.connect(self.db_path, timeout=5)
+    
+    def get(self, key):
+        """读取缓存，未命中返回None"""
+        with self._lock:
+            features = self._entries.get(key)
+            if features is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return dict(features)
+        
+        features = self._load(key)
+        with self._lock:
+            if features is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.disk_hits += 1
+            self._remember(key, features)
+        return dict(features)
+    
+    def set(self, key, features):
+        """写入缓存"""
+        with self._lock:
+            self._remember(key, dict(features))
+        self._store(key, features)
+    
+    def _remember(self, key, features):
+        """写入内存LRU（调用方需持有锁）"""
+        self._entries[key] = features
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+    
+    def _load(self, key):
+        """从持久化存储读取"""
+        if not self.db_path:
+            return None
+        try:
+            with closing(self._connect()) as conn, conn:
+                row = conn.execute(
+                    'SELECT data FROM features WHERE key = ? AND version = ?',
+                    (key, self.version)
+                ).fetchone()
+            return json.loads(row[0]) if row else None
+        except sqlite3.Error as e:
+            print(f"特征缓存读取错误: {e}")
+            return None
+    
+    def _store(self, key, features):
+        """写入持久化存储"""
+        if not self.db_path:
+            return
+        try:
+            with closing(self._connect()) as conn, conn:
+                conn.execute(
+                    'INSERT OR REPLACE INTO features (key, version, data, created_at) VALUES (?, ?, ?, ?)',
+                    (key, self.version, json.dumps(features), time.time())
+                )
+        except sqlite3.Error as e:
+            print(f"特征缓存写入错误: {e}")
+    
+    def clear(self):
+        """清空内存缓存与计数"""
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.disk_hits = 0
+    
+    def stats(self):
+        """缓存统计"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'disk_hits': self.disk_hits,
+                'hit_rate': round(self.hits / total, 4) if total else 0.0,
+                'size': len(self._entries),
+                'max_entries': self.max_entries,
+                'persistent': bool(self.db_path),
+                'version': self.version
+            }
@@ -8,14 +8,20 @@ from datetime import datetime, timedelta
 class FortuneAnalyzer:
     """运势分析器"""
     
-    def analyze(self, features, personality):
-        """分析运势"""
+    def analyze(self, features, personality, rng=None, today=None):
+        """
+        分析运势
+        rng: random.Random 实例，为空时使用全局随机数
+        today: 分析日期，为空时使用当前日期
+        """
+        rng = rng or random
+        today = today or datetime.now()
         big_five = personality['bigFive']
         
-        daily = self._generate_daily_fortune(big_five)
-        monthly = self._generate_monthly_fortune(big_five)
-        yearly = self._generate_yearly_fortune(big_five)
-        lucky_elements = self._generate_lucky_elements()
+        daily = self._generate_daily_fortune(big_five, rng, today)
+        monthly = self._generate_monthly_fortune(big_five, rng)
+        yearly = self._generate_yearly_fortune(big_five, rng, today)
+        lucky_elements = self._generate_lucky_elements(rng)
         
         return {
             'daily': daily,
@@ -24,13 +30,13 @@ class FortuneAnalyzer:
             'luckyElements': lucky_elements
         }
     
-    def _generate_daily_fortune(self, big_five):
+    def _generate_daily_fortune(self, big_five, rng=random, today=None):
         """生成日运势"""
-        today = datetime.now()
+        today = today or datetime.now()
         return {
-            'yesterday': 70 + random.randint(-10, 10),
-            'today': 75 + random.randint(-10, 15),
-            'tomorrow': 72 + random.randint(-10, 12),
+            'yesterday': 70 + rng.randint(-10, 10),
+            'today': 75 + rng.randint(-10, 15),
+            'tomorrow': 72 + rng.randint(-10, 12),
             'dates': {
                 'yesterday': (today - timedelta(days=1)).strftime('%Y-%m-%d'),
                 'today': today.strftime('%Y-%m-%d'),
@@ -38,21 +44,21 @@ class FortuneAnalyzer:
             }
         }
     
-    def _generate_monthly_fortune(self, big_five):
+    def _generate_monthly_fortune(self, big_five, rng=random):
         """生成月运势"""
         return {
-            'lastMonth': 60 + random.randint(-10, 15),
-            'current': 70 + random.randint(-10, 20),
-            'nextMonth': 72 + random.randint(-10, 18)
+            'lastMonth': 60 + rng.randint(-10, 15),
+            'current': 70 + rng.randint(-10, 20),
+            'nextMonth': 72 + rng.randint(-10, 18)
         }
     
-    def _generate_yearly_fortune(self, big_five):
+    def _generate_yearly_fortune(self, big_five, rng=random, today=None):
         """生成年运势"""
-        current_year = datetime.now().year
+        current_year = (today or datetime.now()).year
         return {
-            'lastYear': 65 + random.randint(-10, 15),
-            'thisYear': 72 + random.randint(-10, 20),
-            'nextYear': 75 + random.randint(-10, 20),
+            'lastYear': 65 + rng.randint(-10, 15),
+            'thisYear': 72 + rng.randint(-10, 20),
+            'nextYear': 75 + rng.randint(-10, 20),
             'years': {
                 'lastYear': current_year - 1,
                 'thisYear': current_year,
@@ -60,15 +66,48 @@ class FortuneAnalyzer:
             }
         }
     
-    def _generate_lucky_elements(self):
+    def _generate_lucky_elements(self, rng=random):
         """生成幸运元素"""
         colors = ['红色', '蓝色', '绿色', '紫色', '金色']
         directions = ['东方', '南方', '西方', '北方']
         times = ['早晨6-9点', '上午9-12点', '下午2-5点']
         
         return {
-            'color': random.choice(colors),
-            'number': random.randint(1, 49),
-            'direction': random.choice(directions),
-            'time': random.choice(times)
+            'color': rng.choice(colors),
+            'number': rng.randint(1, 49),
+            'direction': rng.choice(directions),
+            'time': rng.choice(times)
         }
+    
+    def _generate_default_result(self, today=None):
+        """生成默认分析结果，today 为分析日期，为空时使用当前日期"""
+        today = today or datetime.now()
+        return {
+            'daily': {
+                'yesterday': 70,
+                'today': 75,
+                'tomorrow': 72,
+                'dates': {
+                    'yesterday': (today - timedelta(days=1)).strftime('%Y-%m-%d'),
+                    'today': today.strftime('%Y-%m-%d'),
+                    'tomorrow': (today + timedelta(days=1)).strftime('%Y-%m-%d')
+                }
+            },
+            'monthly': {'lastMonth': 60, 'current': 70, 'nextMonth': 72},
+            'yearly': {
+                'lastYear': 65,
+                'thisYear': 72,
+                'nextYear': 75,
+                'years': {
+                    'lastYear': today.year - 1,
+                    'thisYear': today.year,
+                    'nextYear': today.year + 1
+                }
+            },
+            'luckyElements': {
+                'color': '金色',
+                'number': 8,
+                'direction': '东方',
+                'time': '上午9-12点'
+            }
+        }
\ No newline at end of file
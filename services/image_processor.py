@@ -5,68 +5,276 @@
 import cv2
 import numpy as np
 import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from services.feature_cache import FeatureCache, content_hash, file_hash
+from services.detector_pool import DetectorPool
+
+def load_face_cascade():
+    """加载Haar人脸级联分类器"""
+    cascade_path = cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
+    return cv2.CascadeClassifier(cascade_path)
+
+def _ignore_timing(stage, seconds):
+    """默认不记录阶段耗时"""
 
 class ImageProcessor:
     """图像处理器"""
     
-    def __init__(self):
-        """初始化处理器"""
+    # 特征提取器版本，修改特征计算逻辑时需递增，使旧缓存失效
+    FEATURE_VERSION = '3'
+    
+    # 人脸检测最小尺寸（原图像素）
+    MIN_FACE_SIZE = 30
+    
+    VIDEO_EXTENSIONS = {'mp4', 'avi', 'mov'}
+    
+    def __init__(self, cache=None, max_detect_dim=640, video_frame_step=5,
+                 video_face_frames=5, video_max_frames=300, video_time_budget=5.0,
+                 video_aggregate='median', detector_pool_size=None, detector_timeout=None,
+                 observe=None):
+        """
+        初始化处理器
+        max_detect_dim: 人脸检测时图像长边的上限，超过则先缩小再检测；为0时在原图上检测
+        video_frame_step: 视频每隔多少帧采样一帧
+        video_face_frames: 检测到人脸的帧数达到该值即停止读取
+        video_max_frames: 每个视频最多读取的帧数
+        video_time_budget: 每个视频的处理时间上限(秒)
+        video_aggregate: 多帧特征的聚合方式，median 或 mean
+        detector_pool_size: 级联分类器实例数，应与并发处理的线程数一致，默认CPU核数
+        detector_timeout: 等待空闲分类器的超时(秒)，为空时一直等待
+        observe: 记录阶段耗时的回调 observe(阶段名称, 秒)，用于 decode / face_detect / face_features
+        """
+        # CascadeClassifier不是线程安全的，每个线程从池中借用独立实例
+        self.detector_pool = DetectorPool(load_face_cascade, detector_pool_size or os.cpu_count() or 1)
+        self.detector_timeout = detector_timeout
+        self.max_detect_dim = max_detect_dim
+        self.video_frame_step = max(1, video_frame_step)
+        self.video_face_frames = max(1, video_face_frames)
+        self.video_max_frames = video_max_frames
+        self.video_time_budget = video_time_budget
+        self.video_aggregate = video_aggregate
+        self.cache = cache if cache is not None else FeatureCache(version=self.FEATURE_VERSION)
+        self.observe = observe or _ignore_timing
+    
+    @classmethod
+    def is_video(cls, filename):
+        """根据扩展名判断是否为视频"""
+        return '.' in filename and filename.rsplit('.', 1)[1].lower() in cls.VIDEO_EXTENSIONS
+    
+    def extract_features(self, image_path, digest=None, stats=None, deterministic=False):
+        """
+        提取图像特征，视频文件按帧采样提取
+        digest: 调用方已计算的内容哈希，避免重复计算
+        stats: 传入字典时，因读取、解码或检测失败而使用默认特征会记录 fallback=True
+        deterministic: 视频只按帧数上限采样，不受耗时预算影响，结果可复现
+        """
+        if self.is_video(image_path):
+            return self.extract_video_features(image_path, digest, stats, deterministic)
+        
         try:
-            cascade_path = cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
-            self.face_cascade = cv2.CascadeClassifier(cascade_path)
-        except:
-            self.face_cascade = None
+            with open(image_path, 'rb') as f:
+                data = f.read()
+        except OSError as e:
+            print(f"图像读取错误: {e}")
+            return self._fallback(stats)
+        
+        return self.extract_features_from_bytes(data, digest, stats)
     
-    def extract_features(self, image_path):
-        """提取图像特征"""
+    def extract_features_from_bytes(self, data, digest=None, stats=None):
+        """从内存中的图像数据提取特征，无需先落盘"""
+        if not data:
+            return self._fallback(stats)
+        
+        key = digest or content_hash(data)
+        features = self.cache.get(key)
+        if features is not None:
+            return features
+        
         try:
-            img = cv2.imread(image_path)
+            start = time.perf_counter()
+            img = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+            self.observe('decode', time.perf_counter() - start)
             if img is None:
-                return self._generate_default_features()
+                return self._fallback(stats)
             
-            gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+            features = self._detect_and_extract(img)
+            if features is not None:
+                self.cache.set(key, features)
+                return features
             
-            if self.face_cascade is not None:
-                faces = self.face_cascade.detectMultiScale(gray, 1.1, 5, minSize=(30, 30))
-                
-                if len(faces) > 0:
-                    x, y, w, h = faces[0]
-                    face_roi = gray[y:y+h, x:x+w]
-                    return self._extract_face_features(face_roi, img)
-            
-            return self._generate_default_features()
+            return self._fallback(stats)
             
         except Exception as e:
             print(f"图像处理错误: {e}")
-            return self._generate_default_features()
+            return self._fallback(stats)
+    
+    def extract_video_features(self, video_path, digest=None, stats=None, deterministic=False):
+        """
+        从视频中提取特征：按步长采样帧，检测到足够多的人脸帧后提前结束，
+        逐帧只保留特征向量，不缓存帧数据
+        deterministic: 不使用耗时预算，采样的帧只取决于视频内容与帧数上限
+        """
+        try:
+            key = digest or file_hash(video_path)
+        except OSError as e:
+            print(f"视频读取错误: {e}")
+            return self._fallback(stats)
+        
+        features = self.cache.get(key)
+        if features is not None:
+            return features
+        
+        if not self.detector_pool.available:
+            return self._fallback(stats)
+        
+        cap = cv2.VideoCapture(video_path)
+        try:
+            if not cap.isOpened():
+                return self._fallback(stats)
+            
+            face_features = []
+            deadline = None if deterministic else time.perf_counter() + self.video_time_budget
+            frame_index = 0
+            while frame_index < self.video_max_frames and (deadline is None or time.perf_counter() < deadline):
+                # 非采样帧只grab不解码到BGR，减少开销
+                if frame_index % self.video_frame_step:
+                    if not cap.grab():
+                        break
+                    frame_index += 1
+                    continue
+                
+                ok, frame = cap.read()
+                if not ok:
+                    break
+                frame_index += 1
+                
+                face = self._detect_face(frame)
+                if face is not None:
+                    x, y, w, h = face
+                    face_roi = cv2.cvtColor(frame[y:y+h, x:x+w], cv2.COLOR_BGR2GRAY)
+                    face_features.append(self._extract_face_features(face_roi, frame))
+                    if len(face_features) >= self.video_face_frames:
+                        break
+        except Exception as e:
+            print(f"视频处理错误: {e}")
+            return self._fallback(stats)
+        finally:
+            cap.release()
+        
+        if not face_features:
+            return self._fallback(stats)
+        
+        features = self._aggregate_features(face_features)
+        self.cache.set(key, features)
+        return features
+    
+    def _fallback(self, stats):
+        """提取失败时返回默认特征，并在 stats 中标记"""
+        if stats is not None:
+            stats['fallback'] = True
+        return self._generate_default_features()
+    
+    def _aggregate_features(self, feature_list):
+        """聚合多帧特征"""
+        reducer = np.median if self.video_aggregate == 'median' else np.mean
+        aggregated = {}
+        for key, value in feature_list[0].items():
+            combined = reducer([features[key] for features in feature_list])
+            aggregated[key] = int(round(combined)) if isinstance(value, int) else float(combined)
+        return aggregated
+    
+    def _detect_and_extract(self, img):
+        """检测人脸并提取特征，检测器不可用时返回None"""
+        if not self.detector_pool.available:
+            return None
+        
+        face = self._detect_face(img)
+        if face is not None:
+            # 只在原图上裁剪人脸区域计算纹理、对称性等特征
+            x, y, w, h = face
+            start = time.perf_counter()
+            face_roi = cv2.cvtColor(img[y:y+h, x:x+w], cv2.COLOR_BGR2GRAY)
+            features = self._extract_face_features(face_roi, img)
+            self.observe('face_features', time.perf_counter() - start)
+            return features
+        
+        # 未检测到人脸同样是确定结果，可以缓存
+        return self._generate_default_features()
+    
+    def _detect_face(self, img):
+        """
+        检测人脸，返回原图坐标下的 (x, y, w, h)，未检测到时返回None
+        大图先缩小到 max_detect_dim 再检测，检测框映射回原图分辨率
+        """
+        start = time.perf_counter()
+        height, width = img.shape[:2]
+        scale = 1.0
+        if self.max_detect_dim and max(height, width) > self.max_detect_dim:
+            scale = self.max_detect_dim / max(height, width)
+            small = cv2.resize(
+                img,
+                (max(1, round(width * scale)), max(1, round(height * scale))),
+                interpolation=cv2.INTER_AREA
+            )
+        else:
+            small = img
+        
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        # Haar级联的最小检测窗口为24像素
+        min_size = max(24, round(self.MIN_FACE_SIZE * scale))
+        with self.detector_pool.acquire(self.detector_timeout) as cascade:
+            faces = cascade.detectMultiScale(gray, 1.1, 5, minSize=(min_size, min_size))
+        self.observe('face_detect', time.perf_counter() - start)
+        
+        if len(faces) == 0:
+            return None
+        
+        # 多个候选框时取面积最大者，小框多为背景误检
+        x, y, w, h = (int(v) for v in max(faces, key=lambda f: f[2] * f[3]))
+        if scale != 1.0:
+            x, y = int(x / scale), int(y / scale)
+            w, h = int(round(w / scale)), int(round(h / scale))
+        x, y = min(max(x, 0), width - 1), min(max(y, 0), height - 1)
+        w, h = min(w, width - x), min(h, height - y)
+        return x, y, w, h
+    
+    def cache_stats(self):
+        """特征缓存统计"""
+        return self.cache.stats()
+    
+    def detector_stats(self):
+        """检测器池统计"""
+        return self.detector_pool.stats()
     
     def _extract_face_features(self, face_roi, original_img):
-        """提取人脸特征"""
+        """
+        提取人脸特征
+        尽量减少对ROI的完整遍历和临时数组：均值/标准差一次遍历得到，
+        拉普拉斯使用float32（uint8输入下结果精确），对称性由统计量推导相关系数，
+        不构造 2×N 矩阵
+        """
         h, w = face_roi.shape
         face_ratio = w / h if h > 0 else 1.0
-        brightness = np.mean(face_roi)
-        contrast = np.std(face_roi)
+        mean, std = cv2.meanStdDev(face_roi)
+        brightness = mean[0, 0]
+        contrast = std[0, 0]
         
         try:
-            laplacian = cv2.Laplacian(face_roi, cv2.CV_64F)
-            texture = np.var(laplacian)
+            _, lap_std = cv2.meanStdDev(cv2.Laplacian(face_roi, cv2.CV_32F))
+            texture = lap_std[0, 0] ** 2
         except:
             texture = 100.0
         
         try:
-            left_half = face_roi[:, :w//2]
-            right_half = cv2.flip(face_roi[:, w//2:], 1)
-            min_width = min(left_half.shape[1], right_half.shape[1])
-            symmetry = np.corrcoef(
-                left_half[:, :min_width].flatten(),
-                right_half[:, :min_width].flatten()
-            )[0, 1]
+            symmetry = self._symmetry(face_roi)
         except:
             symmetry = 0.8
         
         try:
             edges = cv2.Canny(face_roi, 100, 200)
-            edge_density = np.sum(edges > 0) / (h * w)
+            edge_density = cv2.countNonZero(edges) / (h * w)
         except:
             edge_density = 0.15
         
@@ -81,6 +289,28 @@ class ImageProcessor:
             'face_height': int(h)
         }
     
+    def _symmetry(self, face_roi):
+        """
+        左半脸与镜像右半脸的皮尔逊相关系数
+        由 E[(a-b)^2] = var_a + var_b + (mean_a - mean_b)^2 - 2cov 推导协方差，
+        只需翻转右半脸（uint8，半个ROI大小）
+        """
+        half = face_roi.shape[1] // 2
+        left = face_roi[:, :half]
+        right = cv2.flip(face_roi[:, face_roi.shape[1] - half:], 1)
+        
+        mean_a, std_a = cv2.meanStdDev(left)
+        mean_b, std_b = cv2.meanStdDev(right)
+        mean_a, std_a = mean_a[0, 0], std_a[0, 0]
+        mean_b, std_b = mean_b[0, 0], std_b[0, 0]
+        if std_a == 0 or std_b == 0:
+            # 半脸亮度恒定时相关系数无定义
+            return 0.8
+        
+        mean_sq_diff = cv2.norm(left, right, cv2.NORM_L2SQR) / left.size
+        cov = (std_a ** 2 + std_b ** 2 + (mean_a - mean_b) ** 2 - mean_sq_diff) / 2
+        return max(-1.0, min(1.0, cov / (std_a * std_b)))
+    
     def _generate_default_features(self):
         """生成默认特征"""
         return {
@@ -93,3 +323,51 @@ class ImageProcessor:
             'face_width': 200,
             'face_height': 235
         }
+
+# 批量提取：每个工作进程只加载一次级联分类器
+_batch_processor = None
+
+def _init_batch_worker():
+    """工作进程初始化"""
+    global _batch_processor
+    # 多进程并行时限制OpenCV内部线程，避免CPU超额订阅
+    cv2.setNumThreads(1)
+    _batch_processor = ImageProcessor(detector_pool_size=1)
+
+def _extract_one(processor, item):
+    """提取单个图像（路径或内存数据）的特征"""
+    if isinstance(item, (bytes, bytearray, memoryview)):
+        return processor.extract_features_from_bytes(bytes(item))
+    return processor.extract_features(os.fspath(item))
+
+def _extract_in_worker(item):
+    """在工作进程中提取特征"""
+    return _extract_one(_batch_processor, item)
+
+def extract_features_batch(items, workers=None, max_pending=None):
+    """
+    批量提取图像特征，按输入顺序逐个产出结果
+    items: 图像路径或图像字节数据的可迭代对象，按需读取
+    workers: 工作进程数，默认CPU核数；为1时在当前进程中执行
+    max_pending: 同时在途的任务数上限，默认 workers * 4，保证内存占用平稳
+    """
+    workers = workers or os.cpu_count() or 1
+    
+    if workers <= 1:
+        processor = ImageProcessor(detector_pool_size=1)
+        for item in items:
+            yield _extract_one(processor, item)
+        return
+    
+    max_pending = max_pending or workers * 4
+    executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_batch_worker)
+    try:
+        pending = deque()
+        for item in items:
+            pending.append(executor.submit(_extract_in_worker, item))
+            if len(pending) >= max_pending:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
\ No newline at end of file
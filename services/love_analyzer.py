@@ -3,6 +3,7 @@
 """
 
 import random
+import numpy as np
 
 class LoveAnalyzer:
     """感情分析器"""
@@ -13,14 +14,18 @@ class LoveAnalyzer:
             'INTP': ['ENTJ', 'ESTJ', 'INFJ'],
         }
     
-    def analyze(self, features, personality):
-        """分析感情状况"""
+    def analyze(self, features, personality, rng=None):
+        """
+        分析感情状况
+        rng: random.Random 实例，为空时使用全局随机数
+        """
+        rng = rng or random
         big_five = personality['bigFive']
         mbti = personality['mbti']
         
-        stability_score = self._calculate_stability(big_five)
+        stability_score = self._calculate_stability(big_five, rng)
         best_matches = self.mbti_compatibility.get(mbti, ['ENFP', 'INFJ', 'ENTJ'])
-        love_trend = self._generate_love_trend(big_five)
+        love_trend = self._generate_love_trend(big_five, rng)
         relationship_advice = ['保持真诚沟通', '给予彼此空间']
         
         return {
@@ -31,18 +36,37 @@ class LoveAnalyzer:
             'attractiveness': self._calculate_attractiveness(big_five)
         }
     
-    def _calculate_stability(self, big_five):
+    def analyze_batch(self, big_five, rng=None):
+        """
+        批量计算感情稳定性与吸引力指数
+        big_five: {维度: 数组}，即 PersonalityAnalyzer.analyze_batch 的 bigFive
+        """
+        rng = rng if rng is not None else np.random.default_rng()
+        agreeableness = np.asarray(big_five['agreeableness'], dtype=np.float64)
+        neuroticism = np.asarray(big_five['neuroticism'], dtype=np.float64)
+        extraversion = np.asarray(big_five['extraversion'], dtype=np.float64)
+        
+        stability = 60 + (agreeableness - 50) * 0.4 + (50 - neuroticism) * 0.3
+        stability += rng.integers(-5, 6, size=stability.shape)
+        attractiveness = 50 + (extraversion - 50) * 0.3 + (agreeableness - 50) * 0.3
+        
+        return {
+            'stabilityScore': np.trunc(np.clip(stability, 40, 95)).astype(np.int64),
+            'attractiveness': np.trunc(np.clip(attractiveness, 40, 95)).astype(np.int64)
+        }
+    
+    def _calculate_stability(self, big_five, rng=random):
         """计算感情稳定性"""
         base = 60
         base += (big_five['agreeableness'] - 50) * 0.4
         base += (50 - big_five['neuroticism']) * 0.3
-        base += random.randint(-5, 5)
+        base += rng.randint(-5, 5)
         return int(max(40, min(95, base)))
     
-    def _generate_love_trend(self, big_five):
+    def _generate_love_trend(self, big_five, rng=random):
         """生成感情趋势"""
         months = ['本月', '下月', '第三月', '第四月', '第五月', '第六月']
-        return [{'month': m, 'score': 65 + random.randint(-10, 15)} for m in months]
+        return [{'month': m, 'score': 65 + rng.randint(-10, 15)} for m in months]
     
     def _calculate_attractiveness(self, big_five):
         """计算吸引力指数"""
@@ -50,3 +74,14 @@ class LoveAnalyzer:
         score += (big_five['extraversion'] - 50) * 0.3
         score += (big_five['agreeableness'] - 50) * 0.3
         return int(max(40, min(95, score)))
+    
+    def _generate_default_result(self):
+        """生成默认分析结果"""
+        months = ['本月', '下月', '第三月', '第四月', '第五月', '第六月']
+        return {
+            'stabilityScore': 70,
+            'bestMatches': ['ENFP', 'INFJ', 'ENTJ'],
+            'loveTrend': [{'month': m, 'score': 65} for m in months],
+            'advice': ['保持真诚沟通', '给予彼此空间'],
+            'attractiveness': 60
+        }
\ No newline at end of file
@@ -0,0 +1,191 @@
+"""
+运行指标服务
+"""
+
+import threading
+import time
+import weakref
+from bisect import bisect_left
+
+# 延迟分桶上限(秒)，覆盖从解码的亚毫秒级到整次分析的秒级
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class _ShardOwner:
+    """线程分片的持有者，随线程局部数据一起释放"""
+    
+    __slots__ = ('shard', '__weakref__')
+    
+    def __init__(self, shard):
+        self.shard = shard
+
+class Histogram:
+    """
+    固定分桶的直方图：每个线程写入独立分片，记录时不加锁，读取时合并各分片
+    分片只在线程首次记录时注册一次；线程结束后分片并入基础计数，分片数不随线程数增长
+    """
+    
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._local = threading.local()
+        self._shards = {}
+        self._base = self._new_shard()
+        self._lock = threading.Lock()
+    
+    def _new_shard(self):
+        """空分片: [各桶计数..., 超出最大桶的计数, 总和]"""
+        return [0] * (len(self.buckets) + 1) + [0.0]
+    
+    def _shard(self):
+        """注册当前线程的分片"""
+        shard = self._new_shard()
+        with self._lock:
+            self._shards[id(shard)] = shard
+        owner = _ShardOwner(shard)
+        weakref.finalize(owner, self._fold, shard)
+        self._local.owner = owner
+        return shard
+    
+    def _fold(self, shard):
+        """线程结束后将其分片并入基础计数"""
+        with self._lock:
+            self._shards.pop(id(shard), None)
+            for i, value in enumerate(shard):
+                self._base[i] += value
+    
+    def observe(self, value):
+        """记录一个值"""
+        owner = getattr(self._local, 'owner', None)
+        shard = owner.shard if owner is not None else self._shard()
+        shard[bisect_left(self.buckets, value)] += 1
+        shard[-1] += value
+    
+    def snapshot(self):
+        """合并各分片，返回 (累计计数列表, 总数, 总和)，累计计数与 buckets 一一对应并以 +Inf 结尾"""
+        # 在锁内合并，避免同时有线程结束、其分片被重复计入
+        counts = [0] * (len(self.buckets) + 1)
+        total = 0.0
+        with self._lock:
+            for shard in [self._base, *self._shards.values()]:
+                for i in range(len(counts)):
+                    counts[i] += shard[i]
+                total += shard[-1]
+        
+        cumulative = []
+        running = 0
+        for count in counts:
+            running += count
+            cumulative.append(running)
+        return cumulative, running, total
+
+class _StageTimer:
+    """阶段计时上下文，离开时记录耗时"""
+    
+    __slots__ = ('histogram', 'start')
+    
+    def __init__(self, histogram):
+        self.histogram = histogram
+    
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+    
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start)
+
+def _escape(value):
+    """转义标签值"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _labels(labels):
+    """格式化标签"""
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + '}'
+
+def _number(value):
+    """格式化数值"""
+    if value is None:
+        return 'NaN'
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+def render_metric(name, kind, help_text, samples):
+    """
+    按Prometheus文本格式输出一个指标
+    samples: [(标签字典, 数值)]
+    """
+    lines = [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}']
+    for labels, value in samples:
+        lines.append(f'{name}{_labels(labels)} {_number(value)}')
+    return '\n'.join(lines)
+
+def render_histogram(name, help_text, histograms, label='stage'):
+    """按Prometheus文本格式输出一组直方图，histograms 为 {标签值: Histogram}"""
+    lines = [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+    for key, histogram in sorted(histograms.items()):
+        cumulative, count, total = histogram.snapshot()
+        for bound, value in zip(histogram.buckets + ('+Inf',), cumulative):
+            lines.append(f'{name}_bucket{_labels({label: key, "le": _number(bound)})} {value}')
+        lines.append(f'{name}_sum{_labels({label: key})} {_number(total)}')
+        lines.append(f'{name}_count{_labels({label: key})} {count}')
+    return '\n'.join(lines)
+
+class MetricsRegistry:
+    """各处理阶段的耗时直方图与请求计数"""
+    
+    def __init__(self, namespace='fortune', buckets=DEFAULT_BUCKETS):
+        self.namespace = namespace
+        self.buckets = tuple(buckets)
+        self._stages = {}
+        self._endpoints = {}
+        self._requests = {}
+        self._lock = threading.Lock()
+    
+    def _histogram(self, table, key):
+        """取出或创建直方图，创建时加锁"""
+        histogram = table.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = table.setdefault(key, Histogram(self.buckets))
+        return histogram
+    
+    def observe(self, stage, seconds):
+        """记录阶段耗时"""
+        self._histogram(self._stages, stage).observe(seconds)
+    
+    def timer(self, stage):
+        """阶段计时上下文: with metrics.timer('decode'): ..."""
+        return _StageTimer(self._histogram(self._stages, stage))
+    
+    def count_request(self, method, endpoint, status, seconds):
+        """记录一次请求"""
+        key = (method, endpoint, str(status))
+        with self._lock:
+            self._requests[key] = self._requests.get(key, 0) + 1
+        self._histogram(self._endpoints, endpoint).observe(seconds)
+    
+    def render(self, extra=()):
+        """
+        输出Prometheus文本格式
+        extra: 额外指标，[(名称, 类型, 说明, [(标签字典, 数值)])]，名称自动加命名空间前缀
+        """
+        with self._lock:
+            requests = sorted(self._requests.items())
+            stages = dict(self._stages)
+            endpoints = dict(self._endpoints)
+        
+        ns = self.namespace
+        blocks = [
+            render_histogram(f'{ns}_stage_duration_seconds', '各处理阶段耗时', stages),
+            render_histogram(f'{ns}_request_duration_seconds', '各接口请求耗时', endpoints, label='endpoint'),
+            render_metric(f'{ns}_http_requests_total', 'counter', '请求数', [
+                ({'method': method, 'endpoint': endpoint, 'status': status}, count)
+                for (method, endpoint, status), count in requests
+            ])
+        ]
+        for name, kind, help_text, samples in extra:
+            blocks.append(render_metric(f'{ns}_{name}', kind, help_text, samples))
+        return '\n'.join(blocks) + '\n'
@@ -3,10 +3,15 @@
 """
 
 import random
+import numpy as np
 
 class PersonalityAnalyzer:
     """性格分析器"""
     
+    # 批量模式下特征矩阵的列顺序
+    FEATURE_COLUMNS = ('face_ratio', 'brightness', 'contrast', 'texture', 'symmetry')
+    FEATURE_DEFAULTS = (0.85, 127, 50, 100, 0.8)
+    
     def __init__(self):
         self.mbti_types = [
             'INTJ', 'INTP', 'ENTJ', 'ENTP',
@@ -15,9 +20,12 @@ class PersonalityAnalyzer:
             'ISTP', 'ISFP', 'ESTP', 'ESFP'
         ]
     
-    def analyze(self, features):
-        """分析性格特征"""
-        big_five = self._calculate_big_five(features)
+    def analyze(self, features, rng=None):
+        """
+        分析性格特征
+        rng: random.Random 实例，为空时使用全局随机数
+        """
+        big_five = self._calculate_big_five(features, rng or random)
         mbti = self._infer_mbti(big_five, features)
         description = self._generate_description(big_five, mbti)
         strengths = self._identify_strengths(big_five, mbti)
@@ -31,7 +39,63 @@ class PersonalityAnalyzer:
             'suggestions': suggestions
         }
     
-    def _calculate_big_five(self, features):
+    @classmethod
+    def features_to_array(cls, feature_list):
+        """将特征字典列表转换为 N×5 特征矩阵，列顺序见 FEATURE_COLUMNS"""
+        return np.array(
+            [[f.get(col, default) for col, default in zip(cls.FEATURE_COLUMNS, cls.FEATURE_DEFAULTS)]
+             for f in feature_list],
+            dtype=np.float64
+        ).reshape(-1, len(cls.FEATURE_COLUMNS))
+    
+    def analyze_batch(self, features, rng=None):
+        """
+        批量计算Big Five与MBTI
+        features: N×5 特征矩阵，列顺序见 FEATURE_COLUMNS
+        rng: numpy.random.Generator，用于生成随机扰动
+        返回 {'bigFive': {维度: 整数数组}, 'mbti': 字符串数组}
+        """
+        rng = rng if rng is not None else np.random.default_rng()
+        big_five = self._calculate_big_five_batch(np.asarray(features, dtype=np.float64), rng)
+        return {
+            'bigFive': big_five,
+            'mbti': self._infer_mbti_batch(big_five)
+        }
+    
+    def _calculate_big_five_batch(self, features, rng):
+        """批量计算Big Five得分，与 _calculate_big_five 的公式和截断规则一致"""
+        n = features.shape[0]
+        ratio, brightness, contrast, texture, symmetry = features.T
+        brightness = brightness / 255
+        contrast = contrast / 100
+        texture = np.minimum(texture / 200, 1.0)
+        # random.randint(-5, 5) 包含两端
+        jitter = rng.integers(-5, 6, size=(5, n))
+        
+        raw = {
+            'openness': 60 + brightness * 30 + jitter[0],
+            'conscientiousness': 55 + symmetry * 35 + jitter[1],
+            'extraversion': 50 + contrast * 40 + jitter[2],
+            'agreeableness': 65 + (1 - texture) * 25 + jitter[3],
+            'neuroticism': 45 + (1 - ratio) * 40 + jitter[4]
+        }
+        return {key: np.clip(np.trunc(value), 0, 100).astype(np.int64) for key, value in raw.items()}
+    
+    def _infer_mbti_batch(self, big_five):
+        """批量推断MBTI类型：四个维度编码为0-15的索引后查表，避免逐元素拼接字符串"""
+        code = (
+            (big_five['extraversion'] > 55) * 8
+            + (big_five['openness'] > 55) * 4
+            + (big_five['agreeableness'] < 55) * 2
+            + (big_five['conscientiousness'] > 55)
+        )
+        table = np.array([
+            e + s + t + j
+            for e in 'IE' for s in 'SN' for t in 'FT' for j in 'PJ'
+        ])
+        return table[code]
+    
+    def _calculate_big_five(self, features, rng=random):
         """计算Big Five得分"""
         ratio = features.get('face_ratio', 0.85)
         brightness = features.get('brightness', 127) / 255
@@ -40,11 +104,11 @@ class PersonalityAnalyzer:
         texture = min(features.get('texture', 100) / 200, 1.0)
         
         scores = {
-            'openness': int(60 + brightness * 30 + random.randint(-5, 5)),
-            'conscientiousness': int(55 + symmetry * 35 + random.randint(-5, 5)),
-            'extraversion': int(50 + contrast * 40 + random.randint(-5, 5)),
-            'agreeableness': int(65 + (1 - texture) * 25 + random.randint(-5, 5)),
-            'neuroticism': int(45 + (1 - ratio) * 40 + random.randint(-5, 5))
+            'openness': int(60 + brightness * 30 + rng.randint(-5, 5)),
+            'conscientiousness': int(55 + symmetry * 35 + rng.randint(-5, 5)),
+            'extraversion': int(50 + contrast * 40 + rng.randint(-5, 5)),
+            'agreeableness': int(65 + (1 - texture) * 25 + rng.randint(-5, 5)),
+            'neuroticism': int(45 + (1 - ratio) * 40 + rng.randint(-5, 5))
         }
         
         for key in scores:
@@ -105,3 +169,21 @@ class PersonalityAnalyzer:
         if len(suggestions) < 3:
             suggestions.extend(['持续学习新技能', '保持工作生活平衡'])
         return suggestions[:4]
+    
+    def _generate_default_result(self):
+        """生成默认分析结果"""
+        big_five = {
+            'openness': 60,
+            'conscientiousness': 60,
+            'extraversion': 55,
+            'agreeableness': 65,
+            'neuroticism': 45
+        }
+        mbti = self._infer_mbti(big_five, {})
+        return {
+            'bigFive': big_five,
+            'mbti': mbti,
+            'description': self._generate_description(big_five, mbti),
+            'strengths': self._identify_strengths(big_five, mbti),
+            'suggestions': self._generate_suggestions(big_five, mbti)
+        }
\ No newline at end of file
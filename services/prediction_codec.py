@@ -0,0 +1,104 @@
+"""
+预测结果存储编码服务
+"""
+
+import json
+import zlib
+
+# 二进制格式以 NUL 开头，后跟一个字节的编码标识；旧数据为JSON文本，不会以 NUL 开头
+FORMAT_MARKER = b'\x00'
+
+class JSONCodec:
+    """未压缩的JSON，与旧数据格式一致，便于回退"""
+
+    name = 'json'
+    tag = None
+
+    def dumps(self, value):
+        return json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+    def loads(self, data):
+        return json.loads(data)
+
+class ZlibJSONCodec:
+    """zlib压缩的JSON"""
+
+    name = 'zjson'
+    tag = b'z'
+
+    def __init__(self, level=6):
+        self.level = level
+
+    def dumps(self, value):
+        raw = json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        return zlib.compress(raw, self.level)
+
+    def loads(self, data):
+        return json.loads(zlib.decompress(data))
+
+class MsgpackCodec:
+    """zlib压缩的msgpack，需要安装 msgpack"""
+
+    name = 'msgpack'
+    tag = b'm'
+
+    def __init__(self, level=6):
+        import msgpack
+        self._msgpack = msgpack
+        self.level = level
+
+    def dumps(self, value):
+        return zlib.compress(self._msgpack.packb(value, use_bin_type=True), self.level)
+
+    def loads(self, data):
+        return self._msgpack.unpackb(zlib.decompress(data), raw=False, strict_map_key=False)
+
+CODECS = {
+    'json': JSONCodec,
+    'zjson': ZlibJSONCodec,
+    'msgpack': MsgpackCodec
+}
+
+_decoders = {}
+
+def get_codec(name):
+    """按名称创建编码器"""
+    if name not in CODECS:
+        raise ValueError(f'未知的存储编码: {name}')
+    return CODECS[name]()
+
+def encode(value, codec):
+    """编码为带格式标识的二进制；JSON编码不加标识，与旧数据相同"""
+    if value is None:
+        return None
+    data = codec.dumps(value)
+    if codec.tag is None:
+        return data
+    return FORMAT_MARKER + codec.tag + data
+
+def detect_format(raw):
+    """识别已存储数据的编码名称，空值返回None"""
+    if not raw:
+        return None
+    if isinstance(raw, str):
+        return 'json'
+    raw = bytes(raw[:2])
+    if raw[:1] != FORMAT_MARKER:
+        return 'json'
+    for name, cls in CODECS.items():
+        if cls.tag == raw[1:2]:
+            return name
+    raise ValueError(f'无法识别的存储格式: {raw[1:2]!r}')
+
+def decode(raw):
+    """自动识别编码并解码，空值返回空字典"""
+    name = detect_format(raw)
+    if name is None:
+        return {}
+    if name == 'json':
+        return json.loads(raw if isinstance(raw, str) else bytes(raw))
+
+    decoder = _decoders.get(name)
+    if decoder is None:
+        decoder = _decoders[name] = get_codec(name)
+    return decoder.loads(bytes(raw[2:]))
@@ -0,0 +1,101 @@
+"""
+请求剖析服务
+"""
+
+import cProfile
+import os
+import pstats
+import random
+import threading
+import time
+
+class RequestProfiler:
+    """
+    用cProfile剖析单个请求：完整结果写入文件，只返回耗时最多的N个函数摘要
+    同一时间只剖析一个请求，其余请求跳过，开销有上限
+    cProfile只记录开始剖析的线程，调用方可用 is_active() 判断是否应在当前线程内执行工作
+    """
+    
+    def __init__(self, output_dir, top_n=10, sample_rate=0.0, rng=None):
+        """
+        output_dir: 剖析结果(.prof，可用 pstats / snakeviz 查看)的保存目录
+        top_n: 摘要中的热点函数数
+        sample_rate: 抽样剖析的比例，0为只在显式要求时剖析
+        """
+        self.output_dir = output_dir
+        self.top_n = top_n
+        self.sample_rate = sample_rate
+        self._rng = rng or random.Random()
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._owner = None
+        self.profiled = 0
+        self.skipped = 0
+    
+    def sampled(self):
+        """按抽样比例决定是否剖析"""
+        return self.sample_rate > 0 and self._rng.random() < self.sample_rate
+    
+    def start(self):
+        """开始剖析当前线程，已有请求在剖析时返回None"""
+        if not self._lock.acquire(blocking=False):
+            self._count('skipped')
+            return None
+        
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # 其他剖析工具已在运行
+            self._lock.release()
+            self._count('skipped')
+            return None
+        self._owner = threading.get_ident()
+        return profile
+    
+    def is_active(self):
+        """当前线程是否正在被剖析"""
+        return self._owner == threading.get_ident()
+    
+    def _stop(self, profile):
+        """停止剖析并释放名额"""
+        profile.disable()
+        self._owner = None
+        self._lock.release()
+    
+    def finish(self, profile, request_id):
+        """结束剖析并保存结果，返回 (文件路径, 热点函数摘要)"""
+        self._stop(profile)
+        
+        os.makedirs(self.output_dir, exist_ok=True)
+        timestamp = time.strftime('%Y%m%d%H%M%S')
+        path = os.path.join(self.output_dir, f'{timestamp}_{request_id}.prof')
+        profile.dump_stats(path)
+        self._count('profiled')
+        return path, self.summarize(pstats.Stats(profile))
+    
+    def discard(self, profile):
+        """放弃未正常结束的剖析"""
+        self._stop(profile)
+    
+    def summarize(self, stats):
+        """按自身耗时取前N个函数: 函数名@文件:行号=毫秒，以逗号分隔"""
+        entries = sorted(stats.stats.items(), key=lambda item: item[1][2], reverse=True)
+        return ', '.join(
+            f'{func}@{os.path.basename(filename)}:{line}={own_time * 1000:.2f}ms'
+            for (filename, line, func), (_, _, own_time, _, _) in entries[:self.top_n]
+        )
+    
+    def _count(self, name):
+        """累加计数"""
+        with self._stats_lock:
+            setattr(self, name, getattr(self, name) + 1)
+    
+    def stats(self):
+        """剖析统计"""
+        with self._stats_lock:
+            return {
+                'sample_rate': self.sample_rate,
+                'profiled': self.profiled,
+                'skipped': self.skipped
+            }
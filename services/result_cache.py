@@ -0,0 +1,166 @@
+"""
+分析结果缓存服务
+"""
+
+import json
+import threading
+import time
+from collections import OrderedDict
+
+class MemoryResultBackend:
+    """进程内后端：条目过期后失效，超出容量时淘汰最久未使用的条目"""
+    
+    name = 'memory'
+    
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key):
+        """读取未过期的条目，未命中返回None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+    
+    def set(self, key, value, ttl):
+        """写入条目，ttl 秒后过期"""
+        with self._lock:
+            self._entries[key] = (value, time.time() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def clear(self):
+        """清空所有条目"""
+        with self._lock:
+            self._entries.clear()
+    
+    def size(self):
+        """当前条目数"""
+        with self._lock:
+            return len(self._entries)
+
+class RedisResultBackend:
+    """
+    Redis后端：过期由 Redis 的 TTL 保证，多个进程/实例共享缓存
+    LRU淘汰由服务端 maxmemory-policy（如 allkeys-lru）负责
+    """
+    
+    name = 'redis'
+    
+    def __init__(self, client, prefix='fortune:result:'):
+        """client: redis.Redis 或接口兼容的客户端"""
+        self.client = client
+        self.prefix = prefix
+    
+    @classmethod
+    def from_url(cls, url, prefix='fortune:result:'):
+        """按URL创建客户端，连接失败时读写会报错并按未命中处理"""
+        import redis
+        return cls(redis.Redis.from_url(url, socket_timeout=1, socket_connect_timeout=1), prefix)
+    
+    def get(self, key):
+        """读取条目，未命中返回None"""
+        return self.client.get(self.prefix + key)
+    
+    def set(self, key, value, ttl):
+        """写入条目，ttl 秒后过期"""
+        self.client.set(self.prefix + key, value, ex=max(1, int(ttl)))
+    
+    def clear(self):
+        """清空本前缀下的条目"""
+        keys = list(self.client.scan_iter(match=self.prefix + '*'))
+        if keys:
+            self.client.delete(*keys)
+    
+    def size(self):
+        """Redis后端不统计条目数"""
+        return None
+
+def create_result_backend(kind, url=None, max_entries=1024):
+    """按名称创建缓存后端: memory / redis"""
+    if kind == 'memory':
+        return MemoryResultBackend(max_entries)
+    if kind == 'redis':
+        return RedisResultBackend.from_url(url)
+    raise ValueError(f'未知的结果缓存后端: {kind}')
+
+class ResultCache:
+    """
+    完整分析结果缓存，键为 (图像哈希, 用户ID, 分析日期, 分析器版本)
+    同一用户同一天重复提交同一张图片时直接返回已有结果
+    """
+    
+    def __init__(self, backend, ttl=24 * 3600, version='1'):
+        """
+        backend: 存储后端，需提供 get(key) 与 set(key, value, ttl)
+        ttl: 条目有效期(秒)
+        version: 分析器版本，评分逻辑变更后旧条目自动失效
+        """
+        self.backend = backend
+        self.ttl = ttl
+        self.version = str(version)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+    
+    def key(self, digest, user_id, day):
+        """生成缓存键"""
+        return f'{self.version}:{user_id}:{day.isoformat()}:{digest}'
+    
+    def get(self, digest, user_id, day):
+        """读取缓存结果，未命中或后端出错时返回None"""
+        try:
+            value = self.backend.get(self.key(digest, user_id, day))
+        except Exception as e:
+            print(f"结果缓存读取错误: {e}")
+            value = None
+            with self._lock:
+                self.errors += 1
+        
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return json.loads(value)
+    
+    def set(self, digest, user_id, day, result):
+        """写入缓存结果，后端出错时忽略"""
+        value = json.dumps(result, ensure_ascii=False)
+        try:
+            self.backend.set(self.key(digest, user_id, day), value, self.ttl)
+        except Exception as e:
+            print(f"结果缓存写入错误: {e}")
+            with self._lock:
+                self.errors += 1
+    
+    def clear(self):
+        """清空缓存与计数"""
+        self.backend.clear()
+        with self._lock:
+            self.hits = self.misses = self.errors = 0
+    
+    def stats(self):
+        """缓存统计"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'backend': self.backend.name,
+                'hits': self.hits,
+                'misses': self.misses,
+                'errors': self.errors,
+                'hit_rate': round(self.hits / total, 4) if total else 0.0,
+                'size': self.backend.size(),
+                'ttl': self.ttl,
+                'version': self.version
+            }
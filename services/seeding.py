@@ -0,0 +1,41 @@
+"""
+确定性评分服务
+"""
+
+import hashlib
+import json
+import random
+
+# 评分逻辑版本：修改任一分析器的评分规则后需递增，使缓存的分析结果失效
+SCORING_VERSION = '1'
+
+def analysis_seed(features, user_id, day):
+    """
+    由图像特征、用户ID与分析日期生成种子
+    相同输入得到相同种子，可据此缓存或复现预测结果
+    """
+    payload = json.dumps(features, sort_keys=True, separators=(',', ':'))
+    text = f'{payload}|{user_id}|{day.isoformat()}'
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+def stage_rng(seed, stage):
+    """
+    为单个分析阶段派生独立的随机数生成器
+    各阶段互不共享状态，结果与并行调度顺序无关；seed 为空时返回None，分析器使用全局随机数
+    """
+    if seed is None:
+        return None
+    return random.Random(f'{seed}:{stage}')
+
+def seeded_stage(name, func, dated=False):
+    """
+    包装分析函数，作为流水线阶段使用
+    包装后的函数先接收 (seed, today)，再按原顺序接收其余依赖
+    dated: 是否将分析日期作为 today 参数传入
+    """
+    def run(seed, today, *args):
+        kwargs = {'rng': stage_rng(seed, name)}
+        if dated:
+            kwargs['today'] = today
+        return func(*args, **kwargs)
+    return run
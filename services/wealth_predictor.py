@@ -3,20 +3,27 @@
 """
 
 import random
+import numpy as np
 from datetime import datetime
 
 class WealthPredictor:
     """财富预测器"""
     
-    def predict(self, features, personality, career):
-        """预测财富趋势"""
+    def predict(self, features, personality, career, rng=None, today=None):
+        """
+        预测财富趋势
+        rng: random.Random 实例，为空时使用全局随机数
+        today: 分析日期，为空时使用当前日期
+        """
+        rng = rng or random
+        today = today or datetime.now()
         big_five = personality['bigFive']
         success_rate = career['successRate']
         
-        current_trend = self._calculate_current_trend(big_five, success_rate)
-        accumulation_trend = self._generate_accumulation_trend(big_five, success_rate)
+        current_trend = self._calculate_current_trend(big_five, success_rate, rng)
+        accumulation_trend = self._generate_accumulation_trend(big_five, success_rate, rng, today)
         investment_advice = self._generate_investment_advice(big_five)
-        peak_year = self._predict_peak_year(big_five, success_rate)
+        peak_year = self._predict_peak_year(big_five, success_rate, rng, today)
         
         return {
             'current_trend': current_trend,
@@ -26,22 +33,48 @@ class WealthPredictor:
             'riskTolerance': self._calculate_risk_tolerance(big_five)
         }
     
-    def _calculate_current_trend(self, big_five, success_rate):
+    def predict_batch(self, big_five, success_rate, rng=None):
+        """
+        批量计算当前财富趋势与风险承受能力
+        big_five: {维度: 数组}；success_rate: CareerPredictor.predict_batch 的 successRate
+        """
+        rng = rng if rng is not None else np.random.default_rng()
+        return {
+            'current_trend': self._calculate_current_trend_batch(big_five, success_rate, rng),
+            'riskTolerance': self._calculate_risk_tolerance_batch(big_five)
+        }
+    
+    def _calculate_current_trend_batch(self, big_five, success_rate, rng):
+        """批量计算当前财富趋势分数，与 _calculate_current_trend 规则一致"""
+        conscientiousness = np.asarray(big_five['conscientiousness'], dtype=np.float64)
+        success_rate = np.asarray(success_rate, dtype=np.float64)
+        base = 55 + (conscientiousness - 50) * 0.3 + (success_rate - 50) * 0.4
+        base += rng.integers(-5, 11, size=base.shape)
+        return np.trunc(np.clip(base, 40, 95)).astype(np.int64)
+    
+    def _calculate_risk_tolerance_batch(self, big_five):
+        """批量计算风险承受能力，与 _calculate_risk_tolerance 规则一致（先取整再截断）"""
+        openness = np.asarray(big_five['openness'], dtype=np.float64)
+        neuroticism = np.asarray(big_five['neuroticism'], dtype=np.float64)
+        tolerance = 50 + (openness - 50) * 0.3 + (50 - neuroticism) * 0.5
+        return np.clip(np.trunc(tolerance), 20, 90).astype(np.int64)
+    
+    def _calculate_current_trend(self, big_five, success_rate, rng=random):
         """计算当前财富趋势分数"""
         base = 55
         base += (big_five['conscientiousness'] - 50) * 0.3
         base += (success_rate - 50) * 0.4
-        base += random.randint(-5, 10)
+        base += rng.randint(-5, 10)
         return int(max(40, min(95, base)))
     
-    def _generate_accumulation_trend(self, big_five, success_rate):
+    def _generate_accumulation_trend(self, big_five, success_rate, rng=random, today=None):
         """生成财富积累趋势"""
-        current_year = datetime.now().year
+        current_year = (today or datetime.now()).year
         trend = []
         for i in range(10):
             trend.append({
                 'year': current_year + i,
-                'score': 50 + i * 4 + random.randint(-2, 5)
+                'score': 50 + i * 4 + rng.randint(-2, 5)
             })
         return trend
     
@@ -57,9 +90,9 @@ class WealthPredictor:
         advice.append('保持应急储备金')
         return advice
     
-    def _predict_peak_year(self, big_five, success_rate):
+    def _predict_peak_year(self, big_five, success_rate, rng=random, today=None):
         """预测财富峰值年份"""
-        return datetime.now().year + 15 + random.randint(-2, 3)
+        return (today or datetime.now()).year + 15 + rng.randint(-2, 3)
     
     def _calculate_risk_tolerance(self, big_five):
         """计算风险承受能力"""
@@ -67,3 +100,14 @@ class WealthPredictor:
         tolerance += (big_five['openness'] - 50) * 0.3
         tolerance += (50 - big_five['neuroticism']) * 0.5
         return max(20, min(90, int(tolerance)))
+    
+    def _generate_default_result(self, today=None):
+        """生成默认预测结果，today 为分析日期，为空时使用当前日期"""
+        current_year = (today or datetime.now()).year
+        return {
+            'current_trend': 70,
+            'accumulationTrend': [{'year': current_year + i, 'score': 50 + i * 4} for i in range(10)],
+            'investmentAdvice': ['建议建立理财规划', '保持应急储备金'],
+            'peakYear': current_year + 15,
+            'riskTolerance': 50
+        }
\ No newline at end of file
@@ -3,15 +3,59 @@ API接口测试
 """
 
 import unittest
+import importlib.util
 import json
 import os
 import sys
+import shutil
+import tempfile
+import time
 from io import BytesIO
 
+import cv2
+import numpy as np
+
 # 添加项目根目录到路径
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from app import app, db, User, Prediction
+from app import app, db, User, Prediction, result_cache, upload_limiter, analysis_gate
+from celery_app import celery
+
+def make_video_file(path, frames=40, size=64):
+    """生成测试用AVI视频"""
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), 10, (size, size))
+    for i in range(frames):
+        frame = np.tile(np.linspace(0, 255, size, dtype=np.uint8), (size, 1))
+        writer.write(cv2.merge([frame, frame, np.full_like(frame, i * 5 % 256)]))
+    writer.release()
+
+class FakeCascade:
+    """记录检测输入尺寸，返回固定检测框的级联分类器替身"""
+    
+    def __init__(self, boxes):
+        self.boxes = np.array(boxes)
+        self.shapes = []
+    
+    def empty(self):
+        return False
+    
+    def detectMultiScale(self, gray, *args, **kwargs):
+        self.shapes.append(gray.shape)
+        return self.boxes
+
+def use_fake_cascade(processor, boxes):
+    """让处理器使用返回固定检测框的分类器"""
+    from services.detector_pool import DetectorPool
+    
+    fake = FakeCascade(boxes)
+    processor.detector_pool = DetectorPool(lambda: fake, 1)
+    return fake
+
+def make_image_bytes(width=64, height=64):
+    """生成测试用PNG图片"""
+    img = np.tile(np.linspace(0, 255, width, dtype=np.uint8), (height, 1))
+    ok, buf = cv2.imencode('.png', cv2.merge([img, img, img]))
+    return buf.tobytes()
 
 class FortuneAPITestCase(unittest.TestCase):
     """API测试用例"""
@@ -20,8 +64,22 @@ class FortuneAPITestCase(unittest.TestCase):
         """测试前设置"""
         app.config['TESTING'] = True
         app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+        self.upload_folder = app.config['UPLOAD_FOLDER']
+        self.tmp_dir = tempfile.mkdtemp()
+        app.config['UPLOAD_FOLDER'] = self.tmp_dir
         self.app = app.test_client()
         
+        # Celery以eager模式运行，无需broker
+        celery.conf.update(
+            task_always_eager=True,
+            task_store_eager_result=True,
+            result_backend='cache+memory://'
+        )
+        
+        # 各用例的用户ID相同，清空结果缓存避免互相命中，清空限流避免令牌耗尽
+        result_cache.clear()
+        upload_limiter.clear()
+        
         with app.app_context():
             db.create_all()
     
@@ -30,6 +88,8 @@ class FortuneAPITestCase(unittest.TestCase):
         with app.app_context():
             db.session.remove()
             db.drop_all()
+        app.config['UPLOAD_FOLDER'] = self.upload_folder
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
     
     def test_index(self):
         """测试首页"""
@@ -159,6 +219,450 @@ class FortuneAPITestCase(unittest.TestCase):
         data = json.loads(response.data)
         return data['access_token']
     
+    def add_predictions(self, count, created_at=None):
+        """直接写入预测记录，created_at 相同时用于验证翻页的并列排序"""
+        from datetime import datetime, timedelta
+        
+        with app.app_context():
+            user = User.query.first()
+            base = datetime(2024, 5, 1)
+            for i in range(count):
+                db.session.add(Prediction(
+                    user_id=user.id,
+                    image_path=f'{i}.png',
+                    created_at=created_at or base + timedelta(minutes=i),
+                    personality_data='{}',
+                    fortune_data=json.dumps({'daily': {'today': i}})
+                ))
+            db.session.commit()
+    
+    def capture_queries(self, path, token, table='predictions', headers=None):
+        """请求接口并记录读取指定表的SQL语句"""
+        from sqlalchemy import event
+        
+        statements = []
+        def record(conn, cursor, statement, *args):
+            statements.append(statement)
+        
+        with app.app_context():
+            engine = db.engine
+        event.listen(engine, 'before_cursor_execute', record)
+        try:
+            response = self.app.get(path, headers={'Authorization': f'Bearer {token}', **(headers or {})})
+        finally:
+            event.remove(engine, 'before_cursor_execute', record)
+        return response, [sql for sql in statements if f'FROM {table}' in sql]
+    
+    def test_predictions_keyset_pagination(self):
+        """测试按 (created_at, id) 键集分页，同一时间的记录不重复不遗漏"""
+        from datetime import datetime
+        
+        token = self.get_auth_token()
+        self.add_predictions(3)
+        self.add_predictions(4, created_at=datetime(2024, 5, 1, 0, 1))
+        
+        seen = []
+        cursor = None
+        pages = 0
+        while True:
+            query = f'?limit=2&cursor={cursor}' if cursor else '?limit=2'
+            response = self.app.get(f'/api/predictions{query}',
+                headers={'Authorization': f'Bearer {token}'}
+            )
+            self.assertEqual(response.status_code, 200)
+            data = json.loads(response.data)
+            self.assertLessEqual(len(data['predictions']), 2)
+            seen.extend(item['id'] for item in data['predictions'])
+            pages += 1
+            cursor = data['next_cursor']
+            if cursor is None:
+                break
+        
+        self.assertEqual(pages, 4)
+        self.assertEqual(len(seen), 7)
+        with app.app_context():
+            expected = [p.id for p in Prediction.query.order_by(
+                Prediction.created_at.desc(), Prediction.id.desc()
+            )]
+        self.assertEqual(seen, expected)
+    
+    def test_predictions_list_defers_heavy_columns(self):
+        """测试列表查询不加载其余JSON字段"""
+        token = self.get_auth_token()
+        self.add_predictions(2)
+        
+        response, queries = self.capture_queries('/api/predictions', token)
+        data = json.loads(response.data)
+        self.assertEqual(data['predictions'][0]['fortune_summary'], {'today': 1})
+        self.assertIsNone(data['next_cursor'])
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('personality_data', queries[0])
+    
+    def test_predictions_invalid_cursor(self):
+        """测试无效游标与limit"""
+        token = self.get_auth_token()
+        for query in ('?cursor=not-a-cursor', '?limit=0'):
+            response = self.app.get(f'/api/predictions{query}',
+                headers={'Authorization': f'Bearer {token}'}
+            )
+            self.assertEqual(response.status_code, 400)
+    
+    def test_export_ndjson_streams_in_batches(self):
+        """测试NDJSON流式导出，按批读取并支持部分筛选"""
+        from unittest import mock
+        
+        token = self.get_auth_token()
+        self.add_predictions(5)
+        
+        with mock.patch.dict(app.config, {'EXPORT_BATCH_SIZE': 2}):
+            response = self.app.get('/api/predictions/export?fields=fortune.daily',
+                headers={'Authorization': f'Bearer {token}'}
+            )
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response.is_streamed)
+            self.assertEqual(response.mimetype, 'application/x-ndjson')
+            lines = response.get_data(as_text=True).splitlines()
+        
+        records = [json.loads(line) for line in lines]
+        self.assertEqual([r['fortune'] for r in records], [{'daily': {'today': i}} for i in range(5)])
+        self.assertNotIn('personality', records[0])
+        self.assertIn('daily_today', records[0])
+    
+    def test_export_error_marker(self):
+        """测试导出中途出错时末尾写入错误标记"""
+        import csv
+        import io
+        from unittest import mock
+        from services import prediction_codec
+        
+        token = self.get_auth_token()
+        self.add_predictions(3)
+        decode = prediction_codec.decode
+        calls = []
+        def failing_decode(raw):
+            calls.append(raw)
+            if len(calls) == 2:
+                raise ValueError('损坏的记录')
+            return decode(raw)
+        
+        for export_format in ('ndjson', 'csv'):
+            calls.clear()
+            with mock.patch.object(prediction_codec, 'decode', failing_decode):
+                response = self.app.get(f'/api/predictions/export?format={export_format}&fields=fortune',
+                    headers={'Authorization': f'Bearer {token}'}
+                )
+                body = response.get_data(as_text=True)
+            self.assertEqual(response.status_code, 200)
+            
+            if export_format == 'ndjson':
+                lines = [json.loads(line) for line in body.splitlines()]
+                self.assertEqual(len(lines), 2)
+                self.assertEqual(lines[-1], {'error': '导出中断，记录不完整'})
+            else:
+                rows = list(csv.reader(io.StringIO(body)))
+                self.assertEqual(len(rows), 3)
+                self.assertEqual(rows[-1], ['error', '导出中断，记录不完整'])
+    
+    def test_export_csv(self):
+        """测试CSV导出"""
+        import csv
+        
+        token = self.get_auth_token()
+        self.add_predictions(3)
+        response = self.app.get('/api/predictions/export?format=csv&fields=fortune',
+            headers={'Authorization': f'Bearer {token}'}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('attachment', response.headers['Content-Disposition'])
+        
+        rows = list(csv.DictReader(response.get_data(as_text=True).splitlines()))
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(json.loads(rows[2]['fortune']), {'daily': {'today': 2}})
+        self.assertNotIn('love', rows[0])
+        
+        response = self.app.get('/api/predictions/export?format=xml',
+            headers={'Authorization': f'Bearer {token}'}
+        )
+        self.assertEqual(response.status_code, 400)
+    
+    def test_prediction_detail_fields(self):
+        """测试详情按 fields 只加载并返回所需部分"""
+        token = self.get_auth_token()
+        self.add_predictions(1)
+        with app.app_context():
+            prediction_id = Prediction.query.first().id
+        
+        response, queries = self.capture_queries(
+            f'/api/prediction/{prediction_id}?fields=fortune.daily.today,personality', token
+        )
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.data)
+        self.assertEqual(set(data), {'id', 'created_at', 'fortune', 'personality'})
+        self.assertEqual(data['fortune'], {'daily': {'today': 0}})
+        for sql in queries:
+            self.assertNotIn('career_data', sql)
+            self.assertNotIn('astrology_data', sql)
+        
+        # 未指定 fields 时返回全部部分
+        data = json.loads(self.app.get(f'/api/prediction/{prediction_id}',
+            headers={'Authorization': f'Bearer {token}'}
+        ).data)
+        self.assertEqual(set(data) - {'id', 'created_at'}, {
+            'personality', 'career', 'wealth', 'love', 'fortune', 'astrology'
+        })
+        
+        response = self.app.get(f'/api/prediction/{prediction_id}?fields=secret',
+            headers={'Authorization': f'Bearer {token}'}
+        )
+        self.assertEqual(response.status_code, 400)
+    
+    def test_dashboard_stats_fields(self):
+        """测试仪表盘按 fields 裁剪返回字段"""
+        token = self.get_auth_token()
+        self.add_predictions(1)
+        
+        response = self.app.get('/api/dashboard/stats?fields=daily.today,love_score',
+            headers={'Authorization': f'Bearer {token}'}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.data), {'daily': {'today': 0}, 'love_score': 0})
+        
+        response = self.app.get('/api/dashboard/stats?fields=secret',
+            headers={'Authorization': f'Bearer {token}'}
+        )
+        self.assertEqual(response.status_code, 400)
+    
+    def test_prediction_detail_etag(self):
+        """测试详情的ETag、Cache-Control与304，命中时不读取JSON列"""
+        token = self.get_auth_token()
+        self.add_predictions(1)
+        with app.app_context():
+            prediction_id = Prediction.query.first().id
+        path = f'/api/prediction/{prediction_id}'
+        
+        response = self.app.get(path, headers={'Authorization': f'Bearer {token}'})
+        etag = response.headers['ETag']
+        self.assertTrue(etag.startswith('"'))
+        self.assertIn('max-age', response.headers['Cache-Control'])
+        self.assertIn('private', response.headers['Cache-Control'])
+        
+        # 命中时只读取 id 与创建时间
+        response, queries = self.capture_queries(path, token, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.data, b'')
+        self.assertEqual(response.headers['ETag'], etag)
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('fortune_data', queries[0])
+        
+        # 不同的字段投影使用不同的ETag
+        response = self.app.get(f'{path}?fields=fortune', headers={
+            'Authorization': f'Bearer {token}',
+            'If-None-Match': etag
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers['ETag'], etag)
+    
+    def test_dashboard_etag_changes_with_new_prediction(self):
+        """测试仪表盘ETag在有新预测后失效"""
+        token = self.get_auth_token()
+        self.add_predictions(1)
+        
+        response = self.app.get('/api/dashboard/stats', headers={'Authorization': f'Bearer {token}'})
+        etag = response.headers['ETag']
+        self.assertEqual(response.headers['Cache-Control'], 'private, no-cache')
+        
+        response = self.app.get('/api/dashboard/stats', headers={
+            'Authorization': f'Bearer {token}',
+            'If-None-Match': etag
+        })
+        self.assertEqual(response.status_code, 304)
+        
+        self.upload(token)
+        response = self.app.get('/api/dashboard/stats', headers={
+            'Authorization': f'Bearer {token}',
+            'If-None-Match': etag
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers['ETag'], etag)
+    
+    def test_legacy_json_rows_readable_and_migrated(self):
+        """测试旧的JSON文本记录可读取，并可分批迁移为压缩编码"""
+        from sqlalchemy import text
+        from services import prediction_codec
+        from scripts.migrate_prediction_storage import migrate
+        
+        token = self.get_auth_token()
+        with app.app_context():
+            user_id = User.query.first().id
+            for i in range(3):
+                db.session.execute(text(
+                    'INSERT INTO predictions (user_id, image_path, fortune_data, love_data, created_at) '
+                    'VALUES (:user_id, :path, :fortune, :love, :created_at)'
+                ), {
+                    'user_id': user_id,
+                    'path': f'{i}.png',
+                    'fortune': json.dumps({'daily': {'today': i}, '说明': '旧数据'}, ensure_ascii=False),
+                    'love': None,
+                    'created_at': f'2024-05-0{i + 1} 00:00:00'
+                })
+            db.session.commit()
+            prediction_id = Prediction.query.order_by(Prediction.id).first().id
+        
+        path = f'/api/prediction/{prediction_id}?fields=fortune,love'
+        before = json.loads(self.app.get(path, headers={'Authorization': f'Bearer {token}'}).data)
+        self.assertEqual(before['fortune'], {'daily': {'today': 0}, '说明': '旧数据'})
+        self.assertEqual(before['love'], {})
+        
+        with app.app_context():
+            codec = prediction_codec.get_codec('zjson')
+            stats = migrate(codec, batch_size=2)
+            self.assertEqual((stats['rows'], stats['converted']), (3, 3))
+            raw = db.session.execute(text('SELECT fortune_data FROM predictions')).scalars().all()
+            self.assertEqual({prediction_codec.detect_format(r) for r in raw}, {'zjson'})
+            
+            # 已转换的记录不重复处理
+            self.assertEqual(migrate(codec, batch_size=2)['converted'], 0)
+        
+        after = json.loads(self.app.get(path, headers={'Authorization': f'Bearer {token}'}).data)
+        self.assertEqual(after, before)
+    
+    def test_scores_extracted_on_write(self):
+        """测试写入预测时提取分数列，并可在SQL中聚合"""
+        token = self.get_auth_token()
+        prediction_id = json.loads(self.upload(token).data)['prediction_id']
+        with app.app_context():
+            prediction = db.session.get(Prediction, prediction_id)
+            self.assertEqual(prediction.daily_today, prediction.fortune['daily']['today'])
+            self.assertEqual(prediction.success_rate, prediction.career['successRate'])
+            self.assertEqual(prediction.stability_score, prediction.love['stabilityScore'])
+            self.assertEqual(prediction.current_trend, prediction.wealth['current_trend'])
+            self.assertEqual(prediction.risk_tolerance, prediction.wealth['riskTolerance'])
+            self.assertEqual(prediction.mbti, prediction.personality['mbti'])
+            daily = prediction.daily_today
+            mbti = prediction.mbti
+            love = prediction.stability_score
+        
+        response = self.app.get(f'/api/stats/scores?threshold={daily}',
+            headers={'Authorization': f'Bearer {token}'}
+        )
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.data)
+        self.assertEqual(data['count'], 1)
+        self.assertEqual(data['daily_at_least'], {'threshold': daily, 'count': 1})
+        self.assertEqual(data['averages']['stability_score'], love)
+        self.assertEqual(data['mbti'], {mbti: 1})
+    
+    def test_backfill_scores_on_legacy_schema(self):
+        """测试为旧表结构补充分数列并回填旧记录"""
+        from sqlalchemy import text
+        from scripts.backfill_scores import ensure_score_columns, backfill
+        
+        with app.app_context():
+            db.drop_all()
+            User.__table__.create(db.engine)
+            with db.engine.begin() as conn:
+                conn.execute(text(
+                    'CREATE TABLE predictions (id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, '
+                    'image_path VARCHAR(500) NOT NULL, personality_data TEXT, career_data TEXT, '
+                    'wealth_data TEXT, love_data TEXT, fortune_data TEXT, astrology_data TEXT, created_at DATETIME)'
+                ))
+                conn.execute(text('INSERT INTO users (id, username, email, password_hash) VALUES (1, "u", "u@example.com", "x")'))
+                for i in range(3):
+                    conn.execute(text(
+                        'INSERT INTO predictions (user_id, image_path, personality_data, career_data, '
+                        'wealth_data, love_data, fortune_data, created_at) '
+                        'VALUES (1, :path, :personality, :career, :wealth, :love, :fortune, CURRENT_TIMESTAMP)'
+                    ), {
+                        'path': f'{i}.png',
+                        'personality': json.dumps({'mbti': 'INTJ' if i else 'ENFP'}),
+                        'career': json.dumps({'successRate': 60 + i}),
+                        'wealth': json.dumps({'current_trend': 70, 'riskTolerance': 50}),
+                        'love': json.dumps({'stabilityScore': 70 + i * 10}),
+                        'fortune': json.dumps({'daily': {'today': 75 + i * 5}})
+                    })
+            
+            ensure_score_columns()
+            ensure_score_columns()
+            self.assertEqual(backfill(batch_size=2), 3)
+            self.assertEqual(backfill(batch_size=2), 0)
+            
+            from app import score_aggregates
+            stats = score_aggregates(Prediction.user_id == 1, threshold=80)
+            self.assertEqual(stats['count'], 3)
+            self.assertEqual(stats['daily_at_least']['count'], 2)
+            self.assertEqual(stats['averages']['stability_score'], 80)
+            self.assertEqual(stats['mbti'], {'INTJ': 2, 'ENFP': 1})
+            
+            db.drop_all()
+            db.create_all()
+    
+    def test_dashboard_summary_written_with_prediction(self):
+        """测试预测写入时同步更新仪表盘摘要，读取时不再查询预测表"""
+        from app import DashboardSummary
+        
+        token = self.get_auth_token()
+        prediction_id = json.loads(self.upload(token).data)['prediction_id']
+        with app.app_context():
+            summary = DashboardSummary.query.one()
+            self.assertEqual(summary.prediction_id, prediction_id)
+            fortune = db.session.get(Prediction, prediction_id).fortune
+        
+        response, queries = self.capture_queries('/api/dashboard/stats', token)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(queries, [])
+        data = json.loads(response.data)
+        self.assertEqual(data['daily'], fortune['daily'])
+        self.assertEqual(set(data), {
+            'daily', 'monthly', 'yearly', 'wealth_trend', 'love_score', 'career_fields'
+        })
+    
+    def test_dashboard_summary_keeps_newest_on_race(self):
+        """测试并发写入时，事先读到的过期摘要不会让旧预测覆盖新预测"""
+        from sqlalchemy import update
+        from app import DashboardSummary, update_dashboard_summary
+        
+        self.get_auth_token()
+        self.add_predictions(3)
+        with app.app_context():
+            oldest, older, newest = Prediction.query.order_by(Prediction.id).all()
+            update_dashboard_summary(oldest, {})
+            db.session.commit()
+            stale = db.session.get(DashboardSummary, oldest.user_id)
+            self.assertEqual(stale.prediction_id, oldest.id)
+            
+            # 另一个请求在此之后提交了最新的预测
+            with db.engine.begin() as conn:
+                conn.execute(update(DashboardSummary).values(prediction_id=newest.id))
+            
+            summary = update_dashboard_summary(older, {})
+            db.session.commit()
+            self.assertEqual(summary.prediction_id, newest.id)
+            self.assertEqual(DashboardSummary.query.one().prediction_id, newest.id)
+    
+    def test_backfill_dashboard_summary(self):
+        """测试为已有预测回填仪表盘摘要"""
+        from app import DashboardSummary
+        from scripts.backfill_dashboard import backfill
+        
+        self.get_auth_token()
+        self.add_predictions(3)
+        with app.app_context():
+            db.session.add(User(username='other', email='other@example.com', password_hash='x'))
+            db.session.commit()
+            other_id = User.query.filter_by(username='other').one().id
+            db.session.add(Prediction(user_id=other_id, image_path='x.png', fortune_data='{}'))
+            db.session.commit()
+            
+            self.assertEqual(backfill(batch_size=1), 2)
+            latest = Prediction.query.filter(Prediction.user_id != other_id).order_by(
+                Prediction.created_at.desc()
+            ).first()
+            summaries = {s.user_id: s for s in DashboardSummary.query}
+            self.assertEqual(len(summaries), 2)
+            self.assertEqual(summaries[latest.user_id].prediction_id, latest.id)
+            self.assertEqual(json.loads(summaries[latest.user_id].payload)['daily'], {'today': 2})
+            self.assertEqual(json.loads(summaries[other_id].payload)['love_score'], 0)
+    
     def test_dashboard_stats_no_data(self):
         """测试无数据时的仪表盘"""
         token = self.get_auth_token()
@@ -179,6 +683,599 @@ class FortuneAPITestCase(unittest.TestCase):
         
         self.assertEqual(response.status_code, 404)
 
+    def upload(self, token, query=''):
+        """上传测试图片"""
+        return self.app.post(f'/api/upload{query}',
+            data={'file': (BytesIO(make_image_bytes()), 'face.png')},
+            headers={'Authorization': f'Bearer {token}'},
+            content_type='multipart/form-data'
+        )
+    
+    def test_upload_sync(self):
+        """测试同步上传分析"""
+        token = self.get_auth_token()
+        response = self.upload(token)
+        
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.data)
+        self.assertIn('prediction_id', data)
+        self.assertIn('advice', data)
+        
+        # 原图由后台线程写入
+        with app.app_context():
+            image_path = db.session.get(Prediction, data['prediction_id']).image_path
+        for _ in range(50):
+            if os.path.exists(image_path):
+                break
+            time.sleep(0.05)
+        with open(image_path, 'rb') as f:
+            self.assertEqual(f.read(), make_image_bytes())
+    
+    def test_upload_video(self):
+        """测试视频上传分析"""
+        token = self.get_auth_token()
+        video_path = os.path.join(self.tmp_dir, 'source.avi')
+        make_video_file(video_path)
+        with open(video_path, 'rb') as f:
+            video = f.read()
+        
+        response = self.app.post('/api/upload',
+            data={'file': (BytesIO(video), 'clip.avi')},
+            headers={'Authorization': f'Bearer {token}'},
+            content_type='multipart/form-data'
+        )
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('prediction_id', json.loads(response.data))
+    
+    def test_upload_video_non_ascii_name(self):
+        """测试非ASCII文件名的视频仍按视频分析"""
+        from unittest import mock
+        import app as app_module
+        
+        token = self.get_auth_token()
+        video_path = os.path.join(self.tmp_dir, 'source.avi')
+        make_video_file(video_path)
+        with open(video_path, 'rb') as f:
+            video = f.read()
+        
+        processor = app_module.image_processor
+        with mock.patch.object(processor, 'extract_video_features',
+                               wraps=processor.extract_video_features) as extract:
+            response = self.app.post('/api/upload',
+                data={'file': (BytesIO(video), '视频.avi')},
+                headers={'Authorization': f'Bearer {token}'},
+                content_type='multipart/form-data'
+            )
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(extract.call_count, 1)
+        self.assertTrue(extract.call_args[0][0].endswith('.avi'))
+    
+    def test_upload_async_job(self):
+        """测试异步上传与任务查询"""
+        token = self.get_auth_token()
+        response = self.upload(token, '?async=1')
+        
+        self.assertEqual(response.status_code, 202)
+        job_id = json.loads(response.data)['job_id']
+        
+        response = self.app.get(f'/api/jobs/{job_id}',
+            headers={'Authorization': f'Bearer {token}'}
+        )
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.data)
+        self.assertEqual(data['status'], 'SUCCESS')
+        self.assertIn('prediction_id', data['result'])
+        
+        with app.app_context():
+            self.assertEqual(Prediction.query.count(), 1)
+
+    def test_job_status_owner_only(self):
+        """测试任务状态只对提交者可见，失败时不返回异常详情"""
+        from unittest import mock
+        import app as app_module
+        
+        token = self.get_auth_token()
+        with mock.patch.object(app_module, 'run_analysis', side_effect=RuntimeError('/srv/secret/path')):
+            response = self.upload(token, '?async=1')
+        job_id = json.loads(response.data)['job_id']
+        
+        response = self.app.get(f'/api/jobs/{job_id}', headers={'Authorization': f'Bearer {token}'})
+        data = json.loads(response.data)
+        self.assertEqual(data['status'], 'FAILURE')
+        self.assertEqual(data['error'], '分析失败')
+        
+        response = self.app.post('/api/register',
+            data=json.dumps({'username': 'other', 'email': 'other@example.com', 'password': 'password123'}),
+            content_type='application/json'
+        )
+        other = json.loads(response.data)['access_token']
+        for path in (job_id, 'unknown-job', 'abc'):
+            response = self.app.get(f'/api/jobs/{path}', headers={'Authorization': f'Bearer {other}'})
+            self.assertEqual(response.status_code, 404)
+    
+    def test_upload_stream(self):
+        """测试SSE逐段推送分析结果"""
+        token = self.get_auth_token()
+        response = self.app.post('/api/upload/stream',
+            data={'file': (BytesIO(make_image_bytes()), 'face.png')},
+            headers={'Authorization': f'Bearer {token}'},
+            content_type='multipart/form-data'
+        )
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.mimetype.startswith('text/event-stream'))
+        
+        events = [
+            line[len('event: '):]
+            for line in response.get_data(as_text=True).splitlines()
+            if line.startswith('event: ')
+        ]
+        # 响应关闭时归还分析名额
+        response.close()
+        self.assertEqual(analysis_gate.in_flight, 0)
+        # 无依赖的阶段并行执行，完成顺序不固定，只检查依赖顺序
+        self.assertEqual(events[-2:], ['advice', 'done'])
+        self.assertEqual(sorted(events[:-2]), [
+            'astrology', 'career', 'fortune', 'love', 'personality', 'wealth'
+        ])
+        for section in ('career', 'love', 'fortune'):
+            self.assertLess(events.index('personality'), events.index(section))
+        self.assertLess(events.index('career'), events.index('wealth'))
+        
+        with app.app_context():
+            self.assertEqual(Prediction.query.count(), 1)
+    
+    def upload_batch(self, token, files):
+        """批量上传，files 为 [(数据, 文件名)]"""
+        return self.app.post('/api/upload/batch',
+            data={'files': [(BytesIO(data), name) for data, name in files]},
+            headers={'Authorization': f'Bearer {token}'},
+            content_type='multipart/form-data'
+        )
+    
+    def test_upload_batch_files(self):
+        """测试批量上传多个文件，逐项返回结果或错误"""
+        token = self.get_auth_token()
+        response = self.upload_batch(token, [
+            (make_image_bytes(), 'a.png'),
+            (b'text', 'notes.txt'),
+            (make_image_bytes(32, 48), 'b.jpg')
+        ])
+        
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.data)
+        self.assertEqual((data['total'], data['succeeded'], data['failed']), (3, 2, 1))
+        first, bad, second = data['results']
+        self.assertEqual([first['filename'], bad['filename'], second['filename']], ['a.png', 'notes.txt', 'b.jpg'])
+        self.assertEqual(bad['error'], '不支持的文件格式')
+        self.assertIn('advice', first)
+        self.assertLess(first['prediction_id'], second['prediction_id'])
+        
+        # 仪表盘摘要指向最后一条
+        response = self.app.get('/api/dashboard/stats', headers={'Authorization': f'Bearer {token}'})
+        self.assertIn(f"-{second['prediction_id']}-", response.headers['ETag'])
+    
+    def test_upload_batch_zip(self):
+        """测试批量上传zip压缩包，按成员逐项分析"""
+        import zipfile
+        
+        archive = BytesIO()
+        with zipfile.ZipFile(archive, 'w') as zf:
+            zf.writestr('faces/', '')
+            zf.writestr('faces/face.png', make_image_bytes())
+            zf.writestr('more/face.png', make_image_bytes(48, 48))
+            zf.writestr('readme.md', 'hello')
+        
+        token = self.get_auth_token()
+        response = self.upload_batch(token, [
+            (archive.getvalue(), 'photos.zip'),
+            (b'not a zip', 'broken.zip')
+        ])
+        
+        self.assertEqual(response.status_code, 200)
+        results = json.loads(response.data)['results']
+        self.assertEqual([item['filename'] for item in results], [
+            'faces/face.png', 'more/face.png', 'readme.md', 'broken.zip'
+        ])
+        self.assertEqual(results[2]['error'], '不支持的文件格式')
+        self.assertEqual(results[3]['error'], '无效的压缩包')
+        
+        # 同名成员保存为不同文件
+        with app.app_context():
+            paths = {p.image_path for p in Prediction.query.all()}
+        self.assertEqual(len(paths), 2)
+    
+    def test_upload_batch_single_insert(self):
+        """测试批量上传的预测记录在一次flush中批量插入、一次提交"""
+        from unittest import mock
+        from sqlalchemy import event
+        
+        statements = []
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(context)
+        
+        with app.app_context():
+            engine = db.engine
+        token = self.get_auth_token()
+        event.listen(engine, 'before_cursor_execute', record)
+        try:
+            with mock.patch.object(db.session, 'commit', wraps=db.session.commit) as commit:
+                response = self.upload_batch(token, [(make_image_bytes(16 * (i + 1)), f'{i}.png') for i in range(5)])
+        finally:
+            event.remove(engine, 'before_cursor_execute', record)
+        
+        self.assertEqual(json.loads(response.data)['succeeded'], 5)
+        commit.assert_called_once()
+        # 所有插入来自同一条批量语句（insertmanyvalues）
+        inserts = {id(context) for context in statements if context.statement.startswith('INSERT INTO predictions')}
+        self.assertEqual(len(inserts), 1)
+        with app.app_context():
+            self.assertEqual(Prediction.query.count(), 5)
+    
+    def test_upload_batch_limits(self):
+        """测试批量上传的数量上限与空请求"""
+        from unittest import mock
+        
+        token = self.get_auth_token()
+        response = self.app.post('/api/upload/batch',
+            headers={'Authorization': f'Bearer {token}'},
+            content_type='multipart/form-data'
+        )
+        self.assertEqual(response.status_code, 400)
+        
+        with mock.patch.dict(app.config, BATCH_UPLOAD_MAX_ITEMS=2):
+            response = self.upload_batch(token, [(make_image_bytes(), f'{i}.png') for i in range(3)])
+        results = json.loads(response.data)['results']
+        self.assertNotIn('error', results[1])
+        self.assertEqual(results[2]['error'], '超过单次批量上限 2 项，其余文件未处理')
+        
+        # 超出上限后只返回一条截断错误，不再遍历剩余的压缩包成员与文件
+        import zipfile
+        archive = BytesIO()
+        with zipfile.ZipFile(archive, 'w') as zf:
+            for i in range(20):
+                zf.writestr(f'{i}.txt', '')
+        with mock.patch.dict(app.config, BATCH_UPLOAD_MAX_ITEMS=2):
+            response = self.upload_batch(token, [(archive.getvalue(), 'many.zip'), (make_image_bytes(), 'last.png')])
+        results = json.loads(response.data)['results']
+        self.assertEqual([item['filename'] for item in results], ['0.txt', '1.txt', '2.txt'])
+        self.assertEqual(results[2]['error'], '超过单次批量上限 2 项，其余文件未处理')
+    
+    def test_upload_rejected_when_gate_full(self):
+        """测试分析名额已满时快速返回503与 Retry-After"""
+        from unittest import mock
+        import app as app_module
+        from services.admission import AdmissionGate
+        
+        gate = AdmissionGate(1, max_queue=0, retry_after=3)
+        gate.acquire()
+        token = self.get_auth_token()
+        with mock.patch.object(app_module, 'analysis_gate', gate):
+            response = self.upload(token)
+            self.assertEqual(response.status_code, 503)
+            self.assertEqual(response.headers['Retry-After'], '3')
+            
+            # 异步模式只入队，不占用分析名额
+            self.assertEqual(self.upload(token, '?async=1').status_code, 202)
+            
+            gate.release()
+            self.assertEqual(self.upload(token).status_code, 200)
+        
+        self.assertEqual(gate.stats()['rejected_full'], 1)
+        self.assertEqual(gate.in_flight, 0)
+    
+    def test_gate_rejection_refunds_rate_token(self):
+        """测试分析名额已满返回503时退还限流令牌"""
+        from unittest import mock
+        import app as app_module
+        from services.admission import AdmissionGate, TokenBucketLimiter
+        
+        token = self.get_auth_token()
+        gate = AdmissionGate(1, max_queue=0)
+        limiter = TokenBucketLimiter(0.01, 2)
+        gate.acquire()
+        with mock.patch.object(app_module, 'analysis_gate', gate), \
+                mock.patch.object(app_module, 'upload_limiter', limiter):
+            statuses = [self.upload(token).status_code for _ in range(3)]
+            batch = self.upload_batch(token, [(make_image_bytes(), 'a.png')])
+            self.assertEqual(batch.status_code, 503)
+            
+            gate.release()
+            statuses += [self.upload(token).status_code for _ in range(3)]
+        
+        self.assertEqual(statuses, [503, 503, 503, 200, 200, 429])
+        self.assertEqual(limiter.stats()['refunded'], 4)
+    
+    def test_upload_rate_limited_per_user(self):
+        """测试按用户令牌桶限流，超出时返回429"""
+        from unittest import mock
+        import app as app_module
+        from services.admission import TokenBucketLimiter
+        
+        token = self.get_auth_token()
+        with mock.patch.object(app_module, 'upload_limiter', TokenBucketLimiter(0.01, 2)):
+            statuses = [self.upload(token).status_code for _ in range(3)]
+            response = self.upload(token)
+        
+        self.assertEqual(statuses, [200, 200, 429])
+        self.assertEqual(response.status_code, 429)
+        self.assertGreaterEqual(int(response.headers['Retry-After']), 1)
+        
+        health = json.loads(self.app.get('/api/health').data)
+        self.assertIn('gate', health['admission'])
+    
+    def test_upload_batch_admitted_per_item(self):
+        """测试批量上传按分析项限流，每个在途项占用一个分析名额"""
+        import zipfile
+        from unittest import mock
+        import app as app_module
+        from services.admission import AdmissionGate, TokenBucketLimiter
+        
+        archive = BytesIO()
+        with zipfile.ZipFile(archive, 'w') as zf:
+            for i in range(3):
+                zf.writestr(f'{i}.png', make_image_bytes(32 + i, 32))
+        
+        token = self.get_auth_token()
+        gate = AdmissionGate(1, max_queue=0)
+        with mock.patch.object(app_module, 'upload_limiter', TokenBucketLimiter(0.01, 2)), \
+                mock.patch.object(app_module, 'analysis_gate', gate):
+            response = self.upload_batch(token, [(archive.getvalue(), 'faces.zip')])
+            results = json.loads(response.data)['results']
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('error', results[1])
+            self.assertEqual(results[2]['error'], '请求过于频繁，请稍后重试')
+            
+            # 令牌耗尽后，第一项即被拒绝时整批返回429
+            response = self.upload_batch(token, [(make_image_bytes(), 'a.png')])
+            self.assertEqual(response.status_code, 429)
+        
+        # 名额只有一个且不排队时，批量项依次执行而非被拒绝
+        stats = gate.stats()
+        self.assertEqual((stats['max_in_flight_seen'], stats['in_flight'], stats['admitted']), (1, 0, 2))
+        
+        gate.acquire()
+        with mock.patch.object(app_module, 'analysis_gate', gate):
+            response = self.upload_batch(token, [(make_image_bytes(), 'a.png')])
+        gate.release()
+        self.assertEqual(response.status_code, 503)
+    
+    def test_metrics_endpoint(self):
+        """测试Prometheus指标包含各阶段耗时、请求计数与缓存统计"""
+        token = self.get_auth_token()
+        self.assertEqual(self.upload(token).status_code, 200)
+        
+        response = self.app.get('/api/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content_type.startswith('text/plain; version=0.0.4'))
+        text = response.get_data(as_text=True)
+        
+        # 原图由后台线程写入，file_save 可能尚未记录
+        for stage in ('decode', 'personality', 'fortune', 'advice', 'db_commit', 'json_encode'):
+            self.assertIn(f'fortune_stage_duration_seconds_count{{stage="{stage}"}}', text)
+        self.assertRegex(text, r'fortune_http_requests_total\{method="POST",endpoint="/api/upload",status="200"\} \d+')
+        self.assertIn('fortune_cache_hit_rate{cache="result"}', text)
+        self.assertIn('fortune_analysis_rejected_total{reason="full"}', text)
+        self.assertEqual(text.count('# TYPE fortune_analysis_rejected_total counter'), 1)
+    
+    def use_profiler(self, sample_rate=0.0):
+        """启用写入临时目录的请求剖析器"""
+        from unittest import mock
+        import app as app_module
+        from services.profiler import RequestProfiler
+        
+        profiler = RequestProfiler(os.path.join(self.tmp_dir, 'profiles'), top_n=3, sample_rate=sample_rate)
+        patcher = mock.patch.object(app_module, 'profiler', profiler)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return profiler
+    
+    def test_profile_requires_admin(self):
+        """测试显式剖析须为管理员或携带剖析令牌"""
+        from unittest import mock
+        
+        profiler = self.use_profiler()
+        token = self.get_auth_token()
+        headers = {'Authorization': f'Bearer {token}', 'X-Profile': '1'}
+        response = self.app.get('/api/predictions', headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('X-Profile-Top', response.headers)
+        
+        with mock.patch.dict(app.config, PROFILING_TOKEN='secret'):
+            response = self.app.get('/api/predictions', headers={
+                'Authorization': f'Bearer {token}', 'X-Profile-Token': 'wrong'
+            })
+            self.assertNotIn('X-Profile-Top', response.headers)
+            
+            # 非ASCII令牌不能导致服务端错误
+            response = self.app.get('/api/predictions', headers={
+                'Authorization': f'Bearer {token}', 'X-Profile-Token': 'sécret'
+            })
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('X-Profile-Top', response.headers)
+            
+            response = self.app.get('/api/predictions', headers={
+                'Authorization': f'Bearer {token}', 'X-Profile-Token': 'secret', 'X-Request-ID': 'req-1'
+            })
+        self.assertEqual(response.headers['X-Profile-Id'], 'req-1')
+        self.assertEqual(len(response.headers['X-Profile-Top'].split(', ')), 3)
+        self.assertEqual(profiler.stats()['profiled'], 1)
+    
+    def test_profile_admin_claim(self):
+        """测试管理员令牌带 admin 声明，可剖析上传请求并保存结果"""
+        from unittest import mock
+        
+        profiler = self.use_profiler()
+        with mock.patch.dict(app.config, ADMIN_USERNAMES={'testuser'}):
+            token = self.get_auth_token()
+        
+        response = self.app.post('/api/upload',
+            data={'file': (BytesIO(make_image_bytes()), 'face.png')},
+            headers={'Authorization': f'Bearer {token}', 'X-Profile': '1'},
+            content_type='multipart/form-data'
+        )
+        self.assertEqual(response.status_code, 200)
+        request_id = response.headers['X-Profile-Id']
+        files = os.listdir(profiler.output_dir)
+        self.assertEqual(len(files), 1)
+        self.assertTrue(files[0].endswith(f'_{request_id}.prof'))
+        
+        # 剖析中的请求在当前线程内执行分析阶段，结果包含各分析器
+        self.assertIn('personality_analyzer.py', self.profiled_files(profiler, files[0]))
+    
+    def test_profile_stream_covers_analysis(self):
+        """测试流式上传在响应关闭后结束剖析，结果包含分析阶段"""
+        from unittest import mock
+        
+        profiler = self.use_profiler()
+        with mock.patch.dict(app.config, ADMIN_USERNAMES={'testuser'}):
+            token = self.get_auth_token()
+        
+        response = self.app.post('/api/upload/stream',
+            data={'file': (BytesIO(make_image_bytes()), 'face.png')},
+            headers={'Authorization': f'Bearer {token}', 'X-Profile': '1'},
+            content_type='multipart/form-data'
+        )
+        self.assertIn('event: done', response.get_data(as_text=True))
+        response.close()
+        
+        files = os.listdir(profiler.output_dir)
+        self.assertEqual(len(files), 1)
+        self.assertTrue(files[0].endswith(f"_{response.headers['X-Profile-Id']}.prof"))
+        self.assertIn('fortune_analyzer.py', self.profiled_files(profiler, files[0]))
+        self.assertEqual(profiler.stats()['profiled'], 1)
+    
+    def profiled_files(self, profiler, name):
+        """剖析结果中出现的源文件名"""
+        import pstats
+        stats = pstats.Stats(os.path.join(profiler.output_dir, name))
+        return {os.path.basename(filename) for filename, _, _ in stats.stats}
+    
+    def test_profile_sampling_only_uploads(self):
+        """测试按比例抽样只剖析上传请求"""
+        profiler = self.use_profiler(sample_rate=1.0)
+        token = self.get_auth_token()
+        
+        response = self.app.get('/api/predictions', headers={'Authorization': f'Bearer {token}'})
+        self.assertNotIn('X-Profile-Top', response.headers)
+        response = self.upload(token)
+        self.assertIn('X-Profile-Top', response.headers)
+        self.assertEqual(profiler.stats()['profiled'], 1)
+    
+    def test_deterministic_upload_reproducible(self):
+        """测试确定性评分：相同输入结果一致，且可按记录复现"""
+        app.config['DETERMINISTIC_SCORING'] = True
+        self.addCleanup(app.config.update, DETERMINISTIC_SCORING=False)
+        token = self.get_auth_token()
+        
+        # 清空结果缓存，第二次上传重新执行各分析阶段
+        first = json.loads(self.upload(token).data)
+        result_cache.clear()
+        second = json.loads(self.upload(token).data)
+        self.assertEqual(result_cache.stats()['hits'], 0)
+        first_id = first.pop('prediction_id')
+        second.pop('prediction_id')
+        self.assertEqual(first, second)
+        
+        # 等待后台线程写入原图
+        with app.app_context():
+            image_path = db.session.get(Prediction, first_id).image_path
+        for _ in range(50):
+            if os.path.exists(image_path):
+                break
+            time.sleep(0.05)
+        
+        response = self.app.get(f'/api/prediction/{first_id}/reproduce',
+            headers={'Authorization': f'Bearer {token}'}
+        )
+        self.assertEqual(response.status_code, 200)
+        reproduced = json.loads(response.data)
+        self.assertEqual(reproduced.pop('id'), first_id)
+        reproduced.pop('created_at')
+        self.assertEqual(reproduced, first)
+    
+    def test_analysis_dates_use_local_time(self):
+        """测试运势日期按服务器本地日期计算，created_at 仍为UTC"""
+        from datetime import datetime
+        from app import iter_sections
+        
+        if not hasattr(time, 'tzset'):
+            self.skipTest('平台不支持 tzset')
+        previous = os.environ.get('TZ')
+        os.environ['TZ'] = 'Asia/Shanghai'
+        time.tzset()
+        try:
+            with app.app_context():
+                sections = dict(iter_sections(1, {}, datetime(2024, 5, 1, 20, 0)))
+        finally:
+            if previous is None:
+                os.environ.pop('TZ')
+            else:
+                os.environ['TZ'] = previous
+            time.tzset()
+        
+        self.assertEqual(sections['fortune']['daily']['dates']['today'], '2024-05-02')
+    
+    def test_repeat_upload_served_from_result_cache(self):
+        """测试同一用户同一天重复提交同一张图片命中结果缓存"""
+        from unittest import mock
+        import app as app_module
+        
+        token = self.get_auth_token()
+        first = json.loads(self.upload(token).data)
+        with mock.patch.object(app_module.analysis_pipeline, 'iter_run') as iter_run:
+            second = json.loads(self.upload(token).data)
+        iter_run.assert_not_called()
+        
+        self.assertNotEqual(first.pop('prediction_id'), second.pop('prediction_id'))
+        self.assertEqual(first, second)
+        self.assertEqual(result_cache.stats()['hits'], 1)
+        
+        # 其他用户提交同一张图片不共享结果
+        response = self.app.post('/api/register',
+            data=json.dumps({
+                'username': 'other',
+                'email': 'other@example.com',
+                'password': 'password123'
+            }),
+            content_type='application/json'
+        )
+        self.upload(json.loads(response.data)['access_token'])
+        self.assertEqual(result_cache.stats()['hits'], 1)
+    
+    def test_fallback_features_not_cached(self):
+        """测试特征提取失败而使用默认特征时，结果不写入缓存"""
+        from unittest import mock
+        import app as app_module
+        
+        token = self.get_auth_token()
+        image = make_image_bytes(61, 59)
+        upload = lambda: self.app.post('/api/upload',
+            data={'file': (BytesIO(image), 'face.png')},
+            headers={'Authorization': f'Bearer {token}'},
+            content_type='multipart/form-data'
+        )
+        with mock.patch.object(app_module.image_processor, '_detect_face', side_effect=TimeoutError):
+            self.assertEqual(upload().status_code, 200)
+        self.assertEqual(result_cache.stats()['size'], 0)
+        
+        # 检测恢复后重新分析，而不是返回默认特征的缓存结果
+        with mock.patch.object(app_module.image_processor, '_detect_face',
+                               wraps=app_module.image_processor._detect_face) as detect:
+            self.assertEqual(upload().status_code, 200)
+        detect.assert_called_once()
+        self.assertEqual(result_cache.stats()['hits'], 0)
+    
+    def test_reproduce_requires_deterministic_mode(self):
+        """测试未启用确定性评分时拒绝复现"""
+        token = self.get_auth_token()
+        response = self.app.get('/api/prediction/1/reproduce',
+            headers={'Authorization': f'Bearer {token}'}
+        )
+        self.assertEqual(response.status_code, 400)
+
 class ServiceTestCase(unittest.TestCase):
     """服务模块测试"""
     
@@ -266,6 +1363,397 @@ class ServiceTestCase(unittest.TestCase):
         self.assertIn('yesterday', daily)
         self.assertIn('tomorrow', daily)
 
+class BatchScoringTestCase(unittest.TestCase):
+    """向量化批量评分测试"""
+    
+    class ZeroRng:
+        """扰动恒为0的随机数生成器"""
+        def integers(self, low, high, size=None):
+            return np.zeros(size, dtype=np.int64)
+    
+    def setUp(self):
+        from services.personality_analyzer import PersonalityAnalyzer
+        
+        rng = np.random.RandomState(7)
+        self.feature_list = [
+            {
+                'face_ratio': rng.uniform(0.5, 1.3),
+                'brightness': rng.uniform(0, 255),
+                'contrast': rng.uniform(0, 120),
+                'texture': rng.uniform(0, 600),
+                'symmetry': rng.uniform(-0.2, 1.0)
+            }
+            for _ in range(200)
+        ]
+        self.features = PersonalityAnalyzer.features_to_array(self.feature_list)
+    
+    def test_batch_matches_scalar_without_jitter(self):
+        """测试去掉随机扰动后批量结果与逐条计算一致"""
+        from unittest import mock
+        from services.personality_analyzer import PersonalityAnalyzer
+        from services.career_predictor import CareerPredictor
+        from services.wealth_predictor import WealthPredictor
+        from services.love_analyzer import LoveAnalyzer
+        
+        personality_analyzer = PersonalityAnalyzer()
+        career_predictor = CareerPredictor()
+        wealth_predictor = WealthPredictor()
+        love_analyzer = LoveAnalyzer()
+        rng = self.ZeroRng()
+        
+        personality = personality_analyzer.analyze_batch(self.features, rng)
+        career = career_predictor.predict_batch(personality['bigFive'], rng)
+        wealth = wealth_predictor.predict_batch(personality['bigFive'], career['successRate'], rng)
+        love = love_analyzer.analyze_batch(personality['bigFive'], rng)
+        
+        with mock.patch('random.randint', return_value=0):
+            for i, features in enumerate(self.feature_list):
+                p = personality_analyzer.analyze(features)
+                c = career_predictor.predict(features, p)
+                w = wealth_predictor.predict(features, p, c)
+                l = love_analyzer.analyze(features, p)
+                
+                for trait, score in p['bigFive'].items():
+                    self.assertEqual(personality['bigFive'][trait][i], score, trait)
+                self.assertEqual(personality['mbti'][i], p['mbti'])
+                self.assertEqual(career['successRate'][i], c['successRate'])
+                self.assertEqual(wealth['current_trend'][i], w['current_trend'])
+                self.assertEqual(wealth['riskTolerance'][i], w['riskTolerance'])
+                self.assertEqual(love['stabilityScore'][i], l['stabilityScore'])
+                self.assertEqual(love['attractiveness'][i], l['attractiveness'])
+    
+    def test_batch_jitter_range_and_clamping(self):
+        """测试批量扰动范围与截断规则"""
+        from services.personality_analyzer import PersonalityAnalyzer
+        from services.career_predictor import CareerPredictor
+        
+        features = np.tile([[0.85, 127, 50, 100, 0.8]], (5000, 1))
+        result = PersonalityAnalyzer().analyze_batch(features, np.random.default_rng(0))
+        openness = result['bigFive']['openness']
+        # 60 + 127/255*30 = 74.94，扰动 [-5, 5] 后取整
+        self.assertEqual(openness.min(), 69)
+        self.assertEqual(openness.max(), 79)
+        
+        extreme = PersonalityAnalyzer().analyze_batch(
+            np.tile([[0.0, 255, 500, 0, 1.0]], (100, 1)), np.random.default_rng(0)
+        )
+        for scores in extreme['bigFive'].values():
+            self.assertTrue(((scores >= 0) & (scores <= 100)).all())
+        
+        success = CareerPredictor().predict_batch(extreme['bigFive'], np.random.default_rng(0))['successRate']
+        self.assertTrue(((success >= 40) & (success <= 95)).all())
+
+class AnalysisPipelineTestCase(unittest.TestCase):
+    """分析流水线测试"""
+    
+    def test_dependency_order(self):
+        """测试阶段按依赖顺序执行"""
+        from services.analysis_pipeline import AnalysisPipeline, Stage
+        
+        pipeline = AnalysisPipeline([
+            Stage('b', lambda a: a + 1, ['a']),
+            Stage('c', lambda a, b: a * b, ['a', 'b']),
+            Stage('d', lambda x: x * 10, ['x'])
+        ])
+        results, stats = pipeline.run({'a': 2, 'x': 1})
+        pipeline.shutdown()
+        
+        self.assertEqual(results, {'b': 3, 'c': 6, 'd': 10})
+        for info in stats.values():
+            self.assertEqual(info['status'], 'ok')
+            self.assertGreaterEqual(info['elapsed'], 0)
+    
+    def test_timeout_fallback(self):
+        """测试阶段超时使用默认结果"""
+        import time
+        from services.analysis_pipeline import AnalysisPipeline, Stage
+        
+        pipeline = AnalysisPipeline([
+            Stage('slow', lambda: time.sleep(1) or 'late', fallback=lambda: 'default', timeout=0.05),
+            Stage('next', lambda slow: slow + '!', ['slow'])
+        ])
+        results, stats = pipeline.run({})
+        pipeline.shutdown(wait=False)
+        
+        self.assertEqual(results['slow'], 'default')
+        self.assertEqual(stats['slow']['status'], 'timeout')
+        self.assertEqual(results['next'], 'default!')
+    
+    def test_timeout_excludes_queue_wait(self):
+        """测试超时从阶段开始执行时算起，排队时间不计入"""
+        import time
+        from services.analysis_pipeline import AnalysisPipeline, Stage
+        
+        pipeline = AnalysisPipeline([
+            Stage('a', lambda: time.sleep(0.3) or 'a', fallback=lambda: 'default'),
+            Stage('b', lambda: time.sleep(0.3) or 'b', fallback=lambda: 'default')
+        ], max_workers=1, timeout=0.5)
+        results, stats = pipeline.run({})
+        pipeline.shutdown()
+        
+        self.assertEqual(results, {'a': 'a', 'b': 'b'})
+        self.assertEqual({info['status'] for info in stats.values()}, {'ok'})
+    
+    def test_timeout_on_process_pool(self):
+        """测试进程池执行时阶段超时仍然生效"""
+        from concurrent.futures import ProcessPoolExecutor
+        from services.analysis_pipeline import AnalysisPipeline, Stage
+        
+        executor = ProcessPoolExecutor(max_workers=1)
+        pipeline = AnalysisPipeline([
+            Stage('slow', time.sleep, ['seconds'], fallback=lambda: 'default', timeout=0.2)
+        ], executor=executor)
+        try:
+            start = time.perf_counter()
+            results, stats = pipeline.run({'seconds': 1.5})
+            elapsed = time.perf_counter() - start
+        finally:
+            executor.shutdown(wait=True)
+        
+        self.assertEqual(results['slow'], 'default')
+        self.assertEqual(stats['slow']['status'], 'timeout')
+        self.assertLess(elapsed, 1.0)
+    
+    def test_timed_out_stage_releases_pool(self):
+        """测试超时阶段的线程不再占用后续请求的线程池"""
+        import threading
+        from services.analysis_pipeline import AnalysisPipeline, Stage
+        
+        release = threading.Event()
+        pipeline = AnalysisPipeline([
+            Stage('work', lambda block: release.wait(5) if block else 'fast', ['block'],
+                  fallback=lambda: 'default', timeout=0.1)
+        ], max_workers=1)
+        try:
+            _, stats = pipeline.run({'block': True})
+            self.assertEqual(stats['work']['status'], 'timeout')
+            
+            results, stats = pipeline.run({'block': False})
+            self.assertEqual(results['work'], 'fast')
+            self.assertEqual(stats['work']['status'], 'ok')
+        finally:
+            release.set()
+            pipeline.shutdown()
+    
+    def test_abandoned_stages_capped(self):
+        """测试超时未结束的阶段达到上限后不再替换线程池，直接使用默认结果"""
+        import threading
+        from services.analysis_pipeline import AnalysisPipeline, Stage
+        
+        release = threading.Event()
+        pipeline = AnalysisPipeline([
+            Stage('work', lambda block: release.wait(5) if block else 'fast', ['block'],
+                  fallback=lambda: 'default', timeout=0.1)
+        ], max_workers=1, max_abandoned=1)
+        try:
+            _, stats = pipeline.run({'block': True})
+            self.assertEqual(stats['work']['status'], 'timeout')
+            executor = pipeline._executor
+            
+            results, stats = pipeline.run({'block': False})
+            self.assertEqual(results['work'], 'default')
+            self.assertEqual(stats['work']['status'], 'unavailable')
+            self.assertIs(pipeline._executor, executor)
+            
+            # 超时阶段结束后恢复正常执行
+            release.set()
+            for _ in range(50):
+                if not pipeline.abandoned():
+                    break
+                time.sleep(0.02)
+            results, stats = pipeline.run({'block': False})
+            self.assertEqual(results['work'], 'fast')
+        finally:
+            release.set()
+            pipeline.shutdown()
+    
+    def test_inline_run(self):
+        """测试串行模式在调用线程内按依赖顺序执行"""
+        import threading
+        from services.analysis_pipeline import AnalysisPipeline, Stage
+        
+        pipeline = AnalysisPipeline([
+            Stage('b', lambda a: (a + 1, threading.get_ident()), ['a']),
+            Stage('c', lambda b: b[0] * 2, ['b']),
+            Stage('broken', lambda: 1 / 0, fallback=lambda: 0)
+        ])
+        runs = list(pipeline.iter_run({'a': 1}, inline=True))
+        
+        self.assertEqual([name for name, _, _ in runs], ['b', 'broken', 'c'])
+        results = {name: value for name, value, _ in runs}
+        self.assertEqual(results, {'b': (2, threading.get_ident()), 'broken': 0, 'c': 4})
+        self.assertEqual(runs[1][2]['status'], 'error')
+        self.assertIsNone(pipeline._executor)
+    
+    def test_error_fallback(self):
+        """测试阶段出错使用默认结果"""
+        from services.analysis_pipeline import AnalysisPipeline, Stage
+        
+        pipeline = AnalysisPipeline([
+            Stage('broken', lambda: 1 / 0, fallback=lambda: 0),
+            Stage('dated', lambda: 1 / 0, fallback=lambda today: today, fallback_inputs=['today'])
+        ])
+        results, stats = pipeline.run({'today': '2024-05-01'})
+        pipeline.shutdown()
+        
+        self.assertEqual(results['broken'], 0)
+        self.assertEqual(stats['broken']['status'], 'error')
+        self.assertEqual(results['dated'], '2024-05-01')
+    
+    def test_missing_dependency(self):
+        """测试无法满足的依赖"""
+        from services.analysis_pipeline import AnalysisPipeline, Stage
+        
+        pipeline = AnalysisPipeline([Stage('a', lambda x: x, ['x'])])
+        with self.assertRaises(ValueError):
+            pipeline.run({})
+        pipeline.shutdown()
+    
+    def test_default_results_shape(self):
+        """测试各分析器默认结果结构"""
+        from services.personality_analyzer import PersonalityAnalyzer
+        from services.love_analyzer import LoveAnalyzer
+        
+        personality = PersonalityAnalyzer()._generate_default_result()
+        self.assertIn(personality['mbti'], PersonalityAnalyzer().mbti_types)
+        self.assertIn('stabilityScore', LoveAnalyzer()._generate_default_result())
+        
+        # 默认结果按分析日期生成，可复现
+        from datetime import datetime
+        from services.fortune_analyzer import FortuneAnalyzer
+        from services.wealth_predictor import WealthPredictor
+        today = datetime(2024, 5, 1)
+        self.assertEqual(FortuneAnalyzer()._generate_default_result(today)['daily']['dates']['today'], '2024-05-01')
+        self.assertEqual(WealthPredictor()._generate_default_result(today)['accumulationTrend'][0]['year'], 2024)
+
+class DeterministicScoringTestCase(unittest.TestCase):
+    """确定性评分测试"""
+    
+    features = {
+        'face_ratio': 0.85,
+        'brightness': 127,
+        'contrast': 50,
+        'texture': 100,
+        'symmetry': 0.8,
+        'edge_density': 0.15
+    }
+    
+    def run_pipeline(self, pipeline, seed, today):
+        """执行流水线并返回各阶段结果"""
+        results, stats = pipeline.run({'features': self.features, 'seed': seed, 'today': today})
+        for info in stats.values():
+            self.assertEqual(info['status'], 'ok')
+        return results
+    
+    def test_seed_depends_on_all_inputs(self):
+        """测试种子由特征、用户与日期共同决定"""
+        from datetime import date
+        from services.seeding import analysis_seed
+        
+        day = date(2024, 5, 1)
+        seed = analysis_seed(self.features, 1, day)
+        self.assertEqual(seed, analysis_seed(dict(reversed(list(self.features.items()))), 1, day))
+        self.assertNotEqual(seed, analysis_seed(self.features, 2, day))
+        self.assertNotEqual(seed, analysis_seed(self.features, 1, date(2024, 5, 2)))
+        self.assertNotEqual(seed, analysis_seed({**self.features, 'brightness': 128}, 1, day))
+    
+    def test_same_seed_same_result_regardless_of_scheduling(self):
+        """测试相同种子结果一致，且与并行调度无关"""
+        from datetime import datetime
+        from app import analysis_pipeline
+        from services.analysis_pipeline import AnalysisPipeline
+        from services.seeding import analysis_seed
+        
+        today = datetime(2024, 5, 1, 8, 30)
+        seed = analysis_seed(self.features, 1, today.date())
+        serial = AnalysisPipeline(analysis_pipeline.stages, max_workers=1)
+        
+        expected = self.run_pipeline(analysis_pipeline, seed, today)
+        self.assertEqual(self.run_pipeline(analysis_pipeline, seed, today), expected)
+        self.assertEqual(self.run_pipeline(serial, seed, today), expected)
+        serial.shutdown()
+        
+        self.assertEqual(expected['fortune']['daily']['dates']['today'], '2024-05-01')
+        self.assertEqual(expected['fortune']['yearly']['years']['thisYear'], 2024)
+        
+        other = self.run_pipeline(analysis_pipeline, analysis_seed(self.features, 2, today.date()), today)
+        self.assertNotEqual(other, expected)
+    
+    def test_stage_rng_isolated(self):
+        """测试各阶段随机数互不影响，未设种子时使用全局随机数"""
+        from services.seeding import stage_rng
+        
+        self.assertIsNone(stage_rng(None, 'fortune'))
+        a = [stage_rng('seed', 'fortune').randint(0, 10 ** 9) for _ in range(2)]
+        self.assertEqual(a[0], a[1])
+        self.assertNotEqual(a[0], stage_rng('seed', 'love').randint(0, 10 ** 9))
+
+class PredictionCodecTestCase(unittest.TestCase):
+    """预测结果存储编码测试"""
+    
+    value = {'daily': {'today': 80, 'dates': {'today': '2024-05-01'}}, 'fields': ['科技', '金融'], 'rate': 0.5}
+    
+    def test_round_trip_and_detection(self):
+        """测试各编码往返一致，并能从数据识别编码"""
+        from services import prediction_codec
+        
+        for name in ('json', 'zjson'):
+            encoded = prediction_codec.encode(self.value, prediction_codec.get_codec(name))
+            self.assertIsInstance(encoded, bytes)
+            self.assertEqual(prediction_codec.detect_format(encoded), name)
+            self.assertEqual(prediction_codec.decode(encoded), self.value)
+        
+        legacy = json.dumps(self.value, ensure_ascii=False)
+        self.assertEqual(prediction_codec.detect_format(legacy), 'json')
+        self.assertEqual(prediction_codec.decode(legacy), self.value)
+        self.assertEqual(prediction_codec.decode(memoryview(legacy.encode('utf-8'))), self.value)
+        self.assertEqual(prediction_codec.decode(None), {})
+        
+        with self.assertRaises(ValueError):
+            prediction_codec.decode(b'\x00?data')
+        with self.assertRaises(ValueError):
+            prediction_codec.get_codec('xml')
+    
+    @unittest.skipUnless(importlib.util.find_spec('msgpack'), '未安装 msgpack')
+    def test_msgpack_codec(self):
+        """测试msgpack编码往返一致"""
+        from services import prediction_codec
+        
+        encoded = prediction_codec.encode(self.value, prediction_codec.get_codec('msgpack'))
+        self.assertEqual(prediction_codec.detect_format(encoded), 'msgpack')
+        self.assertEqual(prediction_codec.decode(encoded), self.value)
+    
+    def test_model_sections_decoded_lazily(self):
+        """测试模型访问器按需解码，赋值后重新解码"""
+        from unittest import mock
+        from services import prediction_codec
+        
+        prediction = Prediction(fortune=self.value)
+        self.assertEqual(prediction_codec.detect_format(prediction.fortune_data), app.config['PREDICTION_CODEC'])
+        with mock.patch.object(prediction_codec, 'decode', wraps=prediction_codec.decode) as decode:
+            self.assertEqual(prediction.fortune, self.value)
+            self.assertEqual(prediction.fortune, self.value)
+            self.assertEqual(prediction.love, {})
+            self.assertEqual(decode.call_count, 2)
+            
+            prediction.fortune = {'daily': {}}
+            self.assertEqual(prediction.fortune, {'daily': {}})
+            self.assertEqual(decode.call_count, 3)
+    
+    def test_legacy_text_column_readable(self):
+        """测试PostgreSQL中未迁移的text列返回str时仍可读取"""
+        from sqlalchemy.dialects.postgresql import psycopg2
+        from services import prediction_codec
+        
+        dialect = psycopg2.dialect()
+        process = Prediction.__table__.c.fortune_data.type.result_processor(dialect, None)
+        legacy = json.dumps(self.value, ensure_ascii=False)
+        self.assertEqual(prediction_codec.decode(process(legacy)), self.value)
+        
+        encoded = prediction_codec.encode(self.value, prediction_codec.get_codec('zjson'))
+        self.assertEqual(prediction_codec.decode(process(memoryview(encoded))), self.value)
+        self.assertIsNone(process(None))
+
 class ImageProcessorTestCase(unittest.TestCase):
     """图像处理测试"""
     
@@ -282,6 +1770,527 @@ class ImageProcessorTestCase(unittest.TestCase):
         self.assertIn('texture', features)
         self.assertIn('symmetry', features)
         self.assertIn('edge_density', features)
+    
+    def test_extract_features_from_bytes(self):
+        """测试内存解码与文件读取结果一致"""
+        from services.image_processor import ImageProcessor
+        
+        data = make_image_bytes()
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmp_dir, 'face.png')
+            with open(path, 'wb') as f:
+                f.write(data)
+            from_file = ImageProcessor().extract_features(path)
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        
+        self.assertEqual(ImageProcessor().extract_features_from_bytes(data), from_file)
+        self.assertEqual(
+            ImageProcessor().extract_features_from_bytes(b''),
+            ImageProcessor()._generate_default_features()
+        )
+
+    def test_downscaled_detection_remaps_box(self):
+        """测试缩小检测后检测框映射回原图坐标"""
+        from services.image_processor import ImageProcessor
+        
+        processor = ImageProcessor(max_detect_dim=500)
+        fake = use_fake_cascade(processor, [[10, 20, 30, 30], [100, 50, 200, 200]])
+        img = np.random.RandomState(0).randint(0, 256, (1000, 2000, 3), dtype=np.uint8)
+        
+        self.assertEqual(processor._detect_face(img), (400, 200, 800, 800))
+        self.assertEqual(fake.shapes, [(250, 500)])
+        
+        features = processor._detect_and_extract(img)
+        self.assertEqual(features['face_width'], 800)
+        self.assertEqual(features['face_height'], 800)
+
+    def test_fused_face_features_match_reference(self):
+        """测试合并实现与原多遍实现结果一致"""
+        from services.image_processor import ImageProcessor
+        
+        def reference(face_roi):
+            h, w = face_roi.shape
+            left_half = face_roi[:, :w//2]
+            right_half = cv2.flip(face_roi[:, w//2:], 1)
+            min_width = min(left_half.shape[1], right_half.shape[1])
+            return {
+                'brightness': np.mean(face_roi),
+                'contrast': np.std(face_roi),
+                'texture': np.var(cv2.Laplacian(face_roi, cv2.CV_64F)),
+                'symmetry': np.corrcoef(
+                    left_half[:, :min_width].flatten(),
+                    right_half[:, :min_width].flatten()
+                )[0, 1],
+                'edge_density': np.sum(cv2.Canny(face_roi, 100, 200) > 0) / (h * w)
+            }
+        
+        processor = ImageProcessor()
+        rng = np.random.RandomState(42)
+        for h, w in [(64, 64), (97, 83), (200, 151)]:
+            face_roi = cv2.GaussianBlur(rng.randint(0, 256, (h, w)).astype(np.uint8), (7, 7), 0)
+            expected = reference(face_roi)
+            actual = processor._extract_face_features(face_roi, None)
+            for key, value in expected.items():
+                self.assertAlmostEqual(actual[key], float(value), places=6, msg=key)
+        
+        flat = np.full((50, 40), 100, dtype=np.uint8)
+        self.assertEqual(processor._extract_face_features(flat, None)['symmetry'], 0.8)
+    
+    def test_video_sampling_stops_after_face_frames(self):
+        """测试视频按步长采样并在检测到足够人脸帧后停止"""
+        from services.image_processor import ImageProcessor
+        
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmp_dir, 'clip.avi')
+            make_video_file(path, frames=40)
+            
+            processor = ImageProcessor(video_frame_step=4, video_face_frames=3)
+            fake = use_fake_cascade(processor, [[8, 8, 40, 40]])
+            features = processor.extract_features(path)
+            
+            self.assertEqual(len(fake.shapes), 3)
+            self.assertEqual(features['face_width'], 40)
+            self.assertIn('symmetry', features)
+            
+            # 未检测到人脸时使用默认特征
+            processor = ImageProcessor(video_frame_step=4)
+            fake = use_fake_cascade(processor, np.empty((0, 4)))
+            self.assertEqual(processor.extract_features(path), processor._generate_default_features())
+            self.assertEqual(len(fake.shapes), 10)
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+    
+    def test_video_frame_budget(self):
+        """测试视频读取帧数上限"""
+        from services.image_processor import ImageProcessor
+        
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmp_dir, 'clip.avi')
+            make_video_file(path, frames=40)
+            
+            processor = ImageProcessor(video_frame_step=2, video_max_frames=10)
+            fake = use_fake_cascade(processor, np.empty((0, 4)))
+            processor.extract_features(path)
+            self.assertEqual(len(fake.shapes), 5)
+            
+            # 确定性模式只按帧数上限采样，不受耗时预算影响
+            for deterministic, expected in ((False, 0), (True, 5)):
+                processor = ImageProcessor(video_frame_step=2, video_max_frames=10, video_time_budget=0)
+                fake = use_fake_cascade(processor, np.empty((0, 4)))
+                processor.extract_features(path, deterministic=deterministic)
+                self.assertEqual(len(fake.shapes), expected)
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+class DetectorPoolTestCase(unittest.TestCase):
+    """检测器池测试"""
+    
+    def test_instances_not_shared_between_threads(self):
+        """测试并发借用时实例不被共享且数量不超过上限"""
+        import threading
+        from services.detector_pool import DetectorPool
+        
+        pool = DetectorPool(object, 2)
+        in_use = set()
+        lock = threading.Lock()
+        errors = []
+        
+        def worker():
+            for _ in range(20):
+                with pool.acquire() as detector:
+                    with lock:
+                        if id(detector) in in_use:
+                            errors.append('shared')
+                        in_use.add(id(detector))
+                        if len(in_use) > 2:
+                            errors.append('oversized')
+                    time.sleep(0.001)
+                    with lock:
+                        in_use.discard(id(detector))
+        
+        threads = [threading.Thread(target=worker) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        self.assertEqual(errors, [])
+        stats = pool.stats()
+        self.assertEqual(stats['checkouts'], 120)
+        self.assertEqual(stats['created'], 2)
+        self.assertGreater(stats['blocked_checkouts'], 0)
+        self.assertGreater(stats['wait_seconds_total'], 0)
+    
+    def test_unavailable_and_timeout(self):
+        """测试检测器不可用与等待超时"""
+        from services.detector_pool import DetectorPool
+        
+        self.assertFalse(DetectorPool(lambda: None, 2).available)
+        
+        pool = DetectorPool(object, 1)
+        with pool.acquire():
+            with self.assertRaises(TimeoutError):
+                with pool.acquire(timeout=0.01):
+                    pass
+    
+    def test_concurrent_extraction_matches_serial(self):
+        """测试多线程并发提取与串行结果一致"""
+        from concurrent.futures import ThreadPoolExecutor
+        from services.image_processor import ImageProcessor
+        
+        images = [make_image_bytes(64 + i * 16, 96) for i in range(8)]
+        expected = [ImageProcessor(detector_pool_size=1).extract_features_from_bytes(d) for d in images]
+        
+        processor = ImageProcessor(detector_pool_size=4)
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(processor.extract_features_from_bytes, images))
+        
+        self.assertEqual(results, expected)
+        self.assertLessEqual(processor.detector_stats()['created'], 4)
+
+class BatchExtractionTestCase(unittest.TestCase):
+    """批量特征提取测试"""
+    
+    def test_batch_preserves_order(self):
+        """测试多进程批量提取按输入顺序产出"""
+        from services.image_processor import ImageProcessor, extract_features_batch
+        
+        items = [make_image_bytes(64 + i * 8, 64) for i in range(6)]
+        expected = [ImageProcessor().extract_features_from_bytes(item) for item in items]
+        
+        results = list(extract_features_batch(items, workers=2, max_pending=3))
+        self.assertEqual(results, expected)
+    
+    def test_batch_cli_writes_jsonl(self):
+        """测试命令行输出JSONL"""
+        from extract_features import main
+        
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            for i in range(3):
+                with open(os.path.join(tmp_dir, f'{i}.png'), 'wb') as f:
+                    f.write(make_image_bytes())
+            output = os.path.join(tmp_dir, 'features.jsonl')
+            main([tmp_dir, '-o', output, '-w', '1'])
+            
+            with open(output, encoding='utf-8') as f:
+                rows = [json.loads(line) for line in f]
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        
+        self.assertEqual(len(rows), 3)
+        self.assertIn('symmetry', rows[0]['features'])
+
+class FakeRedis:
+    """支持 get/set(ex)/scan_iter/delete 的内存版Redis替身"""
+    
+    def __init__(self):
+        self.data = {}
+        self.expires = {}
+    
+    def get(self, key):
+        return self.data.get(key)
+    
+    def set(self, key, value, ex=None):
+        self.data[key] = value.encode('utf-8') if isinstance(value, str) else value
+        self.expires[key] = ex
+    
+    def scan_iter(self, match='*'):
+        prefix = match.rstrip('*')
+        return [key for key in self.data if key.startswith(prefix)]
+    
+    def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+
+class AdmissionTestCase(unittest.TestCase):
+    """准入控制测试用例"""
+    
+    def test_gate_queues_then_rejects(self):
+        """测试闸门：名额满时排队，队列满时立即拒绝"""
+        import threading
+        from services.admission import AdmissionGate, AdmissionRejected
+        
+        gate = AdmissionGate(1, max_queue=1, queue_timeout=5)
+        gate.acquire()
+        
+        admitted = threading.Event()
+        def waiter():
+            with gate:
+                admitted.set()
+        thread = threading.Thread(target=waiter)
+        thread.start()
+        for _ in range(100):
+            if gate.stats()['queued'] == 1:
+                break
+            time.sleep(0.01)
+        
+        with self.assertRaises(AdmissionRejected):
+            gate.acquire()
+        
+        gate.release()
+        thread.join(5)
+        self.assertTrue(admitted.is_set())
+        stats = gate.stats()
+        self.assertEqual((stats['in_flight'], stats['queued']), (0, 0))
+        self.assertEqual((stats['admitted'], stats['rejected_full']), (2, 1))
+        self.assertEqual(stats['max_queued_seen'], 1)
+    
+    def test_gate_queue_timeout(self):
+        """测试排队超时被拒绝"""
+        from services.admission import AdmissionGate, AdmissionRejected
+        
+        gate = AdmissionGate(1, max_queue=1, queue_timeout=0.05, retry_after=7)
+        gate.acquire()
+        with self.assertRaises(AdmissionRejected) as ctx:
+            gate.acquire()
+        self.assertEqual(ctx.exception.retry_after, 7)
+        self.assertEqual(gate.stats()['rejected_timeout'], 1)
+    
+    def test_token_bucket_refills(self):
+        """测试令牌桶按时间补充，各键互不影响"""
+        from unittest import mock
+        from services.admission import TokenBucketLimiter, AdmissionRejected, RateLimited
+        
+        limiter = TokenBucketLimiter(rate=2, burst=2)
+        with mock.patch('services.admission.time.monotonic', return_value=100.0):
+            limiter.acquire('a')
+            limiter.acquire('a')
+            with self.assertRaises(AdmissionRejected) as ctx:
+                limiter.acquire('a')
+            self.assertEqual(ctx.exception.retry_after, 1)
+            limiter.acquire('b')
+        
+        with mock.patch('services.admission.time.monotonic', return_value=100.5):
+            limiter.acquire('a')
+            # 超过桶容量的消耗不会被截断为桶容量
+            with self.assertRaises(RateLimited):
+                limiter.acquire('b', cost=3)
+        
+        stats = limiter.stats()
+        self.assertEqual((stats['allowed'], stats['rejected']), (4, 2))
+
+class MetricsTestCase(unittest.TestCase):
+    """运行指标测试用例"""
+    
+    def test_histogram_merges_thread_shards(self):
+        """测试各线程分片合并后的累计分桶"""
+        import threading
+        from services.metrics import Histogram
+        
+        histogram = Histogram(buckets=(0.01, 0.1))
+        def work():
+            for value in (0.005, 0.05, 0.5):
+                histogram.observe(value)
+        threads = [threading.Thread(target=work) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        histogram.observe(0.01)
+        
+        cumulative, count, total = histogram.snapshot()
+        self.assertEqual(cumulative, [5, 9, 13])
+        self.assertEqual(count, 13)
+        self.assertAlmostEqual(total, 4 * 0.555 + 0.01)
+    
+    def test_histogram_shards_bounded(self):
+        """测试大量短生命周期线程记录后，分片数不随线程数增长且计数不丢失"""
+        import gc
+        import threading
+        from services.metrics import Histogram
+        
+        histogram = Histogram(buckets=(0.01, 0.1))
+        for _ in range(200):
+            thread = threading.Thread(target=histogram.observe, args=(0.05,))
+            thread.start()
+            thread.join()
+        gc.collect()
+        
+        self.assertLessEqual(len(histogram._shards), 1)
+        cumulative, count, total = histogram.snapshot()
+        self.assertEqual((cumulative, count), ([0, 200, 200], 200))
+        self.assertAlmostEqual(total, 10.0)
+    
+    def test_render_prometheus_text(self):
+        """测试Prometheus文本格式输出"""
+        from services.metrics import MetricsRegistry
+        
+        registry = MetricsRegistry(namespace='test', buckets=(0.1, 1))
+        with registry.timer('decode'):
+            pass
+        registry.observe('decode', 2)
+        registry.count_request('GET', '/api/x', 200, 0.05)
+        text = registry.render([('items', 'gauge', '条目', [({'name': 'a"b'}, 3)])])
+        
+        self.assertIn('# TYPE test_stage_duration_seconds histogram', text)
+        self.assertIn('test_stage_duration_seconds_bucket{stage="decode",le="0.1"} 1', text)
+        self.assertIn('test_stage_duration_seconds_bucket{stage="decode",le="+Inf"} 2', text)
+        self.assertIn('test_stage_duration_seconds_count{stage="decode"} 2', text)
+        self.assertIn('test_request_duration_seconds_count{endpoint="/api/x"} 1', text)
+        self.assertIn('test_http_requests_total{method="GET",endpoint="/api/x",status="200"} 1', text)
+        self.assertIn('test_items{name="a\\"b"} 3', text)
+
+class RequestProfilerTestCase(unittest.TestCase):
+    """请求剖析测试用例"""
+    
+    def test_one_profile_at_a_time(self):
+        """测试同一时间只剖析一个请求，放弃后可再次剖析"""
+        from services.profiler import RequestProfiler
+        
+        profiler = RequestProfiler(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, profiler.output_dir, True)
+        
+        profile = profiler.start()
+        self.assertIsNotNone(profile)
+        self.assertIsNone(profiler.start())
+        profiler.discard(profile)
+        
+        profile = profiler.start()
+        sorted(range(1000))
+        path, summary = profiler.finish(profile, 'abc')
+        self.assertTrue(os.path.exists(path))
+        self.assertIn('ms', summary)
+        self.assertEqual(profiler.stats(), {'sample_rate': 0.0, 'profiled': 1, 'skipped': 1})
+    
+    def test_sampling_rate(self):
+        """测试抽样比例"""
+        import random
+        from services.profiler import RequestProfiler
+        
+        profiler = RequestProfiler('unused', sample_rate=0.1, rng=random.Random(0))
+        hits = sum(profiler.sampled() for _ in range(10000))
+        self.assertTrue(800 < hits < 1200)
+        self.assertFalse(RequestProfiler('unused').sampled())
+
+class ResultCacheTestCase(unittest.TestCase):
+    """分析结果缓存测试"""
+    
+    def setUp(self):
+        from datetime import date
+        self.day = date(2024, 5, 1)
+    
+    def test_memory_ttl_and_lru(self):
+        """测试内存后端的过期与LRU淘汰"""
+        from unittest import mock
+        from services.result_cache import MemoryResultBackend, ResultCache
+        
+        cache = ResultCache(MemoryResultBackend(max_entries=2), ttl=60)
+        with mock.patch('services.result_cache.time.time', return_value=1000):
+            cache.set('a', 1, self.day, {'x': 1})
+            cache.set('b', 1, self.day, {'x': 2})
+            self.assertEqual(cache.get('a', 1, self.day), {'x': 1})
+            cache.set('c', 1, self.day, {'x': 3})
+            self.assertIsNone(cache.get('b', 1, self.day))
+        with mock.patch('services.result_cache.time.time', return_value=1061):
+            self.assertIsNone(cache.get('a', 1, self.day))
+        
+        stats = cache.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['size']), (1, 2, 1))
+    
+    def test_key_includes_user_day_and_version(self):
+        """测试缓存键区分用户、日期与分析器版本"""
+        from datetime import date
+        from services.result_cache import MemoryResultBackend, ResultCache
+        
+        backend = MemoryResultBackend()
+        ResultCache(backend, version='1').set('h', 1, self.day, {'x': 1})
+        
+        self.assertEqual(ResultCache(backend, version='1').get('h', 1, self.day), {'x': 1})
+        self.assertIsNone(ResultCache(backend, version='1').get('h', 2, self.day))
+        self.assertIsNone(ResultCache(backend, version='1').get('h', 1, date(2024, 5, 2)))
+        self.assertIsNone(ResultCache(backend, version='2').get('h', 1, self.day))
+    
+    def test_redis_backend(self):
+        """测试Redis后端读写、过期时间与清空"""
+        from services.result_cache import RedisResultBackend, ResultCache
+        
+        client = FakeRedis()
+        cache = ResultCache(RedisResultBackend(client, prefix='t:'), ttl=120)
+        cache.set('h', 1, self.day, {'advice': '保持耐心'})
+        
+        self.assertEqual(cache.get('h', 1, self.day), {'advice': '保持耐心'})
+        self.assertEqual(list(client.expires.values()), [120])
+        cache.clear()
+        self.assertEqual(client.data, {})
+    
+    def test_backend_errors_are_misses(self):
+        """测试后端不可用时按未命中处理"""
+        from unittest import mock
+        from services.result_cache import RedisResultBackend, ResultCache
+        
+        client = mock.Mock()
+        client.get.side_effect = ConnectionError('down')
+        client.set.side_effect = ConnectionError('down')
+        cache = ResultCache(RedisResultBackend(client))
+        
+        cache.set('h', 1, self.day, {'x': 1})
+        self.assertIsNone(cache.get('h', 1, self.day))
+        self.assertEqual(cache.stats()['errors'], 2)
+
+class FeatureCacheTestCase(unittest.TestCase):
+    """特征缓存测试"""
+    
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+    
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+    
+    def test_lru_eviction(self):
+        """测试LRU淘汰与命中统计"""
+        from services.feature_cache import FeatureCache
+        
+        cache = FeatureCache(max_entries=2)
+        cache.set('a', {'x': 1})
+        cache.set('b', {'x': 2})
+        self.assertEqual(cache.get('a'), {'x': 1})
+        cache.set('c', {'x': 3})
+        
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('c'), {'x': 3})
+        stats = cache.stats()
+        self.assertEqual(stats['hits'], 2)
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['size'], 2)
+    
+    def test_persistent_store_versioned(self):
+        """测试持久化存储与版本失效"""
+        from services.feature_cache import FeatureCache
+        
+        FeatureCache(cache_dir=self.tmp_dir, version='1').set('k', {'x': 1})
+        
+        reloaded = FeatureCache(cache_dir=self.tmp_dir, version='1')
+        self.assertEqual(reloaded.get('k'), {'x': 1})
+        self.assertEqual(reloaded.stats()['disk_hits'], 1)
+        
+        upgraded = FeatureCache(cache_dir=self.tmp_dir, version='2')
+        self.assertIsNone(upgraded.get('k'))
+    
+    def test_image_processor_cache_hit(self):
+        """测试相同图片内容命中缓存"""
+        from services.image_processor import ImageProcessor
+        
+        processor = ImageProcessor()
+        data = make_image_bytes()
+        paths = []
+        for name in ('first.png', 'second.png'):
+            path = os.path.join(self.tmp_dir, name)
+            with open(path, 'wb') as f:
+                f.write(data)
+            paths.append(path)
+        
+        first = processor.extract_features(paths[0])
+        second = processor.extract_features(paths[1])
+        
+        self.assertEqual(first, second)
+        stats = processor.cache_stats()
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['hits'], 1)
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file